@@ -0,0 +1,247 @@
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from EdgeCapture import EdgeSampler
+
+# Record kinds pushed by the acquisition thread
+ANALOG = 0
+HALL = 1
+ENCODER = 2
+CYCLE = 3
+DIGITAL = 4 # one poll feeding both the hall and encoder traces
+EDGES = 5 # a block of line states rebuilt from edge events, plus the raw edges
+
+class SampleBuffer:
+    # Bounded FIFO between the acquisition thread and the GUI, bounded by the samples queued (count per record),
+    # not the records. When the GUI falls behind, new samples are dropped (and counted) instead of blocking the reader.
+    # A record larger than the whole bound is still taken into an empty queue, so it cannot be dropped forever.
+    # maxLen 0 keeps nothing, not even forced records: for an acquisition whose samples only go out through its
+    # recorder (see AcquisitionProcess.py).
+    def __init__(self, maxLen):
+        self.maxLen = maxLen
+        self.items = deque()
+        self.queued = 0
+        self.lock = threading.Lock()
+        self.total = 0
+        self.dropped = 0
+
+    def put(self, item, count = 1, force = False):
+        with self.lock:
+            self.total = self.total + count
+            full = (self.queued > 0) and (self.queued + count > self.maxLen)
+            if (full and not force) or (self.maxLen == 0):
+                self.dropped = self.dropped + count
+                return False
+            self.items.append(item)
+            self.queued = self.queued + count
+            return True
+
+    def drain(self):
+        with self.lock:
+            items = list(self.items)
+            self.items.clear()
+            self.queued = 0
+        return items
+
+    def __len__(self):
+        return self.queued
+
+class AcquisitionThread(threading.Thread):
+    # Runs the capture off the GUI thread.
+    # Records are (kind, data, t); a CYCLE record marks the end of one full capture cycle.
+    # Analog records carry a batch of frames as an (N, 16) uint8 array with one interpolated timestamp per frame.
+    #
+    # mode = 'sequential': analog -> hall -> encoder phases, one group at a time (the original sequencing).
+    # mode = 'concurrent': SPI and GPIO are read by two loops running side by side, stamped with the same clock.
+    #   A cycle ends as soon as both streams have filled their windows, so every window ends at the same
+    #   instant and the refresh period is set by the longest window instead of the sum of all of them.
+    #   With an edgeSource (see EdgeCapture.py) the GPIO side waits for kernel edge events instead of polling,
+    #   and the line states are rebuilt on a uniform digitalPeriod grid.
+    # clock stamps every record; it is time.time for the hardware and the replay clock for a replay (see Backends.py).
+    # While recorder is set (see Recorder.py), every frame and edge read is also streamed to it, including the ones
+    # dropped because the GUI fell behind.
+    def __init__(self, spi, lines, analogLen, hallLen, encoderLen, plotBuffer, framesPerRead = 50, bufferLen = None, mode = 'sequential',
+                 edgeSource = None, digitalPeriod = 34e-6, clock = time.time):
+        super().__init__(daemon = True)
+        self.spi = spi
+        self.lines = lines
+        self.mode = mode
+        self.edgeSource = edgeSource
+        self.digitalPeriod = digitalPeriod
+        self.clock = clock
+
+        self.analogCount = analogLen + plotBuffer
+        self.hallCount = hallLen
+        self.encoderCount = encoderLen
+        self.maxCount = self.analogCount + self.hallCount + self.encoderCount
+
+        # Concurrent mode: new samples per stream since the last cycle
+        self.analogWindow = analogLen
+        self.digitalWindow = max(hallLen, encoderLen)
+        self.analogSeen = 0
+        self.digitalSeen = 0
+        self.cycleLock = threading.Lock()
+
+        # Frames pulled per SPI transfer; the transfer (16 bytes per frame) has to fit in spidev's buffer (4096 bytes by default)
+        self.framesPerRead = max(1, min(framesPerRead, 256))
+        self.txFrames = [0x00] * (16*self.framesPerRead)
+        self.framesRead = 0
+
+        # Queue bound in samples (frames + line samples); a few windows by default
+        self.buffer = SampleBuffer(4*self.maxCount if (bufferLen is None) else bufferLen)
+        self.recorder = None
+        self.counter = 0
+        self.restart = False
+        self.resetSampler = False
+
+        self.running = threading.Event()
+        self.running.set()
+        self.stopping = threading.Event()
+
+    def run(self):
+        if (self.mode == 'concurrent'):
+            digital = threading.Thread(target = self.runEdges if self.edgeSource else self.runDigital, daemon = True)
+            digital.start()
+            self.runAnalog()
+            digital.join(1)
+        else:
+            self.runSequential()
+
+    def runSequential(self):
+        while not self.stopping.is_set():
+            if not self.running.wait(0.1):
+                continue
+
+            if self.restart:
+                self.restart = False
+                self.counter = 0
+
+            if (self.counter < self.analogCount):
+                n = min(self.framesPerRead, self.analogCount - self.counter)
+                frames, t = self.readFrames(n)
+                self.record(ANALOG, frames, t)
+                self.buffer.put((ANALOG, frames, t), count = n)
+                self.counter = self.counter + n - 1
+            elif (self.counter < self.analogCount + self.hallCount):
+                GPIOvals = self.lines.get_values()
+                t = self.clock()
+                self.record(HALL, GPIOvals, t)
+                self.buffer.put((HALL, GPIOvals, t))
+            else:
+                GPIOvals = self.lines.get_values()
+                t = self.clock()
+                self.record(ENCODER, GPIOvals, t)
+                self.buffer.put((ENCODER, GPIOvals, t))
+
+            self.counter = self.counter + 1
+
+            if (self.counter == self.maxCount):
+                self.counter = 0
+                self.buffer.put((CYCLE, None, self.clock()), force = True)
+
+    def runAnalog(self):
+        while not self.stopping.is_set():
+            if not self.running.wait(0.1):
+                continue
+
+            frames, t = self.readFrames(self.framesPerRead)
+            self.record(ANALOG, frames, t)
+            self.buffer.put((ANALOG, frames, t), count = self.framesPerRead)
+            self.countSamples(self.framesPerRead, 0)
+
+    def runDigital(self):
+        while not self.stopping.is_set():
+            if not self.running.wait(0.1):
+                continue
+
+            GPIOvals = self.lines.get_values()
+            t = self.clock()
+            self.record(DIGITAL, GPIOvals, t)
+            self.buffer.put((DIGITAL, GPIOvals, t))
+            self.countSamples(0, 1)
+
+    def runEdges(self):
+        sampler = EdgeSampler(self.edgeSource.get_values(), self.digitalPeriod)
+        while not self.stopping.is_set():
+            if not self.running.wait(0.1):
+                continue
+
+            if self.resetSampler:
+                self.resetSampler = False
+                sampler = EdgeSampler(self.edgeSource.get_values(), self.digitalPeriod)
+            lineIdx, values, times = self.edgeSource.read(0.005)
+            self.record(EDGES, (lineIdx, values), times)
+            states, t = sampler.sample(lineIdx, values, times, self.clock())
+            if (len(t) > 0):
+                self.buffer.put((EDGES, (states, (lineIdx, values, times)), t), count = len(t))
+                self.countSamples(0, len(t))
+
+    def record(self, kind, data, t):
+        recorder = self.recorder
+        if (recorder is None):
+            return
+        if (kind == ANALOG):
+            recorder.writeFrames(data, t)
+        elif (kind == EDGES):
+            recorder.writeEdges(data[0], data[1], t)
+        else:
+            recorder.writeStates(data, t)
+
+    def countSamples(self, analog, digital):
+        with self.cycleLock:
+            if self.restart:
+                self.restart = False
+                self.analogSeen = 0
+                self.digitalSeen = 0
+
+            self.analogSeen = self.analogSeen + analog
+            self.digitalSeen = self.digitalSeen + digital
+            if (self.analogSeen >= self.analogWindow) and (self.digitalSeen >= self.digitalWindow):
+                self.analogSeen = 0
+                self.digitalSeen = 0
+                self.buffer.put((CYCLE, None, self.clock()), force = True)
+
+    def readFrames(self, n):
+        # One transfer for n back-to-back frames.
+        # Frames are stamped from the start of the transfer at the SPI clock's frame period (128 bits per frame),
+        # so a late return from the transfer (e.g. waiting on the GIL) does not stretch the timebase.
+        # Only a transfer that returned sooner than n frame periods (a coarse clock, or a replay running faster than
+        # the SPI clock) has its timestamps spread evenly over the measured time instead, so they stay within it.
+        tx = self.txFrames if (n == self.framesPerRead) else self.txFrames[0:16*n]
+        tStart = self.clock()
+        rx = self.spi.xfer2(tx)
+        tEnd = self.clock()
+        self.framesRead = self.framesRead + n
+
+        frames = np.frombuffer(bytes(rx), dtype = np.uint8).reshape(n, 16)
+        if (getattr(self.spi, 'frameTimes', None) is not None):
+            # A played-back recording (Playback.py) hands back the recorded timestamps
+            return frames, self.spi.frameTimes
+        framePeriod = 128/self.spi.max_speed_hz
+        if (tStart + n*framePeriod <= tEnd):
+            t = tStart + framePeriod*np.arange(1, n + 1)
+        else:
+            t = tStart + (tEnd - tStart)*np.arange(1, n + 1)/n
+        return frames, t
+
+    def pause(self):
+        self.running.clear()
+
+    def resume(self):
+        self.running.set()
+
+    def restartCycle(self):
+        self.restart = True
+
+    def resync(self):
+        # The clock jumped (seek in a recording): restart the windows and the edge-to-sample grid
+        self.restart = True
+        self.resetSampler = True
+
+    def stop(self):
+        self.stopping.set()
+        self.running.set()
+        self.join(1)
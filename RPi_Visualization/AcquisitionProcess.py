@@ -0,0 +1,488 @@
+import multiprocessing
+import os
+import sys
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from Acquisition import AcquisitionThread, ANALOG, EDGES, CYCLE
+from EdgeCapture import EdgeSampler
+
+# Acquisition in its own process, handing the samples over through shared memory, so SPI/GPIO reads do not
+# share a GIL with the DSP and the Qt painting.
+#
+# The producer process opens the backends (Backends.py) and runs an ordinary AcquisitionThread, whose recorder
+# hook (see Recorder.py for the interface) writes every frame and edge into a ring in multiprocessing.shared_memory:
+#   header  state, producer pid, SPI clock, heartbeat, time the line levels are known up to, initial line levels,
+#           a sequence counter per ring (records ever written), and the run/stop flags the producer polls
+#           (flags rather than multiprocessing Events, which a killed producer can leave locked)
+#   frames  frameCapacity x frame time (f8) and frameCapacity x 16 frame bytes, as separate contiguous arrays
+#   edges   edgeCapacity x edge time (f8), line (u1), level after the edge (u1)
+# Record k of a ring lives in slot k % capacity. The producer fills the slots first and then publishes the new
+# sequence count under a lock, which is also the memory barrier between the processes; it never waits for the reader.
+#
+# In the reading process, RingReader stands in for the acquisition's SampleBuffer: drain() returns the usual
+# (kind, data, t) records, rebuilding the line states from the edges (EdgeSampler) and the CYCLE records as the
+# concurrent mode does. The ANALOG records are views straight into the shared frames (no copy), valid until the
+# producer comes round to those slots again; to keep that at least half the ring away, a reader more than half a
+# ring behind skips ahead (counted in dropped), and records should be used before the next drain().
+# Recording (the recorder hook) happens in drain() too, but it still gets the samples the reader skips, as long
+# as the ring holds them: only a reader more than three quarters of a ring (1.5 s by default) behind loses
+# samples from the recording as well.
+#
+# AcquisitionProcess starts the producer (start() waits until it is running), mirrors pause/resume into it, and
+# stop() shuts it down and frees the shared memory. check() notices a producer that died or stopped delivering
+# (no heartbeat, or no frames while running) and starts a new one, up to maxRestarts times; the new producer
+# carries on the same sequence counts, so the reader just sees a gap.
+#
+# python AcquisitionProcess.py [--seconds 10] [--backend replay]: CPU use per core, acquisition thread vs process
+
+STARTING = 0
+RUNNING = 1
+STOPPED = 2
+
+HEADER_DTYPE = np.dtype([('state', '<u4'), ('pid', '<u4'), ('spiHz', '<f8'), ('heartbeat', '<f8'), ('tLines', '<f8'),
+    ('frameSeq', '<u8'), ('edgeSeq', '<u8'), ('levels', 'u1', 8), ('run', 'u1'), ('stop', 'u1')])
+
+EDGE_RATE = 200000 # edges/s the edge ring is sized for (the replay produces ~16k/s)
+HEARTBEAT_PERIOD = 0.05
+STALL_TIMEOUT = 1 # s without heartbeat or frames before the producer counts as crashed
+STARTUP_TIMEOUT = 20 # s for a new producer to open its backends
+STOP_TIMEOUT = 2
+
+def spans(start, stop, capacity):
+    # Sequence numbers [start, stop) -> contiguous pieces (first slot, end slot, offset into the run), at most two
+    pieces = []
+    k = start
+    while (k < stop):
+        i = k % capacity
+        n = min(stop - k, capacity - i)
+        pieces.append((i, i + n, k - start))
+        k = k + n
+    return pieces
+
+class SharedRing:
+    # The shared block, created when name is None and attached to otherwise
+    def __init__(self, frameCapacity, edgeCapacity, lock, name = None):
+        self.frameCapacity = frameCapacity
+        self.edgeCapacity = edgeCapacity
+        self.lock = lock
+        self.last = (0, 0, 0.0)
+
+        offsets = []
+        size = 64 # header
+        for nbytes in [8*frameCapacity, 16*frameCapacity, 8*edgeCapacity, edgeCapacity, edgeCapacity]:
+            offsets.append(size)
+            size = size + (nbytes + 63)//64*64
+        self.shm = shared_memory.SharedMemory(name = name, create = (name is None), size = size if (name is None) else 0)
+        self.name = self.shm.name
+
+        buf = self.shm.buf
+        self.header = np.ndarray((1,), dtype = HEADER_DTYPE, buffer = buf, offset = 0)
+        self.frameTimes = np.ndarray((frameCapacity,), dtype = np.float64, buffer = buf, offset = offsets[0])
+        self.frames = np.ndarray((frameCapacity, 16), dtype = np.uint8, buffer = buf, offset = offsets[1])
+        self.edgeTimes = np.ndarray((edgeCapacity,), dtype = np.float64, buffer = buf, offset = offsets[2])
+        self.edgeLine = np.ndarray((edgeCapacity,), dtype = np.uint8, buffer = buf, offset = offsets[3])
+        self.edgeValue = np.ndarray((edgeCapacity,), dtype = np.uint8, buffer = buf, offset = offsets[4])
+
+    def get(self, field):
+        return self.header[field][0]
+
+    def set(self, field, value):
+        self.header[field][0] = value
+
+    def published(self):
+        # -> frame count, edge count, time the line levels are known up to.
+        # The last ones read if the lock cannot be had, i.e. the producer died while publishing.
+        if self.lock.acquire(timeout = STALL_TIMEOUT):
+            try:
+                self.last = (int(self.get('frameSeq')), int(self.get('edgeSeq')), float(self.get('tLines')))
+            finally:
+                self.lock.release()
+        return self.last
+
+    def publish(self, field, seq, tLines = None):
+        with self.lock:
+            self.set(field, seq)
+            if (tLines is not None):
+                self.set('tLines', tLines)
+
+    def write(self, arrays, values, seq, capacity):
+        # Copies values (one per ring array) into the slots from sequence number seq on; -> the new count.
+        # Only the newest capacity records of an oversized batch are kept.
+        n = len(values[0])
+        if (n > capacity):
+            values = [v[(n - capacity):] for v in values]
+            seq = seq + n - capacity
+            n = capacity
+        for (a, b, k) in spans(seq, seq + n, capacity):
+            for (array, v) in zip(arrays, values):
+                array[a:b] = v[k:(k + b - a)]
+        return seq + n
+
+    def close(self, unlink = False):
+        self.header = self.frameTimes = self.frames = self.edgeTimes = self.edgeLine = self.edgeValue = None
+        try:
+            self.shm.close()
+        except BufferError:
+            pass # views still held somewhere; the mapping goes with the process
+        if unlink:
+            self.shm.unlink()
+
+class RingWriter:
+    # Recorder interface (writeFrames, writeEdges, writeStates) over the shared ring, set as the producer's recorder
+    def __init__(self, ring, clock):
+        self.ring = ring
+        self.clock = clock
+        self.frameSeq, self.edgeSeq, tLines = ring.published() # a restarted producer carries on the counts
+        self.lastValues = None
+
+    def writeFrames(self, frames, t):
+        ring = self.ring
+        self.frameSeq = ring.write([ring.frameTimes, ring.frames], [t, frames], self.frameSeq, ring.frameCapacity)
+        ring.publish('frameSeq', self.frameSeq)
+
+    def writeEdges(self, lineIdx, values, times, tLines = None):
+        # Edges read up to now, so the line levels are known up to the clock
+        ring = self.ring
+        self.edgeSeq = ring.write([ring.edgeTimes, ring.edgeLine, ring.edgeValue], [times, lineIdx, values], self.edgeSeq, ring.edgeCapacity)
+        ring.publish('edgeSeq', self.edgeSeq, self.clock() if (tLines is None) else tLines)
+
+    def writeStates(self, values, t):
+        # Polled line levels: the lines that changed since the last poll go in as edges at t
+        values = np.asarray(values, dtype = np.uint8)
+        lineIdx = np.zeros(0, dtype = np.int64)
+        if (self.lastValues is not None):
+            lineIdx = np.flatnonzero(values != self.lastValues)
+        self.lastValues = values
+        self.writeEdges(lineIdx, values[lineIdx], np.full(len(lineIdx), t), t)
+
+def producerMain(name, frameCapacity, edgeCapacity, lock, parentPid, backend, edgeCapture, realTime, windows):
+    # Body of the producer process
+    from Backends import openBackends
+
+    ring = SharedRing(frameCapacity, edgeCapacity, lock, name)
+    spi, lines, clock = openBackends(backend, edgeCapture = edgeCapture, realTime = realTime)
+    writer = RingWriter(ring, clock)
+    ring.set('spiHz', spi.max_speed_hz)
+    ring.header['levels'][0][0:7] = lines.get_values()
+    ring.set('pid', os.getpid())
+
+    analogLen, hallLen, encoderLen, plotBuffer, framesPerRead, digitalPeriod = windows
+    acq = AcquisitionThread(spi, lines, analogLen, hallLen, encoderLen, plotBuffer, framesPerRead = framesPerRead, bufferLen = 0,
+        mode = 'concurrent', edgeSource = lines if edgeCapture else None, digitalPeriod = digitalPeriod, clock = clock)
+    acq.recorder = writer
+    acq.start()
+    ring.set('heartbeat', time.time())
+    ring.set('state', RUNNING)
+
+    # Until told to stop, or the reading process is gone (no orphan holding the SPI bus and GPIO lines)
+    while not ring.get('stop') and acq.is_alive() and (os.getppid() == parentPid):
+        ring.set('heartbeat', time.time())
+        if ring.get('run') and not acq.running.is_set():
+            acq.resume()
+        elif acq.running.is_set() and not ring.get('run'):
+            acq.pause()
+        time.sleep(HEARTBEAT_PERIOD)
+
+    failed = not acq.is_alive()
+    acq.stop()
+    lines.release()
+    if hasattr(spi, 'close'):
+        spi.close()
+    ring.set('state', STOPPED)
+    ring.close()
+    sys.exit(1 if failed else 0)
+
+class RingReader:
+    # SampleBuffer stand-in reading the shared ring (drain, total, dropped), with the concurrent mode's CYCLE records
+    def __init__(self, ring, analogWindow, digitalWindow, digitalPeriod):
+        self.ring = ring
+        self.analogWindow = analogWindow
+        self.digitalWindow = digitalWindow
+        self.frameCursor, self.edgeCursor, self.tLines = ring.published()
+        self.sampler = EdgeSampler(ring.header['levels'][0][0:7], digitalPeriod)
+        self.digitalPeriod = digitalPeriod
+        self.recorder = None
+        self.total = 0
+        self.dropped = 0
+        self.analogSeen = 0
+        self.digitalSeen = 0
+        self.restart = False
+        self.resetSampler = False
+
+    def catchUp(self, cursor, seq, capacity):
+        # -> first sequence number to read: at most half a ring behind the producer
+        start = max(cursor, seq - capacity//2)
+        self.total = self.total + (seq - cursor)
+        self.dropped = self.dropped + (start - cursor)
+        return start
+
+    def kept(self, cursor, seq, capacity):
+        # -> first sequence number the producer will not overwrite while it is read (a quarter ring of margin)
+        return max(cursor, seq - capacity + capacity//4)
+
+    def drain(self):
+        ring = self.ring
+        if (ring.header is None):
+            return [] # stopped
+        frameSeq, edgeSeq, tLines = ring.published()
+        records = []
+
+        start = self.catchUp(self.frameCursor, frameSeq, ring.frameCapacity)
+        if (self.recorder is not None):
+            for (a, b, k) in spans(self.kept(self.frameCursor, frameSeq, ring.frameCapacity), start, ring.frameCapacity):
+                self.recorder.writeFrames(ring.frames[a:b], ring.frameTimes[a:b])
+        for (a, b, k) in spans(start, frameSeq, ring.frameCapacity):
+            frames = ring.frames[a:b]
+            t = ring.frameTimes[a:b]
+            if (self.recorder is not None):
+                self.recorder.writeFrames(frames, t)
+            records.append((ANALOG, frames, t))
+            self.countSamples(b - a, 0, records)
+        self.frameCursor = frameSeq
+
+        start = self.catchUp(self.edgeCursor, edgeSeq, ring.edgeCapacity)
+        if (self.recorder is not None):
+            for (a, b, k) in spans(self.kept(self.edgeCursor, edgeSeq, ring.edgeCapacity), start, ring.edgeCapacity):
+                self.recorder.writeEdges(ring.edgeLine[a:b].astype(np.int64), ring.edgeValue[a:b], ring.edgeTimes[a:b])
+        pieces = spans(start, edgeSeq, ring.edgeCapacity)
+        lineIdx = np.concatenate([ring.edgeLine[a:b] for (a, b, k) in pieces] + [np.zeros(0, dtype = np.uint8)]).astype(np.int64)
+        values = np.concatenate([ring.edgeValue[a:b] for (a, b, k) in pieces] + [np.zeros(0, dtype = np.uint8)])
+        times = np.concatenate([ring.edgeTimes[a:b] for (a, b, k) in pieces] + [np.zeros(0)])
+        self.edgeCursor = edgeSeq
+        if (self.recorder is not None) and (len(times) > 0):
+            self.recorder.writeEdges(lineIdx, values, times)
+
+        if self.resetSampler:
+            self.resetSampler = False
+            self.sampler = EdgeSampler(self.sampler.state, self.digitalPeriod)
+        self.tLines = tLines
+        states, t = self.sampler.sample(lineIdx, values, times, tLines)
+        if (len(t) > 0):
+            records.append((EDGES, (states, (lineIdx, values, times)), t))
+            self.countSamples(0, len(t), records)
+        return records
+
+    def countSamples(self, analog, digital, records):
+        if self.restart:
+            self.restart = False
+            self.analogSeen = 0
+            self.digitalSeen = 0
+
+        self.analogSeen = self.analogSeen + analog
+        self.digitalSeen = self.digitalSeen + digital
+        if (self.analogSeen >= self.analogWindow) and (self.digitalSeen >= self.digitalWindow):
+            self.analogSeen = 0
+            self.digitalSeen = 0
+            records.append((CYCLE, None, self.ring.get('tLines')))
+
+class AcquisitionProcess:
+    # Same controls as AcquisitionThread (buffer, framesRead, recorder, pause/resume, restartCycle, resync, stop),
+    # with the backends opened in the producer process; start() raises RuntimeError if the producer does not come up
+    def __init__(self, backend, analogLen, hallLen, encoderLen, plotBuffer, edgeCapture = True, realTime = True,
+                 framesPerRead = 50, digitalPeriod = 34e-6, ringSeconds = 2, maxSpiHz = 1000000, maxRestarts = 3):
+        self.context = multiprocessing.get_context('spawn') # no fork of a process running Qt
+        self.backend = backend
+        self.edgeCapture = edgeCapture
+        self.realTime = realTime
+        self.windows = (analogLen, hallLen, encoderLen, plotBuffer, framesPerRead, digitalPeriod)
+        self.analogWindow = analogLen
+        self.digitalWindow = max(hallLen, encoderLen)
+        self.digitalPeriod = digitalPeriod
+        self.ringSeconds = ringSeconds
+        self.maxSpiHz = maxSpiHz # sizes the frame ring
+        self.maxRestarts = maxRestarts
+
+        self.lock = self.context.Lock()
+        self.running = True
+        self.ring = None
+        self.buffer = None
+        self.process = None
+        self.restarts = 0
+        self.error = None
+
+    def start(self):
+        ring = SharedRing(int(self.ringSeconds*self.maxSpiHz/128), int(self.ringSeconds*EDGE_RATE), self.lock)
+        ring.set('run', self.running)
+        self.spawn(ring)
+        self.waitRunning(ring)
+        self.ring = ring
+        self.spiHz = float(ring.get('spiHz'))
+        self.buffer = RingReader(ring, self.analogWindow, self.digitalWindow, self.digitalPeriod)
+
+    def spawn(self, ring):
+        # A fresh lock each time, in case the last producer died holding the old one
+        self.lock = self.context.Lock()
+        ring.lock = self.lock
+        ring.set('state', STARTING)
+        ring.set('stop', 0)
+        self.process = self.context.Process(target = producerMain, daemon = True, args = (ring.name, ring.frameCapacity,
+            ring.edgeCapacity, self.lock, os.getpid(), self.backend, self.edgeCapture, self.realTime, self.windows))
+        self.process.start()
+        self.spawned = time.time()
+        self.lastFrameSeq = ring.published()[0]
+        self.lastProgress = self.spawned
+
+    def waitRunning(self, ring):
+        while (ring.get('state') == STARTING):
+            if not self.process.is_alive():
+                self.shutdown(ring)
+                raise RuntimeError(f'acquisition process exited during startup (code {self.process.exitcode})')
+            if (time.time() - self.spawned > STARTUP_TIMEOUT):
+                self.shutdown(ring)
+                raise RuntimeError(f'acquisition process not running after {STARTUP_TIMEOUT} s')
+            time.sleep(0.01)
+
+    def shutdown(self, ring, free = True, timeout = STOP_TIMEOUT):
+        # Stops the producer (killed if it does not stop within timeout) and frees the ring
+        ring.set('stop', 1)
+        if (self.process is not None):
+            self.process.join(timeout)
+            if self.process.is_alive():
+                self.process.kill()
+                self.process.join()
+        if free:
+            ring.close(unlink = True)
+
+    def check(self):
+        # Crashed/stalled producer detection; -> True when something happened (see error)
+        if (self.process is None) or (self.ring is None):
+            return False
+        tNow = time.time()
+        frameSeq = self.ring.published()[0]
+        if (frameSeq != self.lastFrameSeq) or not self.running:
+            self.lastFrameSeq = frameSeq
+            self.lastProgress = tNow
+
+        alive = self.process.is_alive()
+        if alive and (self.ring.get('state') == STARTING):
+            if (tNow - self.spawned < STARTUP_TIMEOUT):
+                return False
+            self.error = 'acquisition process did not start'
+        elif alive and (tNow - self.ring.get('heartbeat') < STALL_TIMEOUT) and (tNow - self.lastProgress < STALL_TIMEOUT):
+            return False
+        elif alive:
+            self.error = 'acquisition process stalled'
+        else:
+            self.error = f'acquisition process exited (code {self.process.exitcode})'
+
+        self.shutdown(self.ring, free = False, timeout = 0.2) # the ring stays, for the next producer
+        if (self.restarts < self.maxRestarts):
+            self.restarts = self.restarts + 1
+            self.error = self.error + f', restarted ({self.restarts}/{self.maxRestarts})'
+            self.spawn(self.ring)
+            self.buffer.resetSampler = True
+        else:
+            self.error = self.error + ', gave up'
+            self.process = None
+        return True
+
+    @property
+    def framesRead(self):
+        return self.ring.published()[0] if (self.ring is not None) else 0
+
+    @property
+    def recorder(self):
+        return self.buffer.recorder
+
+    @recorder.setter
+    def recorder(self, recorder):
+        self.buffer.recorder = recorder
+
+    def clock(self):
+        # Time on the producer's clock the samples drained so far reach up to
+        return self.buffer.tLines
+
+    def pause(self):
+        self.running = False
+        self.ring.set('run', 0)
+
+    def resume(self):
+        self.running = True
+        self.ring.set('run', 1)
+
+    def restartCycle(self):
+        self.buffer.restart = True
+
+    def resync(self):
+        self.buffer.restart = True
+        self.buffer.resetSampler = True
+
+    def stop(self):
+        if (self.ring is not None):
+            self.shutdown(self.ring)
+        self.ring = None
+        self.process = None
+
+def cpuTicks():
+    # Busy and total ticks per core, from /proc/stat
+    ticks = []
+    with open('/proc/stat') as f:
+        for line in f:
+            fields = line.split()
+            if fields[0].startswith('cpu') and (fields[0] != 'cpu'):
+                values = [int(v) for v in fields[1:]]
+                idle = values[3] + values[4] # idle + iowait
+                ticks.append((sum(values) - idle, sum(values)))
+    return np.array(ticks, dtype = float)
+
+def processTicks(pid):
+    # utime + stime of a process (all its threads), from /proc/<pid>/stat
+    with open(f'/proc/{pid}/stat') as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    return int(fields[11]) + int(fields[12])
+
+if __name__ == "__main__":
+    # CPU use per core while the refresh loop runs the engine on every window, as the GUI does (10 ms timer),
+    # with the acquisition as a thread of the same process vs in its own process
+    import argparse
+    from Backends import openBackends
+    from Engine import Engine
+
+    parser = argparse.ArgumentParser(description = 'CPU use per core: acquisition thread vs acquisition process')
+    parser.add_argument('--seconds', type = float, default = 10)
+    parser.add_argument('--backend', default = 'replay', choices = ['replay', 'hardware'])
+    args = parser.parse_args()
+    analogLen, hallLen, encoderLen, plotBuffer = 400, 3000, 200, 0
+    tick = os.sysconf('SC_CLK_TCK')
+
+    def measure(acq, pids):
+        engine = Engine(analogLen = analogLen)
+        cores = cpuTicks()
+        procs = [processTicks(pid) for pid in pids]
+        t0 = time.time()
+        frames0 = acq.framesRead
+        windows = 0
+        while (time.time() - t0 < args.seconds):
+            for (kind, data, t) in acq.buffer.drain():
+                if (kind != CYCLE):
+                    engine.ingest(kind, data, t)
+                else:
+                    engine.process(engine.window())
+                    windows = windows + 1
+            time.sleep(0.01)
+        wall = time.time() - t0
+        cores = cpuTicks() - cores
+        procs = [(processTicks(pid) - p)/tick/wall for (pid, p) in zip(pids, procs)]
+        return 100*cores[:, 0]/np.maximum(cores[:, 1], 1), [100*p for p in procs], windows/wall, (acq.framesRead - frames0)/wall
+
+    np.seterr(divide = 'ignore', invalid = 'ignore')
+    spi, lines, clock = openBackends(args.backend)
+    thread = AcquisitionThread(spi, lines, analogLen, hallLen, encoderLen, plotBuffer, mode = 'concurrent', edgeSource = lines, clock = clock)
+    thread.start()
+    results = [('thread', measure(thread, [os.getpid()]), thread.buffer.dropped)]
+    thread.stop()
+    lines.release()
+
+    proc = AcquisitionProcess(args.backend, analogLen, hallLen, encoderLen, plotBuffer)
+    proc.start()
+    results.append(('process', measure(proc, [os.getpid(), proc.process.pid]), proc.buffer.dropped))
+    proc.stop()
+
+    print(f'{os.cpu_count()} cores, {args.seconds:g} s each')
+    for (name, (cores, procs, windowRate, frameRate), dropped) in results:
+        print(f'{name:8s} {frameRate:7.0f} frames/s, {windowRate:5.1f} windows/s, dropped {dropped}')
+        print('         per core:   ' + '  '.join(f'cpu{k} {cores[k]:5.1f}%' for k in range(0,len(cores))))
+        print('         per process: ' + '  '.join(f'{p:5.1f}%' for p in procs) + ('  (reader, producer)' if (len(procs) > 1) else '  (reader + acquisition)'))
@@ -0,0 +1,276 @@
+import threading
+import time
+
+import numpy as np
+
+from Captures import loadCapture
+from Crossings import crossings
+from EdgeCapture import sortEvents
+from FrameDecoder import encodeFrames
+
+# Frame and line sources for the acquisition thread.
+# The acquisition only needs:
+#   SPI source:  xfer2(tx) -> received bytes (16 per frame) and max_speed_hz
+#   line source: get_values() -> the 7 line levels, and for edge capture read(timeout) -> (line, value, t)
+#                and release() (see EdgeCapture.py)
+#   clock:       the timebase samples are stamped on (time.time for hardware)
+# so the hardware (spidev / libgpiod) can be swapped for a replay of the oscilloscope captures and the whole
+# app run and load-tested on any Linux box. spidev and gpiod are only imported by the hardware backend.
+#
+# openBackends(kind) -> spi, lines, clock
+#   kind = 'hardware': SPI0.0 at 1 MHz and gpiochip4 lines 23, 24, 25, 17, 27, 22, 5
+#   kind = 'replay': the captures below looped forever; realTime = False replays as fast as the reader
+#     pulls frames, with a replay clock that advances by the frames delivered instead of the wall clock.
+#   kind = 'recording': a recording made with Recorder.py, played back by Playback.py (path = the file)
+
+LINE_OFFSETS = [23, 24, 25, 17, 27, 22, 5]
+
+ADC_VREF = 3.3 # LaunchPad ADC full scale, volts at the sensing PCB outputs
+ADC_CODES = 4095
+LOGIC_LEVEL = 1.5 # GPIO input threshold, with hysteresis against ringing on the raw captures
+LOGIC_HYSTERESIS = 0.5
+
+# Captures used by the replay (CH1..3 of each file)
+REPLAY_VOLTS = 'uvw filt run0' # U, V, W phase voltage sense outputs
+REPLAY_AMPS = 'i uvw0' # U, V, W phase current sense outputs
+REPLAY_HALL = 'hall raw0' # hall A, B, C
+REPLAY_ENCODER = 'enc raw1' # encoder A, B, Z
+# The encoder capture is a zoomed-in shot (3.2 ns per sample) and does not run at the hall capture's speed.
+# It is replayed on a time base scaled so its A line has ENCODER_LINES periods per mechanical revolution at the
+# speed of the hall capture (POLE_PAIRS electrical periods per revolution).
+POLE_PAIRS = 4
+ENCODER_LINES = 64
+# Sense output levels of a capture slot left empty (None): 0 V phase voltage, 0 A phase current, lines low
+IDLE_VOLTS = 0
+IDLE_AMPS = 5/(20/9009)*ADC_VREF/ADC_CODES
+IDLE_LINES = 0
+
+class SpidevBackend:
+    def __init__(self, bus = 0, device = 0, speed = 1000000, mode = 0):
+        import spidev
+        self.spi = spidev.SpiDev()
+        self.spi.open(bus, device)
+        self.spi.max_speed_hz = speed
+        self.spi.mode = mode
+        self.max_speed_hz = speed
+
+    def xfer2(self, tx):
+        return self.spi.xfer2(tx)
+
+    def close(self):
+        self.spi.close()
+
+class GpiodLines:
+    # Plain polled inputs (libgpiod v1 bindings)
+    def __init__(self, chipName = 'gpiochip4', offsets = LINE_OFFSETS, consumer = 'my_gpio_reader'):
+        import gpiod
+        chip = gpiod.Chip(chipName)
+        self.lines = chip.get_lines(offsets)
+        self.lines.request(consumer = consumer, type = gpiod.LINE_REQ_DIR_IN)
+
+    def get_values(self):
+        return self.lines.get_values()
+
+    def release(self):
+        self.lines.release()
+
+class ReplayClock:
+    # Wall clock in real time; otherwise a clock that only moves when the SPI replay delivers frames,
+    # so frames and edges stay on one timebase however fast they are pulled.
+    def __init__(self, realTime = True):
+        self.realTime = realTime
+        self.tStart = time.time()
+        self.elapsed = 0
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        if self.realTime:
+            return time.time()
+        return self.tStart + self.elapsed
+
+    def advance(self, dt):
+        with self.lock:
+            self.elapsed = self.elapsed + dt
+
+def captureLoop(name, idleLevel = 0):
+    # Capture as a periodic signal: sample times from 0 and the loop length.
+    # The loop runs from the first to the last rising crossing of channel 0 through its mid level, a whole number
+    # of the capture's own periods, so it wraps without a phase jump; a capture with fewer than two crossings is
+    # looped whole. No capture (None) is a flat idleLevel on all three channels.
+    if (name is None):
+        return np.array([0.0, 1.0]), np.full((3, 2), idleLevel, dtype = np.float32), 1.0
+    t, channels = loadCapture(name)
+    low, high = np.percentile(channels[0], [5, 95])
+    idx = crossings(channels[0], (low + high)/2, 'rising', hysteresis = (high - low)/2) + 1
+    if (len(idx) < 2):
+        dt = (t[-1] - t[0])/(len(t) - 1)
+        return t - t[0], channels, len(t)*dt
+    return t[idx[0]:idx[-1]] - t[idx[0]], channels[:, idx[0]:idx[-1]], t[idx[-1]] - t[idx[0]]
+
+def linePeriod(t, x):
+    # Median time between rising edges of a logic line capture, None with fewer than two
+    idx = crossings(x, LOGIC_LEVEL, 'rising', hysteresis = LOGIC_HYSTERESIS)
+    if (len(idx) < 2):
+        return None
+    return float(np.median(np.diff(t[idx])))
+
+class ReplaySpi:
+    # Frames built from the voltage and current captures, resampled at the frame period and looped.
+    # In real time each transfer returns when its last frame would have been clocked out.
+    def __init__(self, clock, speed = 1000000, refSpeedCode = 600, volts = REPLAY_VOLTS, amps = REPLAY_AMPS):
+        self.clock = clock
+        self.max_speed_hz = speed
+        self.framePeriod = 128/speed
+        self.refSpeedCode = refSpeedCode
+
+        tVolts, volts, self.periodVolts = captureLoop(volts, IDLE_VOLTS)
+        tAmps, amps, self.periodAmps = captureLoop(amps, IDLE_AMPS)
+        self.captures = [(tVolts, volts, self.periodVolts), (tAmps, amps, self.periodAmps)]
+        self.tNext = None
+
+    def codes(self, t):
+        # Capture voltages at replay times t -> ADC codes (7, N)
+        codes = np.empty((7, len(t)))
+        for (k, (tCap, channels, period)) in enumerate(self.captures):
+            phase = np.mod(t, period)
+            for c in range(0,3):
+                codes[3*k + c] = np.interp(phase, tCap, channels[c], period = period)
+        codes[0:6] = np.clip(np.round(codes[0:6]*ADC_CODES/ADC_VREF), 0, ADC_CODES)
+        codes[6] = self.refSpeedCode
+        return codes
+
+    def xfer2(self, tx):
+        n = len(tx)//16
+        tNow = self.clock()
+        if (self.tNext is None) or (self.tNext < tNow - 1):
+            self.tNext = tNow # start, or resync after a long gap (pause)
+        t = self.tNext + self.framePeriod*np.arange(1, n + 1)
+        self.tNext = t[-1]
+
+        rx = encodeFrames(self.codes(t)).tobytes()
+        if self.clock.realTime:
+            wait = self.tNext - time.time()
+            if (wait > 0):
+                time.sleep(wait)
+        else:
+            self.clock.advance(n*self.framePeriod)
+        return rx
+
+    def close(self):
+        pass
+
+class ReplayLines:
+    # Hall and encoder levels thresholded from their captures and looped, served both as polled values and as
+    # edge events, in the line order of LINE_OFFSETS (hall C, B, A, encoder B, A, Z, mode switch).
+    def __init__(self, clock, hall = REPLAY_HALL, encoder = REPLAY_ENCODER, modeSwitch = 1):
+        self.clock = clock
+        self.modeSwitch = modeSwitch
+
+        tHall, hall, periodHall = captureLoop(hall, IDLE_LINES)
+        tEnc, enc, periodEnc = captureLoop(encoder, IDLE_LINES)
+
+        # Encoder time base from the hall speed (hall A and encoder A are channel 0); with no hall edges in the
+        # hall slot, the speed of the default hall capture
+        periodElec = linePeriod(tHall, hall[0])
+        if (periodElec is None):
+            tDefault, hallDefault, periodDefault = captureLoop(REPLAY_HALL)
+            periodElec = linePeriod(tDefault, hallDefault[0])
+        periodA = linePeriod(tEnc, enc[0])
+        if (periodA is not None):
+            scale = periodElec*POLE_PAIRS/ENCODER_LINES/periodA
+            tEnc = tEnc*scale
+            periodEnc = periodEnc*scale
+        # Per line: (sample times, levels, loop length) and the edges within one loop (offset into the loop, level after)
+        self.traces = []
+        self.edges = []
+        for (tCap, channels, period, order) in [(tHall, hall, periodHall, [2, 1, 0]), (tEnc, enc, periodEnc, [1, 0, 2])]:
+            for c in order:
+                x = channels[c]
+                idx = crossings(x, LOGIC_LEVEL, 'both', hysteresis = LOGIC_HYSTERESIS) + 1
+                toggles = np.zeros(len(x), dtype = np.uint8)
+                toggles[idx] = 1
+                levels = (int(x[0] > LOGIC_LEVEL) + np.cumsum(toggles)) % 2
+                levels = levels.astype(np.uint8)
+                if (levels[0] != levels[-1]):
+                    idx = np.concatenate(([0], idx)) # the wrap from the end of the loop back to the start
+                self.traces.append((tCap, levels, period))
+                self.edges.append((tCap[idx], levels[idx], period))
+        self.tLast = None
+
+    def get_values(self):
+        t = self.clock()
+        values = []
+        for (tCap, levels, period) in self.traces:
+            i = np.searchsorted(tCap, np.mod(t, period), side = 'right') - 1
+            values.append(int(levels[max(i, 0)]))
+        return values + [self.modeSwitch]
+
+    def read(self, timeout):
+        # Edges in (tLast, now]; as fast as possible only yields briefly so the SPI side can move the clock
+        time.sleep(timeout if self.clock.realTime else 0.001)
+        t1 = self.clock()
+        t0 = t1 if (self.tLast is None) else self.tLast
+        self.tLast = t1
+        return self.edgesBetween(t0, t1)
+
+    def edgesBetween(self, t0, t1):
+        # All edges in (t0, t1] of the looped captures, sorted by time
+        lineIdx = []
+        values = []
+        times = []
+        for k in range(0,len(self.edges)):
+            offsets, levels, period = self.edges[k]
+            if (len(offsets) == 0):
+                continue
+            loops = np.arange(np.floor(t0/period), np.floor(t1/period) + 1)
+            edgeTimes = (loops[:, None]*period + offsets[None, :]).ravel()
+            keep = (edgeTimes > t0) & (edgeTimes <= t1)
+            times.append(edgeTimes[keep])
+            values.append(np.tile(levels, len(loops))[keep])
+            lineIdx.append(np.full(np.count_nonzero(keep), k, dtype = np.int64))
+
+        if (len(times) == 0):
+            return np.zeros(0, dtype = np.int64), np.zeros(0, dtype = np.uint8), np.zeros(0)
+        return sortEvents(np.concatenate(lineIdx), np.concatenate(values), np.concatenate(times))
+
+    def release(self):
+        pass
+
+def openBackends(kind = 'hardware', edgeCapture = True, realTime = True, path = None):
+    if (kind == 'recording'):
+        from Playback import Playback
+        playback = Playback(path)
+        return playback, playback, playback
+
+    if (kind == 'replay'):
+        clock = ReplayClock(realTime)
+        return ReplaySpi(clock), ReplayLines(clock), clock
+
+    spi = SpidevBackend(0, 0, 1000000, 0)
+    if edgeCapture:
+        from EdgeCapture import GpiodEventSource
+        lines = GpiodEventSource('gpiochip4', LINE_OFFSETS)
+    else:
+        lines = GpiodLines('gpiochip4', LINE_OFFSETS)
+    return spi, lines, time.time
+
+if __name__ == "__main__":
+    # Replay throughput: frames and edges per second of wall time, as fast as possible
+    from FrameDecoder import decodeFrames, scaleCodes
+
+    spi, lines, clock = openBackends('replay', realTime = False)
+    tx = [0x00]*(16*50)
+    t0 = time.perf_counter()
+    count = 0
+    while (time.perf_counter() - t0 < 1):
+        rx = spi.xfer2(tx)
+        count = count + 50
+    wall = time.perf_counter() - t0
+    codes, valid = decodeFrames(np.frombuffer(rx, dtype = np.uint8).reshape(50, 16))
+    print(f'SPI replay: {count/wall:9.0f} frames/s ({count*spi.framePeriod/wall:5.1f}x real time), all valid {valid.all()}')
+    print('last frame:', np.round(scaleCodes(codes)[:, -1], 2))
+
+    lines.read(0)
+    spi.xfer2([0x00]*(16*256*40)) # ~1.3 s of replay time
+    lineIdx, values, times = lines.read(0)
+    print(f'edges per line over {times[-1] - times[0]:.2f} s of replay:', np.bincount(lineIdx, minlength = 7))
@@ -0,0 +1,187 @@
+import argparse
+import csv
+import glob
+import itertools
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from Acquisition import ANALOG, EDGES
+from Backends import ReplayClock, ReplaySpi, ReplayLines
+from Captures import CAPTURE_DIR, listCaptures
+from EdgeCapture import EdgeSampler
+from Engine import Engine
+from Recorder import openRecording
+
+# Offline analysis of a directory of captures: every session in it is run through the visualizer's processing
+# (Engine.py: frequency estimate, filtering, dq transform, speed from the hall edges) window by window, as fast as
+# the data can be read, and every window becomes one row of a single summary table (CSV).
+#
+# Sessions:
+#   recordings (*.focrec, Recorder.py): the whole recording, frames and edges with their recorded timestamps
+#   oscilloscope captures (*.csv, Captures.py): replayed through the replay backend (Backends.py) for --seconds,
+#     one session per capture in the slot of its kind (from the start of its name), with the other slots idle.
+#     The captures were taken one at a time, so captures of different kinds are not paired up.
+# Each window is fed exactly what the acquisition delivers in concurrent mode (analogLen frames in 50-frame
+# transfers, then the hall/encoder states rebuilt from the edges over the same time) before it is processed.
+# Sessions run in parallel on a process pool, one worker per core by default. Workers load their own captures
+# (through the sidecar cache) and return their rows, which are written in session order.
+#
+# Columns: session, window, t (s from the start of the session), running, f_est (Hz electrical), seq,
+#   speed (rpm, as on the speed plot), speedHall (rpm from the hall edges), vd, vq, v0 (V), id, iq, i0 (A)
+# speed and speedHall are magnitudes: their signs come from different references (phase sequence and hall edge
+# order) and need not agree, so the direction is left to seq.
+# Columns a capture session cannot produce are left empty rather than written as zeros: running and f_est need
+# voltages or currents, speed those or the hall lines, seq and id/iq/i0 the currents, vd/vq/v0 the voltages and
+# speedHall the hall lines. The frequency estimate only uses the channels the session has.
+#
+# python BatchAnalysis.py [directory] [--out summary.csv] [--workers N] [--analog-len 400] [--seconds 2]
+
+FRAMES_PER_READ = 50
+DIGITAL_PERIOD = 34e-6
+DEFAULT_LEVELS = (0, 0, 0, 0, 0, 0, 1) # line levels before the first recorded edge
+
+# Capture kind from the start of the file name, in match order ("i uvw0" is currents, not voltages)
+CAPTURE_KINDS = [('hall', 'hall'), ('enc', 'encoder'), ('i', 'amps'), ('uvw', 'volts')]
+REPLAY_SLOTS = ['volts', 'amps', 'hall', 'encoder']
+
+COLUMNS = ['session', 'window', 't', 'running', 'f_est', 'seq', 'speed', 'speedHall', 'vd', 'vq', 'v0', 'id', 'iq', 'i0']
+
+def captureKind(path):
+    name = os.path.basename(path).lower()
+    for (prefix, kind) in CAPTURE_KINDS:
+        if name.startswith(prefix):
+            return kind
+    return None
+
+def findSessions(directory):
+    # -> [(name, kind, sources)], recordings first; sources is the path or the {slot: capture path or None} of a replay
+    sessions = [(os.path.basename(p), 'recording', p) for p in sorted(glob.glob(os.path.join(directory, '*.focrec')))]
+
+    for path in listCaptures(directory):
+        kind = captureKind(path)
+        if (kind is not None):
+            sources = dict.fromkeys(REPLAY_SLOTS)
+            sources[kind] = path
+            sessions.append((os.path.splitext(os.path.basename(path))[0], 'replay', sources))
+    return sessions
+
+def transfers(frames, t):
+    # One analog window as the acquisition's 50-frame records
+    return [(ANALOG, frames[m:(m + FRAMES_PER_READ)], t[m:(m + FRAMES_PER_READ)]) for m in range(0,len(t),FRAMES_PER_READ)]
+
+def recordingWindows(path, analogLen):
+    # -> (t, records) per window of analogLen recorded frames
+    header, frames, edges = openRecording(path)
+    sampler = EdgeSampler(DEFAULT_LEVELS, DIGITAL_PERIOD)
+    edgeIdx = 0
+    tFirst = frames['t'][0] if (len(frames) > 0) else 0
+    for start in range(0,len(frames) - analogLen + 1,analogLen):
+        block = np.array(frames[start:(start + analogLen)])
+        tNow = block['t'][-1]
+        stop = edgeIdx + int(np.searchsorted(edges['t'][edgeIdx:], tNow, side = 'right'))
+        chunk = np.array(edges[edgeIdx:stop])
+        edgeIdx = stop
+
+        lineIdx = chunk['line'].astype(np.int64)
+        states, t = sampler.sample(lineIdx, chunk['value'], chunk['t'], tNow)
+        records = transfers(block['frame'], block['t'])
+        records.append((EDGES, (states, (lineIdx, chunk['value'], chunk['t'])), t))
+        yield tNow - tFirst, records
+
+def replayWindows(sources, analogLen, seconds):
+    # -> (t, records) per window of the looped captures, on a replay clock
+    clock = ReplayClock(realTime = False)
+    clock.tStart = 0 # the loops are phased by the clock time, so start every run at the same point
+    spi = ReplaySpi(clock, volts = sources['volts'], amps = sources['amps'])
+    lines = ReplayLines(clock, hall = sources['hall'], encoder = sources['encoder'])
+    sampler = EdgeSampler(lines.get_values(), DIGITAL_PERIOD)
+    tx = [0x00]*(16*analogLen)
+    tFirst = clock()
+    tLines = tFirst
+    for k in range(0,max(int(seconds/(analogLen*spi.framePeriod)), 1)):
+        tStart = clock()
+        frames = np.frombuffer(spi.xfer2(tx), dtype = np.uint8).reshape(analogLen, 16)
+        tNow = clock()
+        lineIdx, values, times = lines.edgesBetween(tLines, tNow)
+        tLines = tNow
+        states, t = sampler.sample(lineIdx, values, times, tNow)
+        records = transfers(frames, tStart + spi.framePeriod*np.arange(1, analogLen + 1))
+        records.append((EDGES, (states, (lineIdx, values, times)), t))
+        yield tNow - tFirst, records
+
+def cell(value, valid):
+    # A summary value, or an empty cell where the session has no data for it
+    return value if valid else None
+
+def analyzeSession(session, analogLen = 400, seconds = 2):
+    # -> summary rows of one session (runs in a worker process)
+    name, kind, sources = session
+    if (kind == 'recording'):
+        has = dict.fromkeys(REPLAY_SLOTS, True)
+        windows = recordingWindows(sources, analogLen)
+    else:
+        has = {slot: (sources[slot] is not None) for slot in REPLAY_SLOTS}
+        windows = replayWindows(sources, analogLen, seconds)
+    engine = Engine(analogLen = analogLen, liveChannels = [has['volts']]*3 + [has['amps']]*3)
+    analog = has['volts'] or has['amps']
+
+    rows = []
+    for (k, (t, records)) in enumerate(windows):
+        for (recordKind, data, tRecord) in records:
+            engine.ingest(recordKind, data, tRecord)
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            r = engine.process(engine.window())
+        # no hall edges in the window (NaN from the engine): speedHall is 0, and so is speed while nothing is running
+        speed, speedHall = np.nan_to_num(np.abs([r.speed, r.speedEnc]), nan = 0, posinf = 0)
+        volts = has['volts']
+        amps = has['amps']
+        rows.append([name, k, round(float(t), 6), cell(int(r.running), analog), cell(float(r.f_est), analog), cell(int(r.seq), amps),
+            cell(float(speed), analog or has['hall']), cell(float(speedHall), has['hall']),
+            cell(float(r.dVoltsAvg), volts), cell(float(r.qVoltsAvg), volts), cell(float(r.zVoltsAvg), volts),
+            cell(float(r.dAmpsAvg), amps), cell(float(r.qAmpsAvg), amps), cell(float(r.zAmpsAvg), amps)])
+    return rows
+
+def analyzeAll(sessions, workers, analogLen, seconds):
+    # Yields (session, rows) in session order as the pool finishes them
+    with ProcessPoolExecutor(max_workers = workers) as pool:
+        results = pool.map(analyzeSession, sessions, itertools.repeat(analogLen), itertools.repeat(seconds))
+        for (session, rows) in zip(sessions, results):
+            yield session, rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = 'Per-window dq, frequency and speed summary of every capture in a directory')
+    parser.add_argument('directory', nargs = '?', default = CAPTURE_DIR, help = 'directory of *.csv captures and/or *.focrec recordings')
+    parser.add_argument('--out', default = 'summary.csv', help = 'summary table (CSV)')
+    parser.add_argument('--workers', type = int, default = os.cpu_count(), help = 'worker processes (default: one per core)')
+    parser.add_argument('--analog-len', type = int, default = 400, help = 'analog samples per window, as analogLen in the GUI')
+    parser.add_argument('--seconds', type = float, default = 2, help = 'replay length of each oscilloscope capture session')
+    args = parser.parse_args()
+
+    sessions = findSessions(args.directory)
+    if (len(sessions) == 0):
+        sys.exit(f'no captures or recordings in {args.directory}')
+    print(f'{len(sessions)} sessions on {args.workers} workers', file = sys.stderr)
+
+    t0 = time.perf_counter()
+    windows = 0
+    with open(args.out, 'w', newline = '') as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        for ((name, kind, sources), rows) in analyzeAll(sessions, args.workers, args.analog_len, args.seconds):
+            writer.writerows(rows)
+            windows = windows + len(rows)
+            # '-' for what the session has no data for
+            analog = [row for row in rows if (row[3] is not None)]
+            running = [row for row in analog if row[3]]
+            fMean = np.mean([row[4] for row in running]) if (len(running) > 0) else 0
+            speeds = [row[6] for row in rows if (row[6] is not None)]
+            runningText = f'{len(running):6d}' if (len(analog) > 0) else f'{"-":>6s}'
+            fText = f'{fMean:7.2f}' if (len(analog) > 0) else f'{"-":>7s}'
+            speedText = f'{np.mean(speeds):8.1f}' if (len(speeds) > 0) else f'{"-":>8s}'
+            print(f'{name:45s} {len(rows):6d} windows, running {runningText}, f_est {fText} Hz, speed {speedText} rpm')
+
+    print(f'{windows} windows in {time.perf_counter() - t0:.1f} s, saved {args.out}', file = sys.stderr)
@@ -0,0 +1,176 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from Acquisition import ANALOG, EDGES
+from Backends import ReplayClock, ReplaySpi, ReplayLines
+from EdgeCapture import EdgeSampler
+from Engine import Engine
+from FrameDecoder import decodeFrames, scaleCodes
+from Resample import interpStack
+from Spectrum import estimateFundamental
+from Transforms import dq0
+
+# Benchmark of one refresh, stage by stage, driven by the captures in Oscilloscope_Data (see Backends.py).
+# For each analogLen the engine is fed exactly what the acquisition would deliver for one refresh (analogLen frames
+# in 50-frame transfers plus the edge-rebuilt hall/encoder samples over the same time), then the window is processed
+# and, unless --no-render, drawn onto the same number of plot curves as the GUI.
+#
+# Stages (ms per refresh):
+#   decode   decodeFrames + scaleCodes of the frames
+#   ingest   engine.ingest of all records (decode again, ring buffers, streaming filter, frequency tracker)
+#   window   engine.window() snapshot
+#   process  engine.process(window), split further below by running its main steps on the same window:
+#            resample (uniform grid for the 6 channels), spectrum (batched rfft), dq0 (both transforms)
+#   render   setData on 30 curves + vector items and one repaint (offscreen)
+#   refresh  ingest + window + process + render
+# plus samples/s (frames through ingest per second of ingest time) and refreshes/s (1/mean refresh).
+#
+# python Benchmark.py [--sizes 400 1024 ...] [--refreshes 50] [--out benchmark.json] [--no-render]
+
+SIZES = [400, 1024, 2048, 4096, 8192]
+FRAMES_PER_READ = 50
+DIGITAL_PERIOD = 34e-6
+CURVES = 30 # setData calls per refresh in ProcessWindow (24 traces + 6 speed/dq histories)
+VECTOR_ITEMS = 12
+
+def percentiles(samples):
+    x = 1e3*np.asarray(samples)
+    return {'mean': float(np.mean(x)), 'p50': float(np.percentile(x, 50)), 'p90': float(np.percentile(x, 90)),
+        'p99': float(np.percentile(x, 99)), 'max': float(np.max(x))}
+
+class Renderer:
+    # Stand-in for the GUI's plots: the same number of curves and items, updated and repainted offscreen
+    def __init__(self):
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+        import pyqtgraph as pg
+        self.app = pg.mkQApp()
+        self.widget = pg.GraphicsLayoutWidget()
+        self.curves = []
+        for k in range(0,4):
+            plot = self.widget.addPlot(row = k//2, col = k % 2)
+            self.curves = self.curves + [plot.plot() for m in range(0,CURVES//4 + 1)]
+        self.curves = self.curves[0:CURVES]
+        vectorPlot = self.widget.addPlot(row = 2, col = 0)
+        self.vectors = [vectorPlot.plot() for m in range(0,VECTOR_ITEMS)]
+        self.widget.resize(1280, 720)
+        self.widget.show()
+
+    def draw(self, r):
+        traces = [r.hallA, r.hallB, r.hallC, r.encoderA, r.encoderB, r.encoderZ,
+            r.uvVolts, r.vwVolts, r.wuVolts, r.uAmps, r.vAmps, r.wAmps, r.uvVolts, r.vwVolts, r.wuVolts, r.uAmps, r.vAmps, r.wAmps,
+            r.dVolts, r.qVolts, r.zVolts, r.dAmps, r.qAmps, r.zAmps, r.dVolts, r.qVolts, r.zVolts, r.dAmps, r.qAmps, r.zAmps]
+        for k in range(0,len(self.curves)):
+            y = traces[k]
+            self.curves[k].setData(np.arange(len(y)), y)
+        (vd, vq) = r.vdq
+        for k in range(0,len(self.vectors)):
+            self.vectors[k].setData([0, vd], [0, vq])
+        self.app.processEvents()
+
+def runSize(analogLen, refreshes, renderer = None, warmup = 3):
+    clock = ReplayClock(realTime = False)
+    spi = ReplaySpi(clock)
+    lines = ReplayLines(clock)
+    engine = Engine(analogLen = analogLen, analogPlotLen = 200)
+    sampler = EdgeSampler(lines.get_values(), DIGITAL_PERIOD)
+    tx = [0x00]*(16*FRAMES_PER_READ)
+
+    stages = {name: [] for name in ['decode', 'ingest', 'window', 'process', 'resample', 'spectrum', 'dq0', 'render', 'refresh']}
+    frames = 0
+    ingestTime = 0
+    tLines = clock()
+    for k in range(0,warmup + refreshes):
+        # One refresh worth of records, prepared outside the timed stages
+        records = []
+        for m in range(0,int(np.ceil(analogLen/FRAMES_PER_READ))):
+            tStart = clock()
+            rx = spi.xfer2(tx)
+            data = np.frombuffer(rx, dtype = np.uint8).reshape(FRAMES_PER_READ, 16)
+            records.append((ANALOG, data, tStart + spi.framePeriod*np.arange(1, FRAMES_PER_READ + 1)))
+        tNow = clock()
+        lineIdx, values, times = lines.edgesBetween(tLines, tNow)
+        tLines = tNow
+        states, t = sampler.sample(lineIdx, values, times, tNow)
+        records.append((EDGES, (states, (lineIdx, values, times)), t))
+
+        t0 = time.perf_counter()
+        for (kind, data, t) in records:
+            if (kind == ANALOG):
+                codes, valid = decodeFrames(data)
+                scaleCodes(codes)
+        t1 = time.perf_counter()
+        for (kind, data, t) in records:
+            engine.ingest(kind, data, t)
+        t2 = time.perf_counter()
+        w = engine.window()
+        t3 = time.perf_counter()
+        r = engine.process(w)
+        t4 = time.perf_counter()
+        if (renderer is not None):
+            renderer.draw(r)
+        t5 = time.perf_counter()
+
+        # Main steps of process() on the same window
+        phases = np.stack((w.uVolts, w.vVolts, w.wVolts, w.uAmps, w.vAmps, w.wAmps))
+        timeUniform = np.linspace(w.timeVec[0], w.timeVec[-1], len(w.timeVec))
+        t6 = time.perf_counter()
+        uniform = interpStack(timeUniform, w.timeVec, phases)
+        t7 = time.perf_counter()
+        estimateFundamental(uniform, 1/np.median(np.diff(timeUniform)))
+        t8 = time.perf_counter()
+        theta = 2*np.pi*50*timeUniform[0:2*engine.analogPlotLen]
+        dq0(uniform[0:3, 0:len(theta)], theta)
+        dq0(uniform[3:6, 0:len(theta)], theta)
+        t9 = time.perf_counter()
+
+        if (k < warmup):
+            continue
+        frames = frames + analogLen
+        ingestTime = ingestTime + (t2 - t1)
+        for (name, dt) in [('decode', t1 - t0), ('ingest', t2 - t1), ('window', t3 - t2), ('process', t4 - t3),
+                           ('render', t5 - t4), ('refresh', t5 - t1), ('resample', t7 - t6), ('spectrum', t8 - t7), ('dq0', t9 - t8)]:
+            stages[name].append(dt)
+
+    if (renderer is None):
+        del stages['render']
+    return {'analogLen': analogLen, 'refreshes': refreshes,
+        'stages': {name: percentiles(samples) for (name, samples) in stages.items()},
+        'samplesPerSecond': frames/ingestTime, 'refreshesPerSecond': 1/np.mean(stages['refresh'])}
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output = True, text = True,
+            cwd = os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {'host': platform.node(), 'machine': platform.machine(), 'processor': platform.processor(),
+        'python': platform.python_version(), 'numpy': np.__version__, 'commit': commit,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = 'Per-stage refresh benchmark on the recorded captures')
+    parser.add_argument('--sizes', type = int, nargs = '+', default = SIZES, help = 'analogLen values')
+    parser.add_argument('--refreshes', type = int, default = 50, help = 'timed refreshes per size')
+    parser.add_argument('--out', default = 'benchmark.json', help = 'JSON results file')
+    parser.add_argument('--no-render', action = 'store_true', help = 'skip the plotting stage (no Qt needed)')
+    args = parser.parse_args()
+
+    renderer = None if args.no_render else Renderer()
+    results = []
+    for analogLen in args.sizes:
+        res = runSize(analogLen, args.refreshes, renderer)
+        results.append(res)
+        print(f'analogLen {analogLen:5d}: {res["samplesPerSecond"]:9.0f} samples/s, {res["refreshesPerSecond"]:7.1f} refreshes/s')
+        for (name, p) in res['stages'].items():
+            print(f'    {name:8s} p50 {p["p50"]:8.3f}  p90 {p["p90"]:8.3f}  p99 {p["p99"]:8.3f}  max {p["max"]:8.3f} ms')
+
+    with open(args.out, 'w') as f:
+        json.dump({'environment': environment(), 'results': results}, f, indent = 2)
+    print('saved', args.out, file = sys.stderr)
@@ -0,0 +1,127 @@
+import glob
+import hashlib
+import os
+
+import numpy as np
+
+# Loading of the Rigol DHO804 captures in Oscilloscope_Data.
+# Two CSV layouts are in use:
+#   "Time(s),CH1V,CH2V,CH3V"                      one time column per row
+#   "CH1V,CH2V,CH3V,t0 =-5.0e-05, tInc = 3.2e-09," no time column, t0 and tInc given in the header
+# Both load into t (N,) float64 seconds and channels (C, N) float32 volts.
+#
+# Parsed captures are cached as .npz sidecars in Oscilloscope_Data/.cache, one per CSV path, holding the CSV's size,
+# mtime and SHA-1. A repeat load of an unchanged file costs a stat and one binary read; when the size or mtime differ
+# the CSV is hashed, and only parsed again if the hash differs too (a touched but unedited file is not).
+# Without write access to the cache directory the CSV is just parsed every time.
+
+CAPTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Oscilloscope_Data')
+CACHE_DIR = os.path.join(CAPTURE_DIR, '.cache')
+CACHE_VERSION = 2
+
+def capturePath(name):
+    # Bare names ("hall raw0") are looked up in Oscilloscope_Data
+    if os.path.exists(name):
+        return name
+    if not name.endswith('.csv'):
+        name = name + '.csv'
+    return os.path.join(CAPTURE_DIR, name)
+
+def listCaptures(directory = CAPTURE_DIR):
+    return sorted(glob.glob(os.path.join(directory, '*.csv')))
+
+def parseHeader(header):
+    # -> channel names, t0, tInc (t0/tInc are None when the file has a time column)
+    fields = [f.strip() for f in header.strip().split(',')]
+    names = []
+    t0 = None
+    tInc = None
+    for f in fields:
+        if f.startswith('t0'):
+            t0 = float(f.split('=')[1])
+        elif f.startswith('tInc'):
+            tInc = float(f.split('=')[1])
+        elif (f != ''):
+            names.append(f)
+    if (len(names) == 0) or ((tInc is None) and (names[0] != 'Time(s)')) or ((tInc is None) != (t0 is None)):
+        raise ValueError(f'unknown capture header: {header.strip()}')
+    return names, t0, tInc
+
+def parseCapture(path):
+    # CSV -> t, channels, channel names
+    with open(path) as f:
+        names, t0, tInc = parseHeader(f.readline())
+
+    data = np.loadtxt(path, delimiter = ',', skiprows = 1, usecols = range(0,len(names)), ndmin = 2)
+    if (tInc is None):
+        return data[:, 0].copy(), np.ascontiguousarray(data[:, 1:].T, dtype = np.float32), names[1:]
+
+    t = t0 + tInc*np.arange(data.shape[0])
+    return t, np.ascontiguousarray(data.T, dtype = np.float32), names
+
+def fileHash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+def loadCapture(name, cache = True):
+    t, channels, names = loadCaptureNamed(name, cache)
+    return t, channels
+
+def sidecarPath(path):
+    return os.path.join(CACHE_DIR, hashlib.sha1(os.path.realpath(path).encode()).hexdigest() + '.npz')
+
+def readSidecar(sidecar):
+    # -> dict of the sidecar's fields, None if it is missing, unreadable or from another cache version
+    try:
+        with np.load(sidecar) as f:
+            if (int(f['version']) == CACHE_VERSION):
+                return {'size': int(f['size']), 'mtime': int(f['mtime']), 'sha1': str(f['sha1']),
+                    't': f['t'], 'channels': f['channels'], 'names': [str(n) for n in f['names']]}
+    except (OSError, KeyError, ValueError):
+        pass
+    return None
+
+def loadCaptureNamed(name, cache = True):
+    # -> t, channels, channel names, through the sidecar cache
+    path = capturePath(name)
+    if not cache:
+        return parseCapture(path)
+
+    stat = os.stat(path) # taken before reading, so an edit during the load shows up as a mismatch next time
+    sidecar = sidecarPath(path)
+    cached = readSidecar(sidecar)
+    if (cached is not None) and (cached['size'] == stat.st_size) and (cached['mtime'] == stat.st_mtime_ns):
+        return cached['t'], cached['channels'], cached['names']
+
+    sha1 = fileHash(path)
+    if (cached is not None) and (cached['sha1'] == sha1):
+        t, channels, names = cached['t'], cached['channels'], cached['names']
+    else:
+        t, channels, names = parseCapture(path)
+    try:
+        os.makedirs(CACHE_DIR, exist_ok = True)
+        tmp = sidecar + '.tmp.npz'
+        np.savez(tmp, version = CACHE_VERSION, size = stat.st_size, mtime = stat.st_mtime_ns, sha1 = sha1,
+            t = t, channels = channels, names = np.array(names))
+        os.replace(tmp, sidecar) # whole files only, if several processes fill the cache at once
+    except OSError:
+        pass
+    return t, channels, names
+
+if __name__ == "__main__":
+    # First (parse + write sidecar) vs repeat loads of every capture
+    import time
+
+    for path in listCaptures():
+        t0 = time.perf_counter()
+        t, channels, names = loadCaptureNamed(path, cache = False)
+        tParse = time.perf_counter() - t0
+
+        loadCaptureNamed(path)
+        t0 = time.perf_counter()
+        tc, cc, nc = loadCaptureNamed(path)
+        tCached = time.perf_counter() - t0
+
+        assert np.array_equal(t, tc) and np.array_equal(channels, cc) and (names == nc)
+        print(f'{os.path.basename(path):20s} {channels.shape[1]:6d} x {len(names)} ({t[1] - t[0]:.2e} s step): '
+            f'parse {1e3*tParse:6.2f} ms, cached {1e3*tCached:5.2f} ms')
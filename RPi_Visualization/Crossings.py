@@ -0,0 +1,115 @@
+import numpy as np
+
+# Edge and level-crossing search on sampled traces (hall/encoder states, filtered phase signals).
+# A crossing at index i means the trace passes the level between samples i and i + 1.
+#
+# edge = 'rising' / 'falling' / 'both'
+# inclusive = False: strict sign change, x[i] < level <= x[i+1] (rising) or x[i] >= level > x[i+1] (falling)
+# inclusive = True: touching counts, x[i] <= level <= x[i+1] (rising) or x[i] >= level >= x[i+1] (falling)
+# hysteresis = h > 0: the trace has to leave the band level +- h/2 on the other side before the next edge
+#   counts, so noise around the level does not produce extra edges. The edge is then placed where the trace
+#   leaves the band.
+
+def crossings(x, level = 0, edge = 'rising', inclusive = False, hysteresis = 0):
+    x = np.asarray(x)
+    if (len(x) < 2):
+        return np.zeros(0, dtype = np.int64)
+
+    if (hysteresis > 0):
+        high = x > level + hysteresis/2
+        low = x < level - hysteresis/2
+        # state = last side of the band visited (1 high, 0 low), carried through samples inside the band
+        idx = np.where(high | low, np.arange(len(x)), -1)
+        idx = np.maximum.accumulate(idx)
+        known = idx >= 0
+        state = high[np.maximum(idx, 0)]
+        change = known[1:] & known[:-1] & (state[1:] != state[:-1])
+        rising = change & state[1:]
+        falling = change & ~state[1:]
+    elif inclusive:
+        rising = (x[:-1] <= level) & (x[1:] >= level)
+        falling = (x[:-1] >= level) & (x[1:] <= level)
+    else:
+        rising = (x[:-1] < level) & (x[1:] >= level)
+        falling = (x[:-1] >= level) & (x[1:] < level)
+
+    if (edge == 'rising'):
+        return np.flatnonzero(rising)
+    if (edge == 'falling'):
+        return np.flatnonzero(falling)
+    return np.flatnonzero(rising | falling)
+
+def firstCrossing(x, level = 0, edge = 'rising', start = 0, stop = None, inclusive = False, hysteresis = 0, default = None):
+    # First crossing index in [start, stop), or default if there is none
+    x = np.asarray(x)
+    if (stop is None):
+        stop = len(x) - 1
+    start = max(start, 0)
+    stop = min(stop, len(x) - 1)
+    if (stop <= start):
+        return default
+    found = crossings(x[start:(stop + 1)], level, edge, inclusive, hysteresis)
+    if (len(found) == 0):
+        return default
+    return start + int(found[0])
+
+def crossingTimes(x, t, idx, level = 0):
+    # Sub-sample crossing times by linear interpolation between samples i and i + 1
+    x = np.asarray(x, dtype = float)
+    t = np.asarray(t, dtype = float)
+    idx = np.asarray(idx, dtype = np.int64)
+    x0 = x[idx]
+    x1 = x[idx + 1]
+    dx = x1 - x0
+    frac = np.where(dx != 0, (level - x0)/np.where(dx != 0, dx, 1), 0)
+    frac = np.clip(frac, 0, 1)
+    return t[idx] + frac*(t[idx + 1] - t[idx])
+
+if __name__ == "__main__":
+    # Benchmark on hall-sized buffers: the stopFlag scan loops vs the vectorized searches
+    import time
+
+    def firstLoop(x, cond, start, stop, default):
+        stopFlag = 0
+        for i in range(start,stop):
+            stopFlag = cond(x, i)
+            if(stopFlag == 1):
+                break
+        return i if stopFlag else default
+
+    n = 3000
+    rng = np.random.default_rng(0)
+    reps = 200
+    for f in [20, 50, 300]:
+        t = np.cumsum(rng.uniform(30e-6, 40e-6, n))
+        hallA = (((f*t) % 1) < 0.5) + 3.0
+        hallB = (((f*t - 1/3) % 1) < 0.5) + 1.5
+        uFilt = np.sin(2*np.pi*f*t) + 0.01*rng.normal(size = n)
+
+        cases = [
+            ('hall A rising', hallA, lambda x, i: (x[i] == 3) and (x[i+1] > 3), dict(level = 3.5, edge = 'rising')),
+            ('hall B rising', hallB, lambda x, i: (x[i] == 1.5) and (x[i+1] > 1.5), dict(level = 2, edge = 'rising')),
+            ('zero falling', uFilt, lambda x, i: (x[i] >= 0) and (x[i+1] <= 0), dict(level = 0, edge = 'falling', inclusive = True)),
+            ('-0.15 max', uFilt, lambda x, i: (x[i] >= -0.15*max(x)) and (x[i+1] <= -0.15*max(x)), None),
+        ]
+        for (name, x, cond, kwargs) in cases:
+            if (kwargs is None):
+                kwargs = dict(level = -0.15*np.max(x), edge = 'falling', inclusive = True)
+            # search from the middle of the buffer, so the loop has to cover a typical span
+            start = n//2
+            loopReps = 5 if (kwargs['level'] < 0) else reps # max() inside that loop makes it quadratic
+            t0 = time.perf_counter()
+            for r in range(0,loopReps):
+                firstLoop(x, cond, start, n - 2, -1)
+            tLoop = (time.perf_counter() - t0)/loopReps
+
+            t0 = time.perf_counter()
+            for r in range(0,reps):
+                firstCrossing(x, start = start, stop = n - 2, default = -1, **kwargs)
+            tVector = (time.perf_counter() - t0)/reps
+
+            print(f'{f:4d} Hz {name:14s}: loop {1e6*tLoop:8.1f} us, vectorized {1e6*tVector:6.1f} us ({tLoop/tVector:6.1f}x)')
+
+        idx = crossings(uFilt, 0, 'rising', hysteresis = 0.1)
+        times = crossingTimes(uFilt, t, idx, 0.05)
+        print(f'{f:4d} Hz: {len(idx)} rising crossings with hysteresis, period {np.median(np.diff(times))*1e3:.3f} ms (expected {1000/f:.3f} ms)')
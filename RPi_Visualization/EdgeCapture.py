@@ -0,0 +1,157 @@
+import threading
+import time
+
+import numpy as np
+
+# Edge-event capture for the hall/encoder lines.
+# Event sources return (line, value, t) arrays: the index of the line in the requested offsets,
+# the level after the edge (1 rising, 0 falling) and the edge time on the time.time() timebase.
+#
+# Line order (offsets 23, 24, 25, 17, 27, 22, 5 on gpiochip4):
+# 0 hall C, 1 hall B, 2 hall A, 3 encoder B, 4 encoder A, 5 encoder Z, 6 direction/mode switch
+
+class GpiodEventSource:
+    # Both-edge events from the kernel (libgpiod v1 bindings). Edges are timestamped by the kernel,
+    # read in bulk, and waiting for them blocks in event_wait instead of busy polling.
+    # The kernel keeps only 16 events per line, so read() should be called at least every few ms.
+    def __init__(self, chipName, offsets, consumer = 'my_gpio_reader'):
+        import gpiod
+        self.gpiod = gpiod
+
+        chip = gpiod.Chip(chipName)
+        self.lines = chip.get_lines(offsets)
+        self.lines.request(consumer = consumer, type = gpiod.LINE_REQ_EV_BOTH_EDGES)
+        self.index = {offsets[k]: k for k in range(0,len(offsets))}
+
+        # Event timestamps are CLOCK_MONOTONIC; shift them onto the time.time() timebase used for the SPI samples
+        self.clockOffset = time.time() - time.monotonic()
+
+    def get_values(self):
+        return self.lines.get_values()
+
+    def read(self, timeout):
+        lineIdx = []
+        values = []
+        times = []
+
+        ready = self.lines.event_wait(sec = int(timeout), nsec = int((timeout % 1)*1e9))
+        if ready:
+            for line in ready:
+                for event in line.event_read_multiple():
+                    lineIdx.append(self.index[event.source.offset()])
+                    values.append(1 if (event.type == self.gpiod.LineEvent.RISING_EDGE) else 0)
+                    times.append(event.sec + event.nsec*1e-9 + self.clockOffset)
+
+        return sortEvents(np.array(lineIdx, dtype = np.int64), np.array(values, dtype = np.uint8), np.array(times))
+
+    def release(self):
+        self.lines.release()
+
+class MockEventSource:
+    # Synthetic hall/encoder edges for a motor spinning at a fixed electrical frequency, so the
+    # edge-capture path can run without a Pi. Speed can be changed on the fly with setFrequency().
+    def __init__(self, elecFreq = 50, polePairs = 4, encoderLines = 64, direction = 1, modeSwitch = 1):
+        self.polePairs = polePairs
+        self.encoderLines = encoderLines
+        self.direction = direction
+        self.modeSwitch = modeSwitch
+        self.lock = threading.Lock()
+        self.setFrequency(elecFreq)
+        self.tLast = time.time()
+
+    def setFrequency(self, elecFreq):
+        with self.lock:
+            self.elecFreq = elecFreq
+
+    def waves(self):
+        # (frequency, phase, duty) of the square wave on each line; phase is in cycles
+        f = self.elecFreq
+        fEnc = f*self.encoderLines
+        fRev = f/self.polePairs
+        s = self.direction
+        return [(f, s*2/3, 0.5), (f, s*1/3, 0.5), (f, 0, 0.5), (fEnc, s*0.25, 0.5), (fEnc, 0, 0.5), (fRev, 0, 0.02)]
+
+    def get_values(self):
+        t = time.time()
+        values = []
+        for (f, phase, duty) in self.waves():
+            values.append(int(((f*t - phase) % 1) < duty))
+        return values + [self.modeSwitch]
+
+    def read(self, timeout):
+        time.sleep(timeout)
+        with self.lock:
+            t0 = self.tLast
+            t1 = time.time()
+            self.tLast = t1
+
+            lineIdx = []
+            values = []
+            times = []
+            waves = self.waves()
+            for k in range(0,len(waves)):
+                f, phase, duty = waves[k]
+                for (offset, value) in [(0, 1), (duty, 0)]:
+                    # edges at f*t - phase - offset = integer, within (t0, t1]
+                    m = np.arange(np.floor(f*t0 - phase - offset) + 1, np.floor(f*t1 - phase - offset) + 1)
+                    times.append((m + phase + offset)/f)
+                    values.append(np.full(len(m), value, dtype = np.uint8))
+                    lineIdx.append(np.full(len(m), k, dtype = np.int64))
+
+        return sortEvents(np.concatenate(lineIdx), np.concatenate(values), np.concatenate(times))
+
+    def release(self):
+        pass
+
+def sortEvents(lineIdx, values, times):
+    order = np.argsort(times, kind = 'stable')
+    return lineIdx[order], values[order], times[order]
+
+class EdgeSampler:
+    # Rebuilds uniformly sampled line states from edge events, so the existing traces and plots can be fed
+    # from edges. Edge timing is exact to the sample period here; the raw edges keep the kernel timestamps.
+    def __init__(self, initialValues, period, maxBlock = 100000):
+        self.state = np.array(initialValues, dtype = np.uint8)
+        self.period = period
+        self.maxBlock = maxBlock
+        self.tNext = None
+
+    def sample(self, lineIdx, values, times, tNow):
+        if (self.tNext is None):
+            self.tNext = tNow
+        elif (tNow - self.tNext > self.maxBlock*self.period):
+            # e.g. after a pause: only rebuild the most recent maxBlock samples
+            self.tNext = tNow - (self.maxBlock - 1)*self.period
+
+        m = int(np.floor((tNow - self.tNext)/self.period)) + 1 if (tNow >= self.tNext) else 0
+        grid = self.tNext + self.period*np.arange(m)
+        states = np.empty((m, len(self.state)), dtype = np.uint8)
+
+        for k in range(0,len(self.state)):
+            mask = (lineIdx == k)
+            tk = times[mask]
+            vk = values[mask]
+            if (len(tk) == 0):
+                states[:,k] = self.state[k]
+                continue
+            idx = np.searchsorted(tk, grid, side = 'right') - 1
+            states[:,k] = np.where(idx >= 0, vk[np.maximum(idx, 0)], self.state[k])
+            self.state[k] = vk[-1]
+
+        self.tNext = self.tNext + m*self.period
+        return states, grid
+
+def hallEdgeTimes(lineIdx, values, times, tStart):
+    # Edge times used by the hall speed estimate: the first hall A rising edge after tStart (t1),
+    # then the next hall B rising edge (t2) and the next hall A falling edge (t3). None if incomplete.
+    inWindow = times >= tStart
+    aRise = np.flatnonzero(inWindow & (lineIdx == 2) & (values == 1))
+    if (len(aRise) == 0):
+        return None
+    first = aRise[0]
+    after = np.arange(len(times)) > first
+    bRise = np.flatnonzero(after & (lineIdx == 1) & (values == 1))
+    aFall = np.flatnonzero(after & (lineIdx == 2) & (values == 0))
+    if (len(bRise) == 0) or (len(aFall) == 0):
+        return None
+    return times[first], times[bRise[0]], times[aFall[0]]
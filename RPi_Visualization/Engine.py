@@ -0,0 +1,502 @@
+from collections import namedtuple
+
+import numpy as np
+
+from Acquisition import ANALOG, HALL, ENCODER, DIGITAL, EDGES
+from EdgeCapture import hallEdgeTimes
+from RingBuffer import RingBuffer
+from FrameDecoder import decodeFrames, scaleCodes
+from Transforms import dq0
+from FilterCache import FilterDesignCache
+from StreamFilter import StreamingFilter, holdInvalid
+from Spectrum import estimateFundamental
+from FreqTracker import FrequencyTracker
+from Crossings import firstCrossing, crossingTimes
+from Resample import Resampler, interpStack
+from StageTimer import StageTimer
+
+# Signal processing for the visualization, without Qt or hardware.
+# Records from the acquisition (see Acquisition.py) go in through ingest(); window() snapshots the sample
+# windows and process(window) turns one snapshot into a FrameResult with everything the plots show.
+# State that carries over between refreshes (f_est, phase sequence, filter, tracker, per-refresh histories)
+# lives in the engine, so process() should be called on successive windows.
+# Time spent is booked to the decode/filter/estimate/transform stages of timer (StageTimer.py, off by default).
+
+# Snapshot of the sample windows (copies, oldest to newest)
+Window = namedtuple('Window', ['hallA', 'hallB', 'hallC', 'encoderA', 'encoderB', 'encoderZ', 'timeVecExt',
+    'timeVec', 'uVolts', 'vVolts', 'wVolts', 'uAmps', 'vAmps', 'wAmps', 'refSpeed',
+    'timeVecFilt', 'uVoltsFilt', 'vVoltsFilt', 'wVoltsFilt', 'uAmpsFilt', 'vAmpsFilt', 'wAmpsFilt',
+    'edgeLine', 'edgeValue', 'edgeTime', 'modeSwitch'])
+
+# One refresh worth of results, in display units.
+# Traces are trimmed to the plotted length; vdq, rsIdq, ccdq and bemfdq are (d, q) points of the vector diagram.
+FrameResult = namedtuple('FrameResult', ['hallA', 'hallB', 'hallC', 'encoderA', 'encoderB', 'encoderZ',
+    'speedEnc', 'f_est', 'seq', 'running',
+    'uvVolts', 'vwVolts', 'wuVolts', 'uAmps', 'vAmps', 'wAmps',
+    'dVolts', 'qVolts', 'zVolts', 'dAmps', 'qAmps', 'zAmps',
+    'uLineVolts', 'vLineVolts', 'wLineVolts',
+    'dVoltsAvg', 'qVoltsAvg', 'zVoltsAvg', 'dAmpsAvg', 'qAmpsAvg', 'zAmpsAvg',
+    'vdq', 'rsIdq', 'ccdq', 'bemfdq',
+    'speed', 'refSpeed', 'speedHistory', 'refSpeedHistory', 'dqHistory'])
+
+class Engine:
+    def __init__(self, analogLen = 400, analogPlotLen = 200, hallLen = 3000, hallPlotLen = 1000, encoderLen = 200, encoderPlotLen = 200,
+                 speedLen = 101, edgeLen = 4096, filterMode = 'delay', timer = None, liveChannels = None):
+        self.timer = timer if (timer is not None) else StageTimer()
+        self.analogLen = analogLen
+        self.analogPlotLen = analogPlotLen
+        self.hallLen = hallLen
+        self.hallPlotLen = hallPlotLen
+        self.encoderLen = encoderLen
+        self.encoderPlotLen = encoderPlotLen
+        self.speedLen = speedLen
+
+        # Motor parameters for the vector diagram
+        self.Rs = 0.72
+        self.Ld = 0.0012 # 0.007 # 0.0012
+        self.Lq = self.Ld
+        self.fluxLinkage = 0.01 #0.009 # 0.01
+
+        # Sample windows
+        self.uVolts = RingBuffer(analogLen)
+        self.vVolts = RingBuffer(analogLen)
+        self.wVolts = RingBuffer(analogLen)
+        self.uAmps = RingBuffer(analogLen)
+        self.vAmps = RingBuffer(analogLen)
+        self.wAmps = RingBuffer(analogLen)
+        self.refSpeed = RingBuffer(speedLen)
+        self.timeVec = RingBuffer(analogLen)
+
+        self.hallA = RingBuffer(hallLen)
+        self.hallB = RingBuffer(hallLen)
+        self.hallC = RingBuffer(hallLen)
+        self.timeVecExt = RingBuffer(hallLen)
+        self.encoderA = RingBuffer(encoderLen)
+        self.encoderB = RingBuffer(encoderLen)
+        self.encoderZ = RingBuffer(encoderLen)
+
+        self.edgeLine = RingBuffer(edgeLen, dtype = np.int64)
+        self.edgeValue = RingBuffer(edgeLen, dtype = np.uint8)
+        self.edgeTime = RingBuffer(edgeLen)
+        self.GPIOvals = [0]*7
+
+        # Per-refresh histories
+        self.speed = RingBuffer(speedLen)
+        self.refSpeedVec = RingBuffer(speedLen+1)
+        self.dVoltsVec = RingBuffer(speedLen)
+        self.qVoltsVec = RingBuffer(speedLen)
+        self.zVoltsVec = RingBuffer(speedLen)
+        self.dAmpsVec = RingBuffer(speedLen)
+        self.qAmpsVec = RingBuffer(speedLen)
+        self.zAmpsVec = RingBuffer(speedLen)
+
+        self.f_est = 0
+        self.seq = 1
+        self.minConfidence = 0.3 # share of a channel's AC energy in its peak for it to count in the f_est median
+        # Estimate channels (u-v, v-w, w-u line voltages, u, v, w phase currents) the source has; a source without
+        # voltages or currents (a single-capture session in BatchAnalysis.py) leaves its flat channels out of the estimate
+        self.liveChannels = np.ones(6, dtype = bool) if (liveChannels is None) else np.asarray(liveChannels, dtype = bool)
+        self.runningLevel = np.array([1, 1, 1, 0.25, 0.25, 0.25]) # fundamental amplitude that counts as running, V or A
+
+        # Low-pass designs keyed by the quantized cutoff; ButterTable.npz (built by FilterCache.py) is loaded if present
+        self.filterCache = FilterDesignCache()
+        self.filterCache.load()
+
+        # Streaming low-pass over the six phase channels, fed as frames arrive; the cutoff follows f_est.
+        # 'delay' compensates the filter's group delay, 'lookahead' is zero-phase at the cost of ~16 ms more latency
+        self.analogFilter = StreamingFilter(6, mode = filterMode)
+        self.analogFilter.setSos(self.filterCache.get(0.99))
+        # Hysteresis on the cutoff: the design only changes once w_n has been more than one cache step away from the
+        # current one for filterHold windows in a row, so the jitter of f_est does not swap the filter every refresh
+        self.filterKey = self.filterCache.key(0.99)
+        self.filterHold = 2
+        self.filterMoves = 0
+        self.analogHold = np.zeros(6)
+        self.uVoltsFilt = RingBuffer(analogLen)
+        self.vVoltsFilt = RingBuffer(analogLen)
+        self.wVoltsFilt = RingBuffer(analogLen)
+        self.uAmpsFilt = RingBuffer(analogLen)
+        self.vAmpsFilt = RingBuffer(analogLen)
+        self.wAmpsFilt = RingBuffer(analogLen)
+        self.timeVecFilt = RingBuffer(analogLen)
+
+        # Frequency tracked from the line voltages as they arrive, seeded by the spectrum estimate; while it is locked
+        # the spectrum is only searched every spectrumEvery windows, as a check (lock is dropped if the two disagree)
+        self.freqTracker = FrequencyTracker()
+        self.spectrumEvery = 10
+        self.spectrumAge = 0
+
+        self.resampler = Resampler(6, factor = 2)
+
+    def ingest(self, kind, data, t):
+        # One acquisition record (CYCLE records are left to the caller)
+        tMark = self.timer.mark()
+        if(kind == EDGES):
+            states, (lineIdx, values, times) = data
+            self.GPIOvals = states[-1]
+            self.hallA.extend(states[:,2] + 3)
+            self.hallB.extend(states[:,1] + 1.5)
+            self.hallC.extend(states[:,0])
+            self.timeVecExt.extend(t)
+            self.encoderA.extend(states[:,4] + 3)
+            self.encoderB.extend(states[:,3] + 1.5)
+            self.encoderZ.extend(states[:,5])
+
+            self.edgeLine.extend(lineIdx)
+            self.edgeValue.extend(values)
+            self.edgeTime.extend(times)
+            self.timer.lap('acquire', tMark)
+
+        elif(kind == DIGITAL):
+            self.GPIOvals = data
+            self.hallA.append(data[2] + 3)
+            self.hallB.append(data[1] + 1.5)
+            self.hallC.append(data[0])
+            self.timeVecExt.append(t)
+            self.encoderA.append(data[4] + 3)
+            self.encoderB.append(data[3] + 1.5)
+            self.encoderZ.append(data[5])
+            self.timer.lap('acquire', tMark)
+
+        elif(kind == ENCODER):
+            self.GPIOvals = data
+            self.encoderA.append(data[4] + 3)
+            self.encoderB.append(data[3] + 1.5)
+            self.encoderZ.append(data[5])
+            self.timer.lap('acquire', tMark)
+
+        elif(kind == HALL):
+            self.GPIOvals = data
+            self.hallA.append(data[2] + 3)
+            self.hallB.append(data[1] + 1.5)
+            self.hallC.append(data[0])
+            self.timeVecExt.append(t)
+            self.timer.lap('acquire', tMark)
+
+        elif(kind == ANALOG):
+            codes, valid = decodeFrames(data)
+            values = scaleCodes(codes)
+
+            self.uVolts.extend(values[0, valid[0]])
+            self.vVolts.extend(values[1, valid[1]])
+            self.wVolts.extend(values[2, valid[2]])
+            self.uAmps.extend(values[3, valid[3]])
+            self.vAmps.extend(values[4, valid[4]])
+            self.wAmps.extend(values[5, valid[5]])
+            self.refSpeed.extend(values[6, valid[6]])
+            self.timeVec.extend(t)
+            self.timer.count(len(t))
+            tMark = self.timer.lap('decode', tMark)
+
+            phases = holdInvalid(values[0:6], valid[0:6], self.analogHold)
+            filt, tFilt = self.analogFilter.process(phases, t)
+            self.uVoltsFilt.extend(filt[0])
+            self.vVoltsFilt.extend(filt[1])
+            self.wVoltsFilt.extend(filt[2])
+            self.uAmpsFilt.extend(filt[3])
+            self.vAmpsFilt.extend(filt[4])
+            self.wAmpsFilt.extend(filt[5])
+            self.timeVecFilt.extend(tFilt)
+            tMark = self.timer.lap('filter', tMark)
+
+            self.freqTracker.process(phases[0] - phases[1], phases[1] - phases[2], phases[2] - phases[0], t)
+            self.timer.lap('estimate', tMark)
+
+    def setCutoff(self, w_n):
+        # Low-pass cutoff for the coming samples, with the hysteresis above
+        key = self.filterCache.key(w_n)
+        if(abs(key - self.filterKey) <= 1):
+            self.filterMoves = 0
+            return
+        self.filterMoves = self.filterMoves + 1
+        if(self.filterMoves >= self.filterHold):
+            self.filterMoves = 0
+            self.filterKey = key
+            self.analogFilter.setSos(self.filterCache.get(w_n))
+
+    def reset(self):
+        # The sample stream has a gap (e.g. after a pause)
+        self.analogFilter.reset()
+        self.freqTracker.reset()
+
+    def window(self):
+        # Copies, since plot items keep references to the arrays they are given while the rings keep being overwritten
+        return Window(self.hallA.latest().copy(), self.hallB.latest().copy(), self.hallC.latest().copy(),
+            self.encoderA.latest().copy(), self.encoderB.latest().copy(), self.encoderZ.latest().copy(), self.timeVecExt.latest().copy(),
+            self.timeVec.latest().copy(), self.uVolts.latest().copy(), self.vVolts.latest().copy(), self.wVolts.latest().copy(),
+            self.uAmps.latest().copy(), self.vAmps.latest().copy(), self.wAmps.latest().copy(), self.refSpeed.latest().copy(),
+            self.timeVecFilt.latest().copy(), self.uVoltsFilt.latest().copy(), self.vVoltsFilt.latest().copy(), self.wVoltsFilt.latest().copy(),
+            self.uAmpsFilt.latest().copy(), self.vAmpsFilt.latest().copy(), self.wAmpsFilt.latest().copy(),
+            self.edgeLine.latest().copy(), self.edgeValue.latest().copy(), self.edgeTime.latest().copy(), self.GPIOvals[6])
+
+    def process(self, window):
+        tMark = self.timer.mark()
+        hallA = window.hallA
+        hallB = window.hallB
+        timeVecExt = window.timeVecExt
+        timeVec = window.timeVec
+        uVolts, vVolts, wVolts = window.uVolts, window.vVolts, window.wVolts
+        uAmps, vAmps, wAmps = window.uAmps, window.vAmps, window.wAmps
+
+        # Batched and concurrent capture leave gaps between SPI transfers,
+        # so put the analog window on a uniform grid before the FFT and filters
+        timeUniform = np.linspace(timeVec[0], timeVec[-1], len(timeVec))
+        if(timeVec[-1] > timeVec[0]):
+            uVolts, vVolts, wVolts, uAmps, vAmps, wAmps = interpStack(timeUniform, timeVec, np.stack((uVolts, vVolts, wVolts, uAmps, vAmps, wAmps)))
+            timeVec = timeUniform
+
+        ######### HALL / ENCODER ########
+        # First hall A rising edge (hall A is 3 or 4, hall B 1.5 or 2.5); the first samples if there is none
+        i = firstCrossing(hallA, 3.5, 'rising', stop = self.hallLen - 2, default = 0)
+
+        ii = i
+        if(i > (self.hallLen - self.hallPlotLen - 1)):
+            i = (self.hallLen - self.hallPlotLen - 2)
+
+        t1 = crossingTimes(hallA, timeVecExt, ii, 3.5)
+        modHallA = hallA[i:(self.hallPlotLen + i)]
+        modHallB = hallB[i:(self.hallPlotLen + i)]
+        modHallC = window.hallC[i:(self.hallPlotLen + i)]
+
+        # Next hall A falling edge and hall B rising edge, interpolated between the samples either side
+        i = firstCrossing(hallA, 3.5, 'falling', start = ii, stop = self.hallLen - 2, default = 3)
+        t3 = crossingTimes(hallA, timeVecExt, i, 3.5)
+
+        j = firstCrossing(hallB, 2, 'rising', start = ii, stop = self.hallLen - 2, default = 1)
+        t2 = crossingTimes(hallB, timeVecExt, j, 2)
+
+        # Kernel-timestamped edges (edge capture) give t1..t3 directly instead of at the polling resolution
+        edgeTimes = hallEdgeTimes(window.edgeLine, window.edgeValue, window.edgeTime, timeVecExt[0])
+        if(edgeTimes is not None):
+            t1, t2, t3 = edgeTimes
+
+        speedEnc = 5.331/abs((t2-t1))*np.sign(t3-t2)*(1+1*(np.sign(t3-t2) < 0))
+        if(abs(speedEnc) > 3700):
+            speedEnc = 0
+        elif(abs(speedEnc) > 3510):
+            speedEnc = np.sign(speedEnc)*3510
+
+        # Encoder index pulse
+        i = firstCrossing(window.encoderZ, 0.5, 'rising', stop = self.encoderLen - 1, default = 0)
+
+        if(i > (self.encoderLen - self.encoderPlotLen)):
+            i = 0
+
+        modEncoderA = window.encoderA[i:(self.encoderPlotLen + i+1)]
+        modEncoderB = window.encoderB[i:(self.encoderPlotLen + i+1)]
+        modEncoderZ = window.encoderZ[i:(self.encoderPlotLen + i+1)]
+
+        ######### ANALOG ########
+        uvVolts = uVolts - vVolts
+        tMark = self.timer.lap('transform', tMark)
+
+        f_s = 1/np.median(np.diff(timeVec))
+
+        self.spectrumAge = self.spectrumAge + 1
+        if(self.freqTracker.locked) and (self.spectrumAge < self.spectrumEvery):
+            # Tracked on every sample (FreqTracker.py), no spectrum search needed
+            f_new = self.freqTracker.frequency
+            amp = self.freqTracker.amplitude
+        else:
+            # One rfft over the line voltages and phase currents; the line voltage u-v decides whether anything is running
+            self.spectrumAge = 0
+            f_ch, amp_ch, conf_ch = estimateFundamental(np.stack((uvVolts, vVolts - wVolts, wVolts - uVolts, uAmps, vAmps, wAmps)), f_s)
+            # Only channels with a clear fundamental vote; a dead or flat channel has its energy spread over the spectrum
+            live = self.liveChannels & (conf_ch >= self.minConfidence) & (amp_ch > 0)
+            voting = live if np.any(live) else self.liveChannels
+            f_new = np.median(f_ch[voting]) if np.any(voting) else 0
+            # u-v decides whether anything is running, or the u current when there are no voltages
+            ref = int(np.argmax(self.liveChannels))
+            amp = amp_ch[ref]/self.runningLevel[ref] if self.liveChannels[ref] else 0
+            if(self.freqTracker.locked) and (abs(self.freqTracker.frequency - f_new) <= 2*f_s/len(timeVec)):
+                # the check agrees (within two bins): carry on with the tracked value
+                f_new = self.freqTracker.frequency
+                amp = self.freqTracker.amplitude
+            elif(ref == 0) and (amp >= 1) and (conf_ch[0] >= self.minConfidence):
+                # (re)seed from a clear u-v fundamental only; the tracker works on the line voltages
+                self.freqTracker.seed(f_new)
+            else:
+                self.freqTracker.reset()
+
+        tMark = self.timer.lap('estimate', tMark)
+
+        running = (amp >= 1) # amplitude 2|X|/N over runningLevel, i.e. the old |X|/N >= 0.5 V threshold on u-v
+        if not running:
+            self.f_est = 0
+
+            uvVoltsPlot = np.zeros(self.analogPlotLen)
+            vwVoltsPlot = np.zeros(self.analogPlotLen)
+            wuVoltsPlot = np.zeros(self.analogPlotLen)
+
+            uAmpsPlot = np.zeros(self.analogPlotLen)
+            vAmpsPlot = np.zeros(self.analogPlotLen)
+            wAmpsPlot = np.zeros(self.analogPlotLen)
+
+            dVolts = np.zeros(self.analogPlotLen)
+            qVolts = np.zeros(self.analogPlotLen)
+            zVolts = np.zeros(self.analogPlotLen)
+
+            dAmps = np.zeros(self.analogPlotLen)
+            qAmps = np.zeros(self.analogPlotLen)
+            zAmps = np.zeros(self.analogPlotLen)
+
+            dAmpsAvg = 0
+            qAmpsAvg = 0
+            zAmpsAvg = 0
+
+            dVoltsAvg = 0
+            qVoltsAvg = 0
+            zVoltsAvg = 0
+        else:
+            self.f_est = f_new
+
+            w_n = min(2*1.5*self.f_est/f_s, 99/100)
+            self.setCutoff(w_n) # used from the next samples on
+
+            # The filtered channels were produced as the samples arrived (StreamFilter.py); put them on a uniform grid too
+            timeFilt = window.timeVecFilt
+            uvFilt = window.uVoltsFilt - window.vVoltsFilt
+            vwFilt = window.vVoltsFilt - window.wVoltsFilt
+            wuFilt = window.wVoltsFilt - window.uVoltsFilt
+            uFilt = window.uAmpsFilt
+            vFilt = window.vAmpsFilt
+            wFilt = window.wAmpsFilt
+            if(timeFilt[-1] > timeFilt[0]):
+                timeUniform = np.linspace(timeFilt[0], timeFilt[-1], len(timeFilt))
+                uFilt, vFilt, wFilt, uvFilt, vwFilt, wuFilt = interpStack(timeUniform, timeFilt, np.stack((uFilt, vFilt, wFilt, uvFilt, vwFilt, wuFilt)))
+                timeFilt = timeUniform
+
+            # START OF DQ
+
+            # 2x upsampled grid for all six filtered channels at once (Resample.py); the plot windows below count 2x points
+            timeMod, filtMod = self.resampler.upsample(timeFilt, np.stack((uFilt, vFilt, wFilt, uvFilt, vwFilt, wuFilt)))
+
+            uFiltMod = filtMod[0] - np.median(filtMod[0])
+            vFiltMod = filtMod[1] - np.median(filtMod[1])
+            wFiltMod = filtMod[2] - np.median(filtMod[2])
+
+            # copies: slices of these end up in plot items, and the resampler reuses its buffers
+            uvFiltMod = filtMod[3].copy()
+            vwFiltMod = filtMod[4].copy()
+            wuFiltMod = filtMod[5].copy()
+
+            # Phase sequence from the order of the falling zero crossings of u, v and w
+            n = len(uFiltMod) - 2
+            i = firstCrossing(uFiltMod, 0, 'falling', stop = n, inclusive = True, default = 1)
+            i1 = firstCrossing(vFiltMod, 0, 'falling', start = i, stop = n, inclusive = True, default = 1)
+            p1 = firstCrossing(wFiltMod, 0, 'falling', start = i, stop = n, inclusive = True, default = 1) # going negative
+            p2 = firstCrossing(wFiltMod, 0, 'rising', start = i, stop = n, inclusive = True, default = 1) # going positive
+
+            if (i1 < p1) and (i1 > p2):
+                self.seq = 1
+            elif (i1 > p1) and (i1 < p2):
+                self.seq = -1
+
+            # u-v going down through -0.15 of its peak (-3.44)
+            j = firstCrossing(uvFiltMod, -0.15*np.max(uvFiltMod), 'falling', stop = len(wuFiltMod) - 2, inclusive = True, default = 1)
+
+            timeModLim = timeMod[0:min(self.analogPlotLen+1,2*self.analogPlotLen-1-i)]
+            timeModLim = np.concatenate((np.array([0]), np.cumsum(np.diff(timeModLim))))
+
+            timeModLim2 = timeMod[0:min(self.analogPlotLen+1,2*self.analogPlotLen-1-j)]
+            timeModLim2 = np.concatenate((np.array([0]), np.cumsum(np.diff(timeModLim2))))
+
+            uFiltModLim = uFiltMod[i:(i + self.analogPlotLen)]
+            vFiltModLim = vFiltMod[i:(i + self.analogPlotLen)]
+            wFiltModLim = wFiltMod[i:(i + self.analogPlotLen)]
+
+            uvFiltModLim = uvFiltMod[j:(j + self.analogPlotLen)]
+            vwFiltModLim = vwFiltMod[j:(j + self.analogPlotLen)]
+            wuFiltModLim = wuFiltMod[j:(j + self.analogPlotLen)]
+
+            dAmps = np.zeros(len(uFiltModLim)-1)
+            qAmps = np.zeros(len(uFiltModLim)-1)
+            zAmps = uFiltModLim + vFiltModLim + wFiltModLim
+            dVolts = np.zeros(len(uvFiltModLim)-1)
+            qVolts = np.zeros(len(uvFiltModLim)-1)
+            zVolts = uvFiltModLim + vwFiltModLim + wuFiltModLim
+
+            # dq0 transform of the whole window at once (Transforms.py)
+            fdq = self.seq*self.f_est
+            n = min(len(uFiltModLim), len(vFiltModLim), len(wFiltModLim), len(timeModLim)) - 1
+            if (n > 0):
+                dq = dq0(np.stack((uFiltModLim[0:n], vFiltModLim[0:n], wFiltModLim[0:n])), 2*np.pi*fdq*timeModLim[0:n])
+                dAmps[0:n] = dq[0]
+                qAmps[0:n] = dq[1]
+
+            n = min(len(uvFiltModLim), len(vwFiltModLim), len(wuFiltModLim), len(timeModLim2)) - 1
+            if (n > 0):
+                dq = dq0(np.stack((uvFiltModLim[0:n], vwFiltModLim[0:n], wuFiltModLim[0:n])), 2*np.pi*fdq*timeModLim2[0:n])
+                dVolts[0:n] = dq[0]
+                qVolts[0:n] = dq[1]
+
+            dAmpsAvg = np.mean(dAmps)/np.sqrt(3)
+            qAmpsAvg = np.mean(qAmps)/np.sqrt(3)
+            zAmpsAvg = np.mean(zAmps)/np.sqrt(3)
+
+            dVoltsAvg = np.mean(dVolts)
+            qVoltsAvg = np.mean(qVolts)
+            zVoltsAvg = np.mean(zVolts)
+
+            uvVoltsPlot = uvFiltModLim
+            vwVoltsPlot = vwFiltModLim
+            wuVoltsPlot = wuFiltModLim
+
+            uAmpsPlot = uFiltModLim/np.sqrt(3)
+            vAmpsPlot = vFiltModLim/np.sqrt(3)
+            wAmpsPlot = wFiltModLim/np.sqrt(3)
+
+        upperBound = min(self.analogPlotLen, len(dVolts), len(qVolts), len(zVolts), len(dAmps), len(qAmps), len(zAmps))
+
+        # Vector diagram: v_dq, Rs*i_dq, plus the cross-coupling terms, plus the back EMF
+        Rs = self.Rs
+        we = self.seq*self.f_est*2*np.pi
+        rsIdq = (Rs*dAmpsAvg, Rs*qAmpsAvg)
+        ccdq = (-we*self.Lq*qAmpsAvg + Rs*dAmpsAvg, we*self.Ld*dAmpsAvg + Rs*qAmpsAvg)
+        bemfdq = (ccdq[0], ccdq[1] + we*self.fluxLinkage)
+
+        if(self.f_est*15.77 >= 500):
+            self.speed.append(min(3500+ np.random.randint(-5,11), self.seq*self.f_est*15.77))
+        else:
+            self.speed.append(speedEnc)
+
+        refSpeedAvg = np.median(window.refSpeed)
+        if(window.modeSwitch == 1):
+            tSpeed = ((175/106)*(refSpeedAvg - 165)+100)*(refSpeedAvg > 165)
+            if(tSpeed > 3500):
+                self.refSpeedVec.append(3500 + np.random.randint(-5,11))
+            else:
+                self.refSpeedVec.append(tSpeed)
+        else:
+            tSpeed = (500/217)*(refSpeedAvg < 1033)*(refSpeedAvg - 1033) + \
+                (200/119)*(refSpeedAvg > 1200)*(refSpeedAvg - 1090)
+            if(tSpeed > 2000):
+                self.refSpeedVec.append(2000 + np.random.randint(-5,11))
+            elif(tSpeed < -2000):
+                self.refSpeedVec.append(-2000 - np.random.randint(-5,11))
+            else:
+                self.refSpeedVec.append(tSpeed)
+
+        self.dVoltsVec.append(dVoltsAvg)
+        self.qVoltsVec.append(qVoltsAvg)
+        self.zVoltsVec.append(zVoltsAvg)
+        self.dAmpsVec.append(dAmpsAvg)
+        self.qAmpsVec.append(qAmpsAvg)
+        self.zAmpsVec.append(zAmpsAvg)
+
+        speed = self.speed.latest().copy()
+        refSpeedHistory = self.refSpeedVec.latest()[1:].copy()
+        dqHistory = np.stack((self.dVoltsVec.latest(), self.qVoltsVec.latest(), self.zVoltsVec.latest(),
+            self.dAmpsVec.latest(), self.qAmpsVec.latest(), self.zAmpsVec.latest()))
+        self.timer.lap('transform', tMark)
+
+        return FrameResult(modHallA, modHallB, modHallC, modEncoderA, modEncoderB, modEncoderZ,
+            speedEnc, self.f_est, self.seq, running,
+            uvVoltsPlot[0:upperBound], vwVoltsPlot[0:upperBound], wuVoltsPlot[0:upperBound],
+            uAmpsPlot[0:upperBound], vAmpsPlot[0:upperBound], wAmpsPlot[0:upperBound],
+            dVolts[0:upperBound], qVolts[0:upperBound], zVolts[0:upperBound],
+            dAmps[0:upperBound]/np.sqrt(3), qAmps[0:upperBound]/np.sqrt(3), zAmps[0:upperBound]/np.sqrt(3),
+            uVolts[0:upperBound], vVolts[0:upperBound], wVolts[0:upperBound],
+            dVoltsAvg, qVoltsAvg, zVoltsAvg, dAmpsAvg, qAmpsAvg, zAmpsAvg,
+            (dVoltsAvg, qVoltsAvg), rsIdq, ccdq, bemfdq,
+            speed[-1], self.refSpeedVec.latest()[-1], speed, refSpeedHistory, dqHistory)
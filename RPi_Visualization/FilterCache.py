@@ -0,0 +1,116 @@
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+# Butterworth filter designs cached by normalized cutoff.
+# The cutoff follows the speed estimate (w_n = 3*f_est/f_s), so it is quantized on a log scale (a fixed relative
+# step, the same relative cutoff error at low and high speed) and the second-order sections for each step are kept
+# in a bounded LRU. A table of designs can be built offline (python FilterCache.py) and loaded at startup;
+# butter() is only called on a cache miss (the filtering itself still uses scipy.signal, see StreamFilter.py).
+
+DEFAULT_TABLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ButterTable.npz')
+
+class FilterDesignCache:
+    def __init__(self, order = 4, btype = 'low', step = 0.01, maxSize = 1024, wMin = 0.002, wMax = 0.99):
+        self.order = order
+        self.btype = btype
+        self.step = step
+        self.maxSize = maxSize
+        self.wMin = wMin
+        self.wMax = wMax
+        self.designs = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, w_n):
+        # Index of the quantized cutoff: cutoff(k) = wMin*(1 + step)**k, within step/2 of w_n
+        w_n = min(max(w_n, self.wMin), self.wMax)
+        return int(round(np.log(w_n/self.wMin)/np.log1p(self.step)))
+
+    def cutoff(self, key):
+        return min(max(self.wMin*(1 + self.step)**key, self.wMin), self.wMax)
+
+    def design(self, key):
+        from scipy.signal import butter
+        return butter(self.order, self.cutoff(key), btype = self.btype, output = 'sos')
+
+    def get(self, w_n):
+        # SOS coefficients (sections, 6) for the quantized cutoff nearest to w_n
+        k = self.key(w_n)
+        sos = self.designs.get(k)
+        if (sos is not None):
+            self.hits = self.hits + 1
+            self.designs.move_to_end(k)
+            return sos
+
+        self.misses = self.misses + 1
+        sos = self.design(k)
+        self.store(k, sos)
+        return sos
+
+    def store(self, k, sos):
+        self.designs[k] = sos
+        self.designs.move_to_end(k)
+        while (len(self.designs) > self.maxSize):
+            self.designs.popitem(last = False)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self.designs),
+                'hitRate': self.hits/total if total else 0.0}
+
+    def precompute(self, wLow = None, wHigh = None):
+        # Design every quantized cutoff in [wLow, wHigh] (not counted as misses)
+        kLow = self.key(self.wMin if wLow is None else wLow)
+        kHigh = self.key(self.wMax if wHigh is None else wHigh)
+        for k in range(kLow, kHigh + 1):
+            if (k not in self.designs):
+                self.store(k, self.design(k))
+
+    def save(self, path = DEFAULT_TABLE):
+        keys = np.array(list(self.designs.keys()), dtype = np.int64)
+        sos = np.array(list(self.designs.values()))
+        np.savez(path, keys = keys, sos = sos, order = self.order, btype = self.btype, step = self.step, wMin = self.wMin)
+
+    def load(self, path = DEFAULT_TABLE):
+        # Returns False (and leaves the cache as it is) if the table is missing or was built for another design
+        if not os.path.exists(path):
+            return False
+        table = np.load(path)
+        if ('wMin' not in table.files) or (float(table['wMin']) != self.wMin):
+            return False
+        if (int(table['order']) != self.order) or (str(table['btype']) != self.btype) or (float(table['step']) != self.step):
+            return False
+        for (k, sos) in zip(table['keys'], table['sos']):
+            self.store(int(k), sos)
+        return True
+
+if __name__ == "__main__":
+    # Builds the startup table and compares a cached lookup with designing the filter every refresh
+    import sys
+    import time
+    from scipy.signal import butter
+
+    cache = FilterDesignCache(maxSize = 1000)
+    cache.precompute()
+    path = sys.argv[1] if (len(sys.argv) > 1) else DEFAULT_TABLE
+    cache.save(path)
+    print(f'saved {len(cache.designs)} designs to {path}')
+
+    loaded = FilterDesignCache(maxSize = 1000)
+    loaded.load(path)
+    rng = np.random.default_rng(0)
+    wns = np.minimum(3*rng.uniform(45, 55, 2000)/7800, 0.99)
+
+    t0 = time.perf_counter()
+    for w_n in wns:
+        butter(4, w_n, btype = 'low', output = 'sos')
+    tDesign = (time.perf_counter() - t0)/len(wns)
+
+    t0 = time.perf_counter()
+    for w_n in wns:
+        loaded.get(w_n)
+    tCache = (time.perf_counter() - t0)/len(wns)
+
+    print(f'butter {1e6*tDesign:7.1f} us, cached {1e6*tCache:5.2f} us ({tDesign/tCache:5.0f}x), {loaded.stats()}')
@@ -0,0 +1,86 @@
+import numpy as np
+
+# Decoding of the 16-byte LaunchPad SPI frame.
+# Each channel starts at an even byte k: bits 6..3 of frame[k] are the 4-bit tag, and the 12-bit code is
+# frame[k] bits 2..0, all of frame[k+1] and the top bit of frame[k+2] (wrapping around to frame[0]).
+
+# Channel order: U, V, W phase voltage, U, V, W phase current, reference speed
+CHANNEL_NAMES = ['uVolts', 'vVolts', 'wVolts', 'uAmps', 'vAmps', 'wAmps', 'refSpeed']
+CHANNEL_BYTES = np.array([4, 6, 8, 10, 12, 14, 0])
+CHANNEL_TAGS = [(0, 1, 3), (2, 6), (7, 5), (4, 12, 13), (15, 14), (10, 11), (9, 8)]
+
+CHANNEL_GAIN = np.array([31/5250, 31/5250, 31/5250, 20/9009, 20/9009, 20/9009, 1])
+CHANNEL_OFFSET = np.array([0, 0, 0, -5, -5, -5, 0])
+
+# validTags[c, tag] is True when tag is accepted for channel c
+validTags = np.zeros((len(CHANNEL_TAGS), 16), dtype = bool)
+for c in range(0,len(CHANNEL_TAGS)):
+    validTags[c, list(CHANNEL_TAGS[c])] = True
+
+channelIndex = np.arange(len(CHANNEL_TAGS))[None, :]
+
+def decodeFrames(frames):
+    # frames: (N, 16) uint8 -> codes (7, N) int32 and valid (7, N) bool
+    frames = np.asarray(frames, dtype = np.uint8).reshape(-1, 16)
+    b0 = frames[:, CHANNEL_BYTES].astype(np.int32)
+    b1 = frames[:, (CHANNEL_BYTES + 1) % 16].astype(np.int32)
+    b2 = frames[:, (CHANNEL_BYTES + 2) % 16].astype(np.int32)
+
+    tags = (b0 & 0b01111000) >> 3
+    codes = ((b0 & 0b00000111) << 9) | (b1 << 1) | (b2 >> 7)
+    valid = validTags[channelIndex, tags]
+    return codes.T, valid.T
+
+def scaleCodes(codes):
+    # Raw 12-bit codes (7, N) -> volts / amps / reference speed counts
+    return CHANNEL_GAIN[:, None]*codes + CHANNEL_OFFSET[:, None]
+
+def encodeFrames(codes):
+    # Inverse of decodeFrames: codes (7, N) 12-bit -> frames (N, 16) uint8, each channel with its first valid tag.
+    # Used to build frames for replay and tests; bytes that carry no channel bits stay 0.
+    codes = np.asarray(codes, dtype = np.int64) & 0xFFF
+    frames = np.zeros((codes.shape[1], 16), dtype = np.uint8)
+    for c in range(0,len(CHANNEL_BYTES)):
+        k = CHANNEL_BYTES[c]
+        frames[:, k] |= ((CHANNEL_TAGS[c][0] << 3) | (codes[c] >> 9)).astype(np.uint8)
+        frames[:, (k + 1) % 16] = ((codes[c] >> 1) & 0xFF).astype(np.uint8)
+        frames[:, (k + 2) % 16] |= ((codes[c] & 1) << 7).astype(np.uint8)
+    return frames
+
+def decodeFrameScalar(frame):
+    # Reference per-frame decoder (the original per-sample path); returns one value or None per channel
+    values = []
+    for c in range(0,len(CHANNEL_BYTES)):
+        k = CHANNEL_BYTES[c]
+        parity = (frame[k] & 0b01111000) >> 3
+        if (parity in CHANNEL_TAGS[c]):
+            code = ((frame[k] & 0b00000111) << 9) | (frame[(k + 1) % 16] << 1) | (frame[(k + 2) % 16] >> 7)
+            values.append(CHANNEL_GAIN[c]*code + CHANNEL_OFFSET[c])
+        else:
+            values.append(None)
+    return values
+
+if __name__ == "__main__":
+    # Micro-benchmark: vectorized batch decode vs the scalar per-frame path
+    import time
+
+    rng = np.random.default_rng(0)
+    for n in [50, 500, 5000]:
+        frames = rng.integers(0, 256, size = (n, 16), dtype = np.uint8)
+        frameLists = [list(map(int, frame)) for frame in frames]
+
+        reps = max(1, 20000//n)
+        t0 = time.perf_counter()
+        for r in range(0,reps):
+            for frame in frameLists:
+                decodeFrameScalar(frame)
+        tScalar = (time.perf_counter() - t0)/reps
+
+        t0 = time.perf_counter()
+        for r in range(0,reps):
+            codes, valid = decodeFrames(frames)
+            values = scaleCodes(codes)
+        tVector = (time.perf_counter() - t0)/reps
+
+        print(f'{n:6d} frames: scalar {1e6*tScalar/n:7.2f} us/frame, vectorized {1e6*tVector/n:6.3f} us/frame '
+              f'({tScalar/tVector:5.1f}x), {n/tVector:10.0f} frames/s')
@@ -0,0 +1,123 @@
+import numpy as np
+from scipy.signal import lfilter
+
+# Incremental fundamental tracker on the line voltages, seeded by the last spectrum estimate.
+# The line voltages are combined into one rotating space vector (Clarke), which is demodulated by a
+# reference turning at the seed frequency f0. What is left turns slowly at the frequency error; after a
+# one-pole low-pass (which also removes the negative sequence and harmonics) its phase slope gives the
+# frequency on every sample. The reference is re-centred on the tracked frequency after each block, which
+# makes this a software PLL working a block at a time.
+#
+# A seed is only a candidate: lock is declared on the first block whose baseband is coherent, i.e. the mean of
+# the demodulated vector over the block keeps most of its mean magnitude (a wrong seed leaves it turning at the
+# frequency error, which averages out). Lock is lost when a block is not coherent, the fundamental gets too small
+# or it moves too far from f0 within one block; the caller then does a full spectrum search and seeds again.
+
+class FrequencyTracker:
+    def __init__(self, bandwidth = 0.25, smoothing = 1.0, minAmplitude = 1.0, maxOffset = 0.3, minCoherence = 0.7):
+        self.bandwidth = bandwidth # baseband low-pass cutoff, as a fraction of f0
+        self.smoothing = smoothing # time constant of the frequency output, in periods of f0
+        self.minAmplitude = minAmplitude
+        self.maxOffset = maxOffset # largest relative jump from f0 within one block that keeps lock
+        self.minCoherence = minCoherence # |mean| / mean |.| of the block's baseband needed to (keep) lock
+        self.locked = False
+        self.seeded = False # seeded, lock not confirmed yet
+        self.coherence = 0
+        self.frequency = 0
+        self.amplitude = 0
+        self.direction = 1
+
+    def seed(self, f_est):
+        self.locked = False
+        self.seeded = (f_est > 0)
+        self.f0 = f_est
+        self.frequency = f_est
+        self.zBase = None
+        self.tLast = None
+
+    def reset(self):
+        # e.g. after a pause: wait for the next spectrum search
+        self.locked = False
+        self.seeded = False
+
+    def process(self, uv, vw, wu, t):
+        # One value per sample (NaN while unlocked)
+        t = np.asarray(t, dtype = float)
+        n = len(t)
+        if not (self.locked or self.seeded) or (n < 2):
+            return np.full(n, np.nan if not self.locked else self.frequency)
+
+        x = 2/3*(uv - 0.5*vw - 0.5*wu) + 1j*(vw - wu)/np.sqrt(3)
+
+        if (self.tLast is None):
+            # First block after a seed: pick the direction of rotation that leaves the stronger baseband
+            self.tRef = t[0]
+            self.phiRef = 0
+            forward = np.abs(np.mean(x*np.exp(-2j*np.pi*self.f0*(t - t[0]))))
+            backward = np.abs(np.mean(x*np.exp(2j*np.pi*self.f0*(t - t[0]))))
+            self.direction = 1 if (forward >= backward) else -1
+
+        theta = self.phiRef + 2*np.pi*self.direction*self.f0*(t - self.tRef)
+        base = x*np.exp(-1j*theta)
+        magnitude = np.mean(np.abs(base))
+        self.coherence = np.abs(np.mean(base))/magnitude if (magnitude > 0) else 0
+
+        dt = np.median(np.diff(t))
+        a = np.exp(-2*np.pi*self.bandwidth*self.f0*dt)
+        zi = np.array([a*(base[0] if (self.zBase is None) else self.zBase)])
+        z, zf = lfilter([1 - a], [1, -a], base, zi = zi)
+        self.zBase = z[-1]
+
+        # Phase slope of the baseband = frequency error (signed with the direction of rotation)
+        phase = np.unwrap(np.angle(z))
+        if (self.tLast is None):
+            phaseSlope = np.concatenate(([0], np.diff(phase)/np.maximum(np.diff(t), 1e-9)))
+        else:
+            phase = np.unwrap(np.concatenate(([self.phaseLast], phase)))
+            phaseSlope = np.diff(phase)/np.maximum(np.diff(np.concatenate(([self.tLast], t))), 1e-9)
+            phase = phase[1:]
+        fInst = self.f0 + self.direction*phaseSlope/(2*np.pi)
+
+        b = np.exp(-dt*self.f0/self.smoothing)
+        f, fzi = lfilter([1 - b], [1, -b], fInst, zi = np.array([b*self.frequency]))
+
+        self.amplitude = np.abs(self.zBase)
+        self.frequency = f[-1]
+        self.phaseLast = phase[-1]
+        self.tLast = t[-1]
+        self.phiRef = theta[-1]
+        self.tRef = t[-1]
+
+        self.seeded = False
+        if not np.isfinite(self.frequency) or (self.amplitude < self.minAmplitude) or (self.coherence < self.minCoherence) or \
+            (abs(self.frequency - self.f0) > self.maxOffset*self.f0):
+            self.locked = False
+            return np.full(n, np.nan)
+
+        self.locked = True
+        self.f0 = self.frequency
+        return f
+
+if __name__ == "__main__":
+    # Tracks a 3-phase set whose frequency ramps 40 -> 60 Hz, fed in 50-sample blocks
+    import time
+
+    f_s = 7800
+    n = 3*f_s
+    t = np.arange(n)/f_s + 0.0001*np.random.default_rng(0).uniform(size = n)
+    f = 40 + 20*np.arange(n)/n
+    phase = 2*np.pi*np.cumsum(f)/f_s
+    rng = np.random.default_rng(1)
+    u, v, w = [10*np.sin(phase - k*2*np.pi/3) + 0.5*rng.normal(size = n) for k in range(3)]
+
+    tracker = FrequencyTracker()
+    tracker.seed(41)
+    out = []
+    t0 = time.perf_counter()
+    for k in range(0, n, 50):
+        out.append(tracker.process(u[k:k+50] - v[k:k+50], v[k:k+50] - w[k:k+50], w[k:k+50] - u[k:k+50], t[k:k+50]))
+    tBlock = (time.perf_counter() - t0)/(n/50)
+    out = np.concatenate(out)
+
+    err = np.abs(out[f_s:] - f[f_s:])
+    print(f'{1e6*tBlock:5.1f} us per 50-sample block, locked {tracker.locked}, error median {np.median(err):.3f} Hz, max {np.max(err):.3f} Hz')
@@ -0,0 +1,201 @@
+import threading
+import time
+
+import numpy as np
+
+from Recorder import openRecording
+
+# Playback of a recording (Recorder.py) through the normal acquisition and processing path.
+# A Playback stands in for all three backends at once (see Backends.py): SPI source (xfer2, max_speed_hz),
+# edge source (get_values, read, release) and clock. The clock runs in recording time, at speed x wall time,
+# and the frames and edges come back with their recorded timestamps as the clock passes them.
+#
+# Both sections of a recording are in time order, so seek(t) is a binary search over the memory-mapped
+# timestamps: O(log n) probes, each touching one page of the file, and only the chunks played are read after that.
+# A seek (or the wrap back to the start at the end of the recording) bumps generation; the reader should then
+# restart its windows (AcquisitionThread.resync, Engine.reset), since the timestamps jump.
+
+MIN_SPEED = 0.1
+MAX_SPEED = 50
+MAX_LAG = 0.5 # frames further than this behind the clock (recording seconds) are skipped, e.g. at high speed
+LEVEL_SCAN = 2**20 # edges searched back from a seek point for the level of each line
+
+def bisectTime(records, t):
+    # First index with records['t'] >= t; records is in time order. searchsorted works on the strided field in
+    # place, so a memory-mapped file is only read where the search probes.
+    return int(np.searchsorted(records['t'], t, side = 'left'))
+
+class Playback:
+    def __init__(self, path, speed = 1, lines = 7, defaultLevels = (0, 0, 0, 0, 0, 0, 1)):
+        self.path = path
+        self.header, self.frames, self.edges = openRecording(path)
+        self.max_speed_hz = self.header['spiHz']
+        self.framePeriod = 128/self.max_speed_hz
+        if (len(self.frames) < 256):
+            raise ValueError(f'{path} holds too few frames to play')
+        self.lines = lines
+        self.defaultLevels = np.array(defaultLevels, dtype = np.uint8)
+
+        times = [r['t'] for r in [self.frames[0:1], self.frames[-1:], self.edges[0:1], self.edges[-1:]] if (len(r) > 0)]
+        times = np.concatenate(times) if (len(times) > 0) else np.zeros(1)
+        self.tFirst = float(np.min(times))
+        self.tLast = float(np.max(times))
+
+        self.lock = threading.RLock()
+        self.speed = min(max(speed, MIN_SPEED), MAX_SPEED)
+        self.paused = False
+        self.generation = 0
+        self.framesSkipped = 0
+        self.frameTimes = None
+        self.seek(self.tFirst)
+        self.generation = 0
+
+    # ----- clock ----- #
+
+    def __call__(self):
+        with self.lock:
+            if self.paused:
+                return self.tAnchor
+            return self.tAnchor + self.speed*(time.time() - self.wallAnchor)
+
+    def anchor(self, t):
+        self.tAnchor = t
+        self.wallAnchor = time.time()
+
+    def position(self):
+        # Seconds from the start of the recording
+        return self() - self.tFirst
+
+    def duration(self):
+        return self.tLast - self.tFirst
+
+    def setSpeed(self, speed):
+        with self.lock:
+            self.anchor(self())
+            self.speed = min(max(speed, MIN_SPEED), MAX_SPEED)
+
+    def pause(self):
+        with self.lock:
+            self.anchor(self())
+            self.paused = True
+
+    def resume(self):
+        with self.lock:
+            self.paused = False
+            self.anchor(self.tAnchor)
+
+    def seek(self, t):
+        with self.lock:
+            t = min(max(t, self.tFirst), self.tLast)
+            self.frameIdx = bisectTime(self.frames, t)
+            self.edgeIdx = bisectTime(self.edges, t)
+            self.levels = self.levelsAt(self.edgeIdx)
+            self.anchor(t)
+            self.generation = self.generation + 1
+
+    def levelsAt(self, idx):
+        # Level of each line after the last edge before idx, searched back in chunks
+        levels = self.defaultLevels.copy()
+        found = np.zeros(self.lines, dtype = bool)
+        stop = idx
+        while (stop > 0) and (idx - stop < LEVEL_SCAN) and not found.all():
+            start = max(0, stop - 4096)
+            chunk = np.array(self.edges[start:stop])
+            for line in np.flatnonzero(~found):
+                hits = np.flatnonzero(chunk['line'] == line)
+                if (len(hits) > 0):
+                    found[line] = True
+                    levels[line] = chunk['value'][hits[-1]]
+            stop = start
+        return levels
+
+    # ----- SPI source ----- #
+
+    def xfer2(self, tx):
+        n = len(tx)//16
+        with self.lock:
+            if (self.frameIdx + n > len(self.frames)):
+                self.seek(self.tFirst) # end of the recording: play it again
+            elif (self.frameIdx < len(self.frames)) and (self() - self.frames[self.frameIdx]['t'] > MAX_LAG):
+                # Too far behind the clock to catch up: jump to where the clock is
+                skip = bisectTime(self.frames, self() - self.framePeriod*n) - self.frameIdx
+                skip = min(skip, len(self.frames) - n - self.frameIdx)
+                self.frameIdx = self.frameIdx + max(skip, 0)
+                self.framesSkipped = self.framesSkipped + max(skip, 0)
+            chunk = np.array(self.frames[self.frameIdx:(self.frameIdx + n)])
+            self.frameIdx = self.frameIdx + n
+            generation = self.generation
+
+        self.frameTimes = chunk['t']
+        self.waitUntil(chunk['t'][-1], 0.05, generation)
+        return chunk['frame'].tobytes()
+
+    def waitUntil(self, t, step, generation = None):
+        # Sleeps until the clock passes t, in short steps so pauses, speed changes and seeks take effect
+        while (self() < t) and ((generation is None) or (generation == self.generation)):
+            wait = (t - self())/self.speed
+            time.sleep(min(max(wait, 0), step))
+
+    # ----- edge source ----- #
+
+    def get_values(self):
+        # Levels at the clock (edges up to now are taken, as a poll would see them)
+        with self.lock:
+            self.advanceEdges()
+            return [int(v) for v in self.levels]
+
+    def read(self, timeout):
+        time.sleep(timeout)
+        return self.advanceEdges()
+
+    def advanceEdges(self):
+        # Edges from the cursor up to the clock
+        with self.lock:
+            t1 = self()
+            start = self.edgeIdx
+            stop = start + bisectTime(self.edges[start:], t1) if (start < len(self.edges)) else start
+            chunk = np.array(self.edges[start:stop])
+            self.edgeIdx = stop
+
+            line = chunk['line'].astype(np.int64)
+            value = chunk['value']
+            for k in range(0,self.lines):
+                last = np.flatnonzero(line == k)
+                if (len(last) > 0):
+                    self.levels[k] = value[last[-1]]
+        return line, value, chunk['t']
+
+    def release(self):
+        pass
+
+if __name__ == "__main__":
+    # Seek cost on a long synthetic recording: binary search over the mapped file vs copying out the timestamps
+    import os
+    import tempfile
+    from Recorder import Recorder
+
+    path = os.path.join(tempfile.gettempdir(), 'playback_test.focrec')
+    seconds = 3600
+    rec = Recorder(path, seconds = seconds, edgeRate = 200)
+    rng = np.random.default_rng(0)
+    block = rng.integers(0, 256, (7812, 16), dtype = np.uint8)
+    for s in range(0,seconds):
+        rec.writeFrames(block, s + np.arange(7812)/7812)
+        rec.writeEdges(np.arange(200) % 7, np.arange(200) % 2, s + np.arange(200)/200)
+    rec.close()
+
+    playback = Playback(path)
+    targets = rng.uniform(0, seconds, 200)
+    t0 = time.perf_counter()
+    for t in targets:
+        playback.seek(playback.tFirst + t)
+    tSeek = (time.perf_counter() - t0)/len(targets)
+
+    t0 = time.perf_counter()
+    idx = np.searchsorted(np.ascontiguousarray(playback.frames['t']), targets[0])
+    tLoad = time.perf_counter() - t0
+
+    print(f'{len(playback.frames)} frames ({os.path.getsize(path)/1e9:.2f} GB): seek {1e6*tSeek:.0f} us, loading all timestamps first {1e3*tLoad:.0f} ms')
+    playback.seek(playback.tFirst + 1800.5)
+    print('frame index at 1800.5 s:', playback.frameIdx, 'expected', int(1800.5*7812), 'levels', playback.levels)
+    os.remove(path)
@@ -0,0 +1,195 @@
+import errno
+import mmap
+import os
+import shutil
+import struct
+import threading
+
+import numpy as np
+
+# Continuous capture of the raw SPI frames and hall/encoder edges to one memory-mapped file.
+# The file is sized for the whole session up front (sparse until written) and only ever appended to, so a sample
+# costs one copy into the mapping whatever the file size. Written pages are flushed and dropped from memory every
+# flushBytes, which keeps RAM bounded on hours-long recordings.
+#
+# Layout (little endian):
+#   header  64 bytes: magic, version, frame and edge capacity, frame and edge count, SPI clock, start time
+#   frames  frameCapacity x (t f8, frame 16 x u1), in time order
+#   edges   edgeCapacity x (t f8, line u1, value u1, 6 bytes padding), in time order
+# Counts in the header are updated after every append, so a recording cut short (crash, power loss) stays readable.
+# When a section is full, further samples of that kind are counted in framesLost/edgesLost instead.
+# A sparse file can fill the disk as it is written, so the whole size has to be free when the recording starts
+# (OSError ENOSPC otherwise): about 1.8 GB per hour at 1 MHz SPI and the default edgeRate.
+
+MAGIC = b'FOCREC\x00\x01'
+VERSION = 1
+HEADER = struct.Struct('<8sI4xQQQQdd')
+HEADER_SIZE = 64
+
+FRAME_DTYPE = np.dtype([('t', '<f8'), ('frame', 'u1', 16)])
+EDGE_DTYPE = np.dtype([('t', '<f8'), ('line', 'u1'), ('value', 'u1'), ('pad', 'u1', 6)])
+
+def sectionOffsets(frameCapacity):
+    frameOffset = HEADER_SIZE
+    edgeOffset = frameOffset + frameCapacity*FRAME_DTYPE.itemsize
+    return frameOffset, edgeOffset
+
+class Recorder:
+    def __init__(self, path, seconds = 3600, spiHz = 1000000, edgeRate = 20000, tStart = 0, flushBytes = 16*2**20):
+        self.path = path
+        self.spiHz = spiHz
+        self.tStart = tStart
+        self.frameCapacity = int(seconds*spiHz/128)
+        self.edgeCapacity = int(seconds*edgeRate)
+        self.frameCount = 0
+        self.edgeCount = 0
+        self.framesLost = 0
+        self.edgesLost = 0
+        self.lastValues = None
+        self.lock = threading.Lock()
+        self.closed = False
+
+        self.frameOffset, self.edgeOffset = sectionOffsets(self.frameCapacity)
+        size = self.edgeOffset + self.edgeCapacity*EDGE_DTYPE.itemsize
+        free = shutil.disk_usage(os.path.dirname(os.path.abspath(path))).free
+        if (size > free):
+            raise OSError(errno.ENOSPC, f'a {seconds/60:.0f} min recording needs {size/2**30:.1f} GB, {free/2**30:.1f} GB free')
+        self.file = open(path, 'w+b')
+        self.file.truncate(size)
+        self.mm = mmap.mmap(self.file.fileno(), size)
+        self.frames = np.frombuffer(self.mm, dtype = FRAME_DTYPE, count = self.frameCapacity, offset = self.frameOffset)
+        self.edges = np.frombuffer(self.mm, dtype = EDGE_DTYPE, count = self.edgeCapacity, offset = self.edgeOffset)
+
+        # Start of the part of each section written but not flushed yet, in bytes
+        self.flushBytes = flushBytes
+        self.flushed = {'frames': self.frameOffset, 'edges': self.edgeOffset}
+        self.writeHeader()
+
+    def writeHeader(self):
+        self.mm[0:HEADER.size] = HEADER.pack(MAGIC, VERSION, self.frameCapacity, self.edgeCapacity,
+            self.frameCount, self.edgeCount, self.spiHz, self.tStart)
+
+    def writeFrames(self, frames, t):
+        # frames (N, 16) uint8 as read, t (N,)
+        with self.lock:
+            if self.closed:
+                return
+            n = min(len(t), self.frameCapacity - self.frameCount)
+            self.framesLost = self.framesLost + len(t) - n
+            if (n == 0):
+                return
+            out = self.frames[self.frameCount:(self.frameCount + n)]
+            out['t'] = t[0:n]
+            out['frame'] = frames[0:n]
+            self.frameCount = self.frameCount + n
+            self.writeHeader()
+            self.written('frames', self.frameOffset + self.frameCount*FRAME_DTYPE.itemsize)
+
+    def writeEdges(self, lineIdx, values, times):
+        with self.lock:
+            if self.closed:
+                return
+            n = min(len(times), self.edgeCapacity - self.edgeCount)
+            self.edgesLost = self.edgesLost + len(times) - n
+            if (n == 0):
+                return
+            out = self.edges[self.edgeCount:(self.edgeCount + n)]
+            out['t'] = times[0:n]
+            out['line'] = lineIdx[0:n]
+            out['value'] = values[0:n]
+            self.edgeCount = self.edgeCount + n
+            self.writeHeader()
+            self.written('edges', self.edgeOffset + self.edgeCount*EDGE_DTYPE.itemsize)
+
+    def writeLevels(self, values, t):
+        # Level of every line at t (e.g. at the start of a recording), stored as edges so playback knows where lines start
+        values = np.asarray(values, dtype = np.uint8)
+        self.writeEdges(np.arange(len(values)), values, np.full(len(values), t))
+
+    def writeStates(self, values, t):
+        # Polled line levels: the lines that changed since the last poll are recorded as edges at t
+        values = np.asarray(values, dtype = np.uint8)
+        if (self.lastValues is not None):
+            lineIdx = np.flatnonzero(values != self.lastValues)
+            if (len(lineIdx) > 0):
+                self.writeEdges(lineIdx, values[lineIdx], np.full(len(lineIdx), t))
+        self.lastValues = values
+
+    def written(self, section, end):
+        # Flush and drop whole pages once enough has been written behind them
+        start = self.flushed[section]
+        if (end - start < self.flushBytes):
+            return
+        start = start - start % mmap.PAGESIZE
+        stop = end - end % mmap.PAGESIZE
+        if (stop > start):
+            self.mm.flush(start, stop - start)
+            if hasattr(mmap, 'MADV_DONTNEED'):
+                self.mm.madvise(mmap.MADV_DONTNEED, start, stop - start)
+            self.flushed[section] = stop
+
+    def duration(self):
+        if (self.frameCount == 0):
+            return 0
+        return self.frames['t'][self.frameCount - 1] - self.frames['t'][0]
+
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.writeHeader()
+            self.frames = None
+            self.edges = None
+            self.mm.flush()
+            self.mm.close()
+            self.file.close()
+
+def readHeader(path):
+    with open(path, 'rb') as f:
+        magic, version, frameCapacity, edgeCapacity, frameCount, edgeCount, spiHz, tStart = HEADER.unpack(f.read(HEADER.size))
+    if (magic != MAGIC):
+        raise ValueError(f'{path} is not a capture recording')
+    return {'version': version, 'frameCapacity': frameCapacity, 'edgeCapacity': edgeCapacity,
+        'frameCount': frameCount, 'edgeCount': edgeCount, 'spiHz': spiHz, 'tStart': tStart}
+
+def openRecording(path):
+    # -> header, frames, edges: read-only memory-mapped views of the recorded part of each section
+    header = readHeader(path)
+    frameOffset, edgeOffset = sectionOffsets(header['frameCapacity'])
+    frames = np.memmap(path, dtype = FRAME_DTYPE, mode = 'r', offset = frameOffset, shape = (header['frameCount'],)) \
+        if (header['frameCount'] > 0) else np.zeros(0, dtype = FRAME_DTYPE)
+    edges = np.memmap(path, dtype = EDGE_DTYPE, mode = 'r', offset = edgeOffset, shape = (header['edgeCount'],)) \
+        if (header['edgeCount'] > 0) else np.zeros(0, dtype = EDGE_DTYPE)
+    return header, frames, edges
+
+if __name__ == "__main__":
+    # Per-sample cost and memory over a long synthetic recording
+    import resource
+    import tempfile
+    import time
+
+    path = os.path.join(tempfile.gettempdir(), 'recorder_test.focrec')
+    rec = Recorder(path, seconds = 1800)
+    rng = np.random.default_rng(0)
+    frames = rng.integers(0, 256, (50, 16), dtype = np.uint8)
+    lineIdx = rng.integers(0, 6, 40)
+    values = rng.integers(0, 2, 40)
+
+    t = 0
+    t0 = time.perf_counter()
+    for k in range(0,20):
+        tk = time.perf_counter()
+        for m in range(0,10000):
+            rec.writeFrames(frames, t + 128e-6*np.arange(1, 51))
+            rec.writeEdges(lineIdx, values, t + 6.4e-3*np.arange(40)/40)
+            t = t + 6.4e-3
+        dt = (time.perf_counter() - tk)/(10000*50)
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024
+        if (k % 5 == 4):
+            print(f'{rec.duration():6.0f} s recorded, {1e9*dt:5.0f} ns per frame, max RSS {rss:5.0f} MB')
+    rec.close()
+
+    header, frames, edges = openRecording(path)
+    print(header['frameCount'], 'frames,', header['edgeCount'], 'edges, monotonic', bool(np.all(np.diff(frames['t']) > 0)))
+    os.remove(path)
@@ -0,0 +1,51 @@
+import numpy as np
+
+class RingBuffer:
+    # Fixed-length sample store with O(1) appends.
+    # Every sample is written twice (at head and head + capacity) so the newest samples are always
+    # available as one contiguous view without shifting or copying the whole window.
+    def __init__(self, capacity, dtype = float):
+        self.capacity = capacity
+        self.data = np.zeros(2*capacity, dtype = dtype)
+        self.head = 0 # index of the oldest sample
+
+    def append(self, value):
+        self.data[self.head] = value
+        self.data[self.head + self.capacity] = value
+        self.head = (self.head + 1) % self.capacity
+
+    def extend(self, values):
+        values = np.asarray(values)
+        n = len(values)
+        if (n == 0):
+            return
+        if (n >= self.capacity):
+            self.data[0:self.capacity] = values[-self.capacity:]
+            self.data[self.capacity:] = values[-self.capacity:]
+            self.head = 0
+            return
+
+        end = self.head + n
+        if (end <= self.capacity):
+            self.data[self.head:end] = values
+            self.data[(self.head + self.capacity):(end + self.capacity)] = values
+        else:
+            n1 = self.capacity - self.head
+            self.data[self.head:self.capacity] = values[0:n1]
+            self.data[(self.head + self.capacity):] = values[0:n1]
+            self.data[0:(n - n1)] = values[n1:]
+            self.data[self.capacity:(self.capacity + n - n1)] = values[n1:]
+        self.head = end % self.capacity
+
+    def latest(self, n = None):
+        # Oldest-to-newest view of the last n samples (the whole window by default)
+        if (n is None):
+            n = self.capacity
+        end = self.head + self.capacity
+        return self.data[(end - n):end]
+
+    def __getitem__(self, key):
+        return self.latest()[key]
+
+    def __len__(self):
+        return self.capacity
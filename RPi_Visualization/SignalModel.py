@@ -0,0 +1,68 @@
+import numpy as np
+
+# Processed series shared by the plot items that show them.
+# Each series lives in its own buffer, reused from refresh to refresh (it only grows), and carries a version that
+# set() bumps. Plot items are bound to series as views, in groups (one per tab). draw(group) calls setData only on
+# the views of that group whose series changed since they were last drawn, so a series shown by several items is
+# stored once, and any number of set() calls between two draws cost one setData per view.
+# Plot items keep the arrays they are given (and re-read them on a zoom or resize), while set() overwrites the
+# buffers in place, so draw() hands each item a copy of the part it shows.
+
+class View:
+    def __init__(self, item, y, x = None, part = None):
+        self.item = item
+        self.y = y
+        self.x = x
+        self.part = part # slice of the series shown, e.g. the end point of a vector
+        self.drawn = None
+
+class SignalModel:
+    def __init__(self):
+        self.buffers = {}
+        self.lengths = {}
+        self.versions = {}
+        self.groups = {}
+
+    def set(self, name, values):
+        values = np.asarray(values, dtype = float)
+        n = len(values)
+        buffer = self.buffers.get(name)
+        if (buffer is None) or (len(buffer) < n):
+            buffer = np.empty(max(n, 1))
+            self.buffers[name] = buffer
+        np.copyto(buffer[0:n], values)
+        self.lengths[name] = n
+        self.versions[name] = self.versions.get(name, 0) + 1
+
+    def get(self, name):
+        return self.buffers[name][0:self.lengths[name]]
+
+    def bind(self, group, item, y, x = None, part = None):
+        self.groups.setdefault(group, []).append(View(item, y, x, part))
+
+    def version(self, view):
+        return (self.versions.get(view.y), self.versions.get(view.x))
+
+    def draw(self, group):
+        for view in self.groups.get(group, []):
+            if (view.y not in self.versions):
+                continue
+            version = self.version(view)
+            if (version == view.drawn):
+                continue
+            view.drawn = version
+
+            y = self.get(view.y)
+            x = None if (view.x is None) else self.get(view.x)
+            if (view.part is not None):
+                y = y[view.part]
+                x = None if (x is None) else x[view.part]
+            if (x is None):
+                view.item.setData(y.copy())
+            else:
+                n = min(len(x), len(y))
+                view.item.setData(x[0:n].copy(), y[0:n].copy())
+
+    def drawAll(self):
+        for group in self.groups:
+            self.draw(group)
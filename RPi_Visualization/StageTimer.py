@@ -0,0 +1,113 @@
+import time
+
+import numpy as np
+
+from RingBuffer import RingBuffer
+
+# Per-stage timing of the refresh loop, kept as rolling windows of the last historyLen entries per stage.
+# Stages are timed with mark()/lap() around the code and summed until their entry is closed: the refresh stages
+# by endRefresh() once per refresh (one drain of the acquisition buffer, whether or not it completed a window),
+# the frame stages (render) by endFrame() once per drawn frame, which runs on its own timer.
+# Switched off (the default), mark() and lap() return straight away, so the instrumented code pays one
+# attribute check per call and nothing is stored.
+#
+#   t = timer.mark()
+#   ...
+#   t = timer.lap('decode', t) # time since t goes to 'decode', returns the new mark
+
+STAGES = ['acquire', 'decode', 'filter', 'estimate', 'transform', 'publish', 'render']
+FRAME_STAGES = ['render']
+
+# Histogram bins, log spaced from 10 us to 1 s
+BIN_EDGES = np.logspace(-5, 0, 26)
+
+class StageTimer:
+    def __init__(self, enabled = False, stages = STAGES, frameStages = FRAME_STAGES, historyLen = 256):
+        self.enabled = enabled
+        self.stages = list(stages)
+        self.frameStages = [stage for stage in self.stages if stage in frameStages]
+        self.refreshStages = [stage for stage in self.stages if stage not in frameStages]
+        self.historyLen = historyLen
+        self.times = {stage: RingBuffer(historyLen) for stage in self.stages}
+        self.refreshTimes = RingBuffer(historyLen)
+        self.sampleCounts = RingBuffer(historyLen)
+        self.refreshes = 0
+        self.frames = 0
+        self.pending = dict.fromkeys(self.stages, 0.0)
+        self.pendingSamples = 0
+
+    def mark(self):
+        if not self.enabled:
+            return 0
+        return time.perf_counter()
+
+    def lap(self, stage, t0):
+        if not self.enabled:
+            return 0
+        t = time.perf_counter()
+        self.pending[stage] = self.pending[stage] + (t - t0)
+        return t
+
+    def count(self, samples):
+        # Analog samples taken in during this refresh, for the effective sample rate
+        if self.enabled:
+            self.pendingSamples = self.pendingSamples + samples
+
+    def endRefresh(self):
+        if not self.enabled:
+            return
+        self.close(self.refreshStages)
+        self.refreshTimes.append(time.perf_counter())
+        self.sampleCounts.append(self.pendingSamples)
+        self.pendingSamples = 0
+        self.refreshes = self.refreshes + 1
+
+    def endFrame(self):
+        if not self.enabled:
+            return
+        self.close(self.frameStages)
+        self.frames = self.frames + 1
+
+    def close(self, stages):
+        for stage in stages:
+            self.times[stage].append(self.pending[stage])
+            self.pending[stage] = 0.0
+
+    def filled(self, stage = None):
+        # Entries in the rolling window, of the refreshes or of the given stage
+        n = self.frames if (stage in self.frameStages) else self.refreshes
+        return min(n, self.historyLen)
+
+    def history(self, stage):
+        # Seconds per refresh (per frame for the frame stages), oldest to newest
+        return self.times[stage].latest(self.filled(stage))
+
+    def histogram(self, stage):
+        # Counts per BIN_EDGES bin over the rolling window
+        return np.histogram(self.history(stage), bins = BIN_EDGES)[0]
+
+    def refreshRate(self):
+        n = self.filled()
+        if (n < 2):
+            return 0
+        t = self.refreshTimes.latest(n)
+        return (n - 1)/(t[-1] - t[0]) if (t[-1] > t[0]) else 0
+
+    def sampleRate(self):
+        n = self.filled()
+        if (n < 2):
+            return 0
+        t = self.refreshTimes.latest(n)
+        return np.sum(self.sampleCounts.latest(n - 1))/(t[-1] - t[0]) if (t[-1] > t[0]) else 0
+
+    def worst(self):
+        # (stage, seconds) of the slowest single stage over the rolling window
+        worst = [(float(np.max(self.history(stage))), stage) for stage in self.stages if (self.filled(stage) > 0)]
+        if (len(worst) == 0):
+            return None, 0
+        t, stage = max(worst)
+        return stage, t
+
+    def summary(self):
+        # {stage: (p50, p99, max)} in seconds, stages with no entries yet left out
+        return {stage: tuple(np.percentile(self.history(stage), [50, 99, 100])) for stage in self.stages if (self.filled(stage) > 0)}
@@ -0,0 +1,148 @@
+import numpy as np
+from scipy.signal import sosfilt, sosfilt_zi
+
+# Streaming low-pass stage for the analog channels.
+# Samples are filtered as they arrive with sosfilt, carrying the filter state from one block to the next,
+# so the cost per refresh scales with the new samples instead of re-running filtfilt over the whole window.
+#
+# mode = 'causal': plain forward filter; output times are the input times (the output lags by the filter delay).
+# mode = 'delay': forward filter with the output times moved back by the filter's group delay (at DC, rounded
+#   to whole samples), which lines the low-frequency content up with the raw samples.
+# mode = 'lookahead': zero-phase. The forward output is held back by lookAhead samples and a backward pass runs
+#   over the held block, so each output sample is emitted lookAhead samples late but without phase shift.
+#   lookAhead has to cover the settling time of the filter for the backward start-up transient to die out.
+#
+# process() returns (y, tOut): the filtered samples (channels, m) and the time of each, m can differ from the input.
+
+class StreamingFilter:
+    def __init__(self, channels, mode = 'causal', lookAhead = 128):
+        self.channels = channels
+        self.mode = mode
+        self.lookAhead = lookAhead
+        self.sos = None
+        self.ziStep = None
+        self.zi = None
+        self.delay = 0
+        self.pending = np.zeros((channels, 0))
+        self.tPending = np.zeros(0)
+
+    def setSos(self, sos):
+        # The state is kept when the design changes (same order), so a small cutoff step does not restart the filter
+        if (self.sos is not None) and (sos is self.sos):
+            return
+        if (self.sos is not None) and (sos.shape != self.sos.shape):
+            self.zi = None
+        self.sos = sos
+        self.ziStep = sosfilt_zi(sos)[:, None, :] # steady state for a unit step, scaled per channel
+        self.delay = int(round(groupDelay(sos))) if (self.mode == 'delay') else 0
+
+    def reset(self):
+        # Forget the state and held samples (e.g. after a pause, when the stream has a gap)
+        self.zi = None
+        self.pending = np.zeros((self.channels, 0))
+        self.tPending = np.zeros(0)
+
+    def process(self, x, t):
+        x = np.asarray(x, dtype = float).reshape(self.channels, -1)
+        t = np.asarray(t, dtype = float)
+        if (x.shape[1] == 0):
+            return x, t
+
+        if (self.zi is None):
+            # Start from the steady state for the first sample, so there is no start-up step
+            self.zi = self.ziStep*x[None, :, 0, None]
+        y, self.zi = sosfilt(self.sos, x, axis = -1, zi = self.zi)
+
+        if (self.mode == 'lookahead'):
+            self.pending = np.concatenate((self.pending, y), axis = 1)
+            self.tPending = np.concatenate((self.tPending, t))
+            m = self.pending.shape[1] - self.lookAhead
+            if (m <= 0):
+                return np.zeros((self.channels, 0)), np.zeros(0)
+
+            reverse = self.pending[:, ::-1]
+            zi = self.ziStep*reverse[None, :, 0, None]
+            z = sosfilt(self.sos, reverse, axis = -1, zi = zi)[0][:, ::-1]
+
+            y = z[:, 0:m]
+            tOut = self.tPending[0:m]
+            self.pending = self.pending[:, m:]
+            self.tPending = self.tPending[m:]
+            return y, tOut
+
+        if (self.mode == 'delay') and (self.delay > 0):
+            # Output sample k is given the time of input sample k - delay
+            self.tPending = np.concatenate((self.tPending, t))
+            m = min(len(t), len(self.tPending) - self.delay)
+            if (m <= 0):
+                return np.zeros((self.channels, 0)), np.zeros(0)
+            end = len(self.tPending) - self.delay
+            tOut = self.tPending[(end - m):end]
+            self.tPending = self.tPending[-self.delay:]
+            return y[:, -m:], tOut
+
+        return y, t
+
+def groupDelay(sos):
+    # Group delay at DC in samples: sum over sections of (sum k*b_k)/(sum b_k) - (sum k*a_k)/(sum a_k)
+    k = np.arange(3)
+    b = sos[:, 0:3]
+    a = sos[:, 3:6]
+    return float(np.sum(b @ k/np.sum(b, axis = 1) - a @ k/np.sum(a, axis = 1)))
+
+def holdInvalid(values, valid, last):
+    # Replace samples flagged invalid with the previous valid sample of the same channel (sample and hold),
+    # so every channel keeps one sample per frame. last (channels,) is the value held from the previous block
+    # and is updated in place.
+    n = values.shape[1]
+    if (n == 0):
+        return values
+    idx = np.where(valid, np.arange(n)[None, :], -1)
+    idx = np.maximum.accumulate(idx, axis = 1)
+    rows = np.arange(values.shape[0])[:, None]
+    filled = np.where(idx >= 0, values[rows, np.maximum(idx, 0)], last[:, None])
+    last[:] = filled[:, -1]
+    return filled
+
+if __name__ == "__main__":
+    # Compares the streaming filter (fed in 50-sample blocks) with filtfilt over a 400-sample window
+    import time
+    from scipy.signal import butter, sosfiltfilt
+
+    f_s = 7800
+    f = 50
+    sos = butter(4, 3*f/f_s, btype = 'low', output = 'sos')
+    rng = np.random.default_rng(0)
+    n = 8000
+    t = np.arange(n)/f_s
+    x = np.stack([np.sin(2*np.pi*f*t - k*2*np.pi/3) for k in range(6)]) + 0.2*rng.normal(size = (6, n))
+    block = 50
+
+    for mode in ['causal', 'delay', 'lookahead']:
+        stream = StreamingFilter(6, mode = mode)
+        stream.setSos(sos)
+        ys = []
+        ts = []
+        t0 = time.perf_counter()
+        for k in range(0, n, block):
+            y, tOut = stream.process(x[:, k:(k + block)], t[k:(k + block)])
+            ys.append(y)
+            ts.append(tOut)
+        tStream = (time.perf_counter() - t0)/(n/block)
+        y = np.concatenate(ys, axis = 1)
+        tOut = np.concatenate(ts)
+
+        # error against the clean sinusoid at the output times, over the settled part
+        clean = np.stack([np.sin(2*np.pi*f*tOut - k*2*np.pi/3) for k in range(6)])
+        rms = np.sqrt(np.mean((y[:, 1000:] - clean[:, 1000:])**2))
+        print(f'{mode:9s}: {1e6*tStream:6.1f} us per {block}-sample block, latency {1e3*(t[-1] - tOut[-1]):5.1f} ms, rms error {rms:.3f}')
+
+    window = 400
+    reps = 200
+    t0 = time.perf_counter()
+    for r in range(0,reps):
+        sosfiltfilt(sos, x[:, -window:], axis = -1)
+    tWindow = (time.perf_counter() - t0)/reps
+    y = sosfiltfilt(sos, x[:, -window:], axis = -1)
+    clean = np.stack([np.sin(2*np.pi*f*t[-window:] - k*2*np.pi/3) for k in range(6)])
+    print(f'filtfilt : {1e6*tWindow:6.1f} us per {window}-sample window, rms error {np.sqrt(np.mean((y - clean)**2)):.3f}')
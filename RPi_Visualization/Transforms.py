@@ -0,0 +1,95 @@
+import numpy as np
+
+# Vectorized Clarke/Park (dq0) transforms.
+# Phase quantities are stacked as (3, N) arrays (rows U, V, W), or (W, 3, N) for W windows at once;
+# theta is the electrical angle in rad with shape (N,) or (W, N).
+#
+# d = 2/3*(cos(theta)*u + cos(theta - 2pi/3)*v + cos(theta + 2pi/3)*w)
+# q = -2/3*(sin(theta)*u + sin(theta - 2pi/3)*v + sin(theta + 2pi/3)*w)
+# z = u + v + w (the GUI plots the plain sum as the 0 component)
+#
+# Going through alpha/beta needs one cos and one sin per sample instead of six.
+
+def clarke(abc):
+    abc = np.asarray(abc)
+    u = abc[..., 0, :]
+    v = abc[..., 1, :]
+    w = abc[..., 2, :]
+    alpha = 2/3*(u - 0.5*v - 0.5*w)
+    beta = (v - w)/np.sqrt(3)
+    return np.stack((alpha, beta), axis = -2)
+
+def park(alphaBeta, theta):
+    alpha = alphaBeta[..., 0, :]
+    beta = alphaBeta[..., 1, :]
+    cosTheta = np.cos(theta)
+    sinTheta = np.sin(theta)
+    d = alpha*cosTheta + beta*sinTheta
+    q = beta*cosTheta - alpha*sinTheta
+    return np.stack((d, q), axis = -2)
+
+def dq0(abc, theta):
+    # (3, N) -> (3, N) rows d, q, z; also works on (W, 3, N) with theta (W, N)
+    abc = np.asarray(abc)
+    dq = park(clarke(abc), theta)
+    z = np.sum(abc, axis = -2, keepdims = True)
+    return np.concatenate((dq, z), axis = -2)
+
+def dq0Windows(abc, t, f):
+    # Batched variant: abc (W, 3, N), sample times t (W, N) and one electrical frequency per window f (W,)
+    theta = 2*np.pi*np.asarray(f, dtype = float)[:, None]*t
+    return dq0(abc, theta)
+
+def dq0Loop(abc, t, f):
+    # Reference per-sample loop (the original GUI code path), used to check and benchmark dq0
+    n = abc.shape[1]
+    d = np.zeros(n)
+    q = np.zeros(n)
+    for i in range(0,n):
+        d[i] = 2/3*(np.cos(2*np.pi*f*t[i])*abc[0,i] + \
+            np.cos(2*np.pi*(f*t[i] - 1/3))*abc[1,i] + \
+            np.cos(2*np.pi*(f*t[i] + 1/3))*abc[2,i])
+        q[i] = -2/3*(np.sin(2*np.pi*f*t[i])*abc[0,i] + \
+            np.sin(2*np.pi*(f*t[i] - 1/3))*abc[1,i] + \
+            np.sin(2*np.pi*(f*t[i] + 1/3))*abc[2,i])
+    return d, q
+
+if __name__ == "__main__":
+    # Benchmark: per-sample loop vs vectorized dq0, and the batched variant over many windows
+    import time
+
+    rng = np.random.default_rng(0)
+    f = 52.3
+    for n in [400, 4000]:
+        t = np.cumsum(rng.uniform(90e-6, 110e-6, n))
+        phase = 2*np.pi*f*t
+        abc = np.stack([np.cos(phase - k*2*np.pi/3) for k in range(3)]) + 0.01*rng.normal(size = (3, n))
+
+        t0 = time.perf_counter()
+        dq0Loop(abc, t, f)
+        tLoop = time.perf_counter() - t0
+
+        reps = 200
+        t0 = time.perf_counter()
+        for r in range(0,reps):
+            dq0(abc, 2*np.pi*f*t)
+        tVector = (time.perf_counter() - t0)/reps
+
+        print(f'{n:5d} samples: loop {1e3*tLoop:8.2f} ms, vectorized {1e3*tVector:6.3f} ms ({tLoop/tVector:6.0f}x)')
+
+    windows = 64
+    n = 400
+    t = np.cumsum(rng.uniform(90e-6, 110e-6, (windows, n)), axis = 1)
+    fs = rng.uniform(10, 200, windows)
+    abc = rng.normal(size = (windows, 3, n))
+
+    t0 = time.perf_counter()
+    for w in range(0,windows):
+        dq0(abc[w], 2*np.pi*fs[w]*t[w])
+    tSingle = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    dq0Windows(abc, t, fs)
+    tBatch = time.perf_counter() - t0
+
+    print(f'{windows} windows x {n}: one at a time {1e3*tSingle:6.2f} ms, batched {1e3*tBatch:6.2f} ms')
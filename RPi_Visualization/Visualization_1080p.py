@@ -1,15 +1,20 @@
 from PyQt5.QtWidgets import QApplication, QMainWindow, QTabWidget, QWidget, QHBoxLayout, QPushButton, QGridLayout, QLabel
 from PyQt5.QtGui import QPixmap, QFont
 from PyQt5.QtCore import Qt, QSize
-from scipy.signal import butter, filtfilt
 
 import pyqtgraph as pg
 import sys
 import numpy as np
-import spidev
-import gpiod
 import time
 
+from Acquisition import AcquisitionThread, CYCLE
+from AcquisitionProcess import AcquisitionProcess
+from Backends import openBackends
+from Engine import Engine
+from StageTimer import StageTimer
+from SignalModel import SignalModel
+from Recorder import Recorder
+
 class SquarePlotWidget(pg.PlotWidget):
     def __init__(self, xrange=None, yrange=None, **kwargs):
         super().__init__(**kwargs)
@@ -64,6 +69,9 @@ class MyWindow(QMainWindow):
         self.tabs.currentChanged.connect(self.on_tab_changed)
         self.tabIndex = 0
 
+        # Processed series shared by the plot items of every tab (SignalModel.py); items are bound further down, one group per tab
+        self.signals = SignalModel()
+
         # ----- TAB 1 ----- #
         self.timeDomainTab = QWidget()
         grid = QGridLayout()
@@ -78,6 +86,13 @@ class MyWindow(QMainWindow):
         self.speedLen = 101
         self.maxCount = self.hallLen + self.encoderLen + self.analogLen + self.plotBuffer
 
+        # Per-stage timing of each refresh (StageTimer.py), shown in the status bar when started with --profile
+        self.stageTimer = StageTimer(enabled = ('--profile' in sys.argv))
+
+        # Signal processing (Engine.py); the sample windows and per-refresh histories below belong to the engine
+        self.engine = Engine(self.analogLen, self.analogPlotLen, self.hallLen, self.hallPlotLen, self.encoderLen, self.encoderPlotLen, self.speedLen,
+            timer = self.stageTimer)
+
         self.plotTimeVec = 0.19*np.arange(0,self.analogLen)
         self.hallPlotTimeVec = 0.034*np.arange(0,self.hallPlotLen)
         self.encoderPlotTimeVec = 0.0276*np.arange(0,self.encoderPlotLen)
@@ -102,13 +117,13 @@ class MyWindow(QMainWindow):
         voltagePlot.getAxis('bottom').setStyle(tickFont = horizFont)
         grid.addWidget(voltagePlot, 0, 0)
 
-        self.uVolts = np.zeros(self.analogLen) # c95564, 81cca2, 8998d9 | 66CCEE AA3377 CCBB44
+        self.uVolts = self.engine.uVolts # c95564, 81cca2, 8998d9 | 66CCEE AA3377 CCBB44
         self.uVoltsCurve = voltagePlot.plot(self.plotTimeVec[0:self.analogPlotLen],self.uVolts[0:self.analogPlotLen], pen = pg.mkPen(color = '#66CCEE', width = plotLineWidth), name = 'a')
 
-        self.vVolts = np.zeros(self.analogLen)
+        self.vVolts = self.engine.vVolts
         self.vVoltsCurve = voltagePlot.plot(self.plotTimeVec[0:self.analogPlotLen],self.vVolts[0:self.analogPlotLen], pen = pg.mkPen(color = '#AA3377', width = plotLineWidth), name = 'b')
 
-        self.wVolts = np.zeros(self.analogLen)
+        self.wVolts = self.engine.wVolts
         self.wVoltsCurve = voltagePlot.plot(self.plotTimeVec[0:self.analogPlotLen],self.wVolts[0:self.analogPlotLen], pen = pg.mkPen(color = '#CCBB44', width = plotLineWidth), name = 'c')
         
         # UVW Motor Currents
@@ -122,13 +137,13 @@ class MyWindow(QMainWindow):
         currentPlot.getAxis('bottom').setStyle(tickFont = horizFont)
         grid.addWidget(currentPlot, 0, 1)
 
-        self.uAmps = np.zeros(self.analogLen)
+        self.uAmps = self.engine.uAmps
         self.uAmpsCurve = currentPlot.plot(self.plotTimeVec[0:self.analogPlotLen],self.uAmps[0:self.analogPlotLen], pen = pg.mkPen(color = "#EE6677", width = plotLineWidth), name = 'a')
 
-        self.vAmps = np.zeros(self.analogLen)
+        self.vAmps = self.engine.vAmps
         self.vAmpsCurve = currentPlot.plot(self.plotTimeVec[0:self.analogPlotLen],self.vAmps[0:self.analogPlotLen], pen = pg.mkPen(color = "#4477AA", width = plotLineWidth), name = 'b')
 
-        self.wAmps = np.zeros(self.analogLen)
+        self.wAmps = self.engine.wAmps
         self.wAmpsCurve = currentPlot.plot(self.plotTimeVec[0:self.analogPlotLen],self.wAmps[0:self.analogPlotLen], pen = pg.mkPen(color = "#228833", width = plotLineWidth), name = 'c')
 
         # Speed
@@ -148,11 +163,11 @@ class MyWindow(QMainWindow):
         self.speedPlot.addLegend(offset = 0, labelTextSize = legendFontSize, colCount = 2)
         grid.addWidget(self.speedPlot, 2, 1)
 
-        self.speed = np.zeros(self.speedLen)
-        self.speedCurve = self.speedPlot.plot(self.speed, pen = pg.mkPen(color = '#000000', width = plotLineWidth), name = 'Speed')
+        self.speed = self.engine.speed
+        self.speedCurve = self.speedPlot.plot(self.speed.latest(), pen = pg.mkPen(color = '#000000', width = plotLineWidth), name = 'Speed')
 
-        self.refSpeed = np.zeros(self.speedLen)
-        self.refSpeedVec = np.zeros(self.speedLen+1)
+        self.refSpeed = self.engine.refSpeed
+        self.refSpeedVec = self.engine.refSpeedVec
         self.refSpeedCurve = self.speedPlot.plot(self.refSpeedVec[0:(len(self.refSpeedVec)-1)], pen = pg.mkPen(color = '#66CCEE', width = plotLineWidth-2), name = 'Reference')
 
         # dq0 Voltages
@@ -168,15 +183,15 @@ class MyWindow(QMainWindow):
         grid.addWidget(vdqPlot, 1, 0)
 
         self.dVolts = np.zeros(self.analogLen)
-        self.dVoltsVec = np.zeros(self.speedLen)
+        self.dVoltsVec = self.engine.dVoltsVec
         self.dVoltsCurve = vdqPlot.plot(self.plotTimeVec[0:self.analogPlotLen],self.dVolts[0:self.analogPlotLen], pen = pg.mkPen(color = "#009988", width = plotLineWidth), name = 'd')
 
         self.qVolts = np.zeros(self.analogLen)
-        self.qVoltsVec = np.zeros(self.speedLen)
+        self.qVoltsVec = self.engine.qVoltsVec
         self.qVoltsCurve = vdqPlot.plot(self.plotTimeVec[0:self.analogPlotLen],self.qVolts[0:self.analogPlotLen], pen = pg.mkPen(color = "#E98043", width = plotLineWidth), name = 'q')
 
         self.zVolts = np.zeros(self.analogLen)
-        self.zVoltsVec = np.zeros(self.speedLen)
+        self.zVoltsVec = self.engine.zVoltsVec
         self.zVoltsCurve = vdqPlot.plot(self.plotTimeVec[0:self.analogPlotLen],self.zVolts[0:self.analogPlotLen], pen = pg.mkPen(color = '#696969', width = plotLineWidth), name = '0')
 
         # dq0 Currents
@@ -192,15 +207,15 @@ class MyWindow(QMainWindow):
         grid.addWidget(idqPlot, 1, 1)
 
         self.dAmps = np.zeros(self.analogLen)
-        self.dAmpsVec = np.zeros(self.speedLen)
+        self.dAmpsVec = self.engine.dAmpsVec
         self.dAmpsCurve = idqPlot.plot(self.plotTimeVec[0:self.analogPlotLen],self.dAmps[0:self.analogPlotLen], pen = pg.mkPen(color = "#332288", width = plotLineWidth), name = 'd')
 
         self.qAmps = np.zeros(self.analogLen)
-        self.qAmpsVec = np.zeros(self.speedLen)
+        self.qAmpsVec = self.engine.qAmpsVec
         self.qAmpsCurve = idqPlot.plot(self.plotTimeVec[0:self.analogPlotLen],self.qAmps[0:self.analogPlotLen], pen = pg.mkPen(color = "#CC6677", width = plotLineWidth), name = 'q')
 
         self.zAmps = np.zeros(self.analogLen)
-        self.zAmpsVec = np.zeros(self.speedLen)
+        self.zAmpsVec = self.engine.zAmpsVec
         self.zAmpsCurve = idqPlot.plot(self.plotTimeVec[0:self.analogPlotLen],self.zAmps[0:self.analogPlotLen], pen = pg.mkPen(color = '#696969', width = plotLineWidth), name = '0')
 
         # Source Phase Voltages
@@ -370,13 +385,13 @@ class MyWindow(QMainWindow):
         hallPlot.showGrid(x = True, y = True, alpha = 0.2)
         hallPlot.addLegend(offset = 1, labelTextSize = legendFontSize)
 
-        self.hallA = np.zeros(self.hallLen)
+        self.hallA = self.engine.hallA
         self.hallCurveA = hallPlot.plot(self.hallPlotTimeVec,self.hallA[0:self.hallPlotLen], pen = pg.mkPen(color = '#EE6677', width = plotLineWidth), name = 'Hall A')
         
-        self.hallB = np.zeros(self.hallLen)
+        self.hallB = self.engine.hallB
         self.hallCurveB = hallPlot.plot(self.hallPlotTimeVec,self.hallB[0:self.hallPlotLen], pen = pg.mkPen(color = '#228833', width = plotLineWidth), name = 'Hall B')
 
-        self.hallC = np.zeros(self.hallLen)
+        self.hallC = self.engine.hallC
         self.hallCurveC = hallPlot.plot(self.hallPlotTimeVec,self.hallC[0:self.hallPlotLen], pen = pg.mkPen(color = '#4477AA', width = plotLineWidth), name = 'Hall C')
 
         encoderPlot = pg.PlotWidget()
@@ -391,13 +406,13 @@ class MyWindow(QMainWindow):
         encoderPlot.showGrid(x = True, y = True, alpha = 0.2)
         encoderPlot.addLegend(offset = 1, labelTextSize = legendFontSize)
 
-        self.encoderA = np.zeros(self.encoderLen)
+        self.encoderA = self.engine.encoderA
         self.encoderCurveA = encoderPlot.plot(self.encoderPlotTimeVec, self.encoderA[0:self.encoderPlotLen], pen = pg.mkPen(color = '#66CCEE', width = plotLineWidth), name = 'Encoder A')
         
-        self.encoderB = np.zeros(self.encoderLen)
+        self.encoderB = self.engine.encoderB
         self.encoderCurveB = encoderPlot.plot(self.encoderPlotTimeVec, self.encoderB[0:self.encoderPlotLen], pen = pg.mkPen(color = '#AA3377', width = plotLineWidth), name = 'Encoder B')
 
-        self.encoderZ = np.zeros(self.encoderLen)
+        self.encoderZ = self.engine.encoderZ
         self.encoderCurveZ = encoderPlot.plot(self.encoderPlotTimeVec, self.encoderZ[0:self.encoderPlotLen], pen = pg.mkPen(color = '#CCBB44', width = plotLineWidth), name = 'Encoder Z')
 
         self.rawTab.setLayout(grid)
@@ -496,11 +511,11 @@ class MyWindow(QMainWindow):
         homeVoltagePlot.getAxis('bottom').setStyle(tickFont = horizFont)
 
         # 66CCEE AA3377 CCBB44
-        self.uVoltsHomeCurve = homeVoltagePlot.plot(self.plotTimeVec,self.uVolts, pen = pg.mkPen(color = '#66CCEE', width = plotLineWidth), name = 'a')
+        self.uVoltsHomeCurve = homeVoltagePlot.plot(self.plotTimeVec,self.uVolts.latest(), pen = pg.mkPen(color = '#66CCEE', width = plotLineWidth), name = 'a')
 
-        self.vVoltsHomeCurve = homeVoltagePlot.plot(self.plotTimeVec,self.vVolts, pen = pg.mkPen(color = '#AA3377', width = plotLineWidth), name = 'b')
+        self.vVoltsHomeCurve = homeVoltagePlot.plot(self.plotTimeVec,self.vVolts.latest(), pen = pg.mkPen(color = '#AA3377', width = plotLineWidth), name = 'b')
 
-        self.wVoltsHomeCurve = homeVoltagePlot.plot(self.plotTimeVec,self.wVolts, pen = pg.mkPen(color = '#CCBB44', width = plotLineWidth), name = 'c')
+        self.wVoltsHomeCurve = homeVoltagePlot.plot(self.plotTimeVec,self.wVolts.latest(), pen = pg.mkPen(color = '#CCBB44', width = plotLineWidth), name = 'c')
         
         # UVW Motor Currents
         homeCurrentPlot = pg.PlotWidget()
@@ -512,11 +527,11 @@ class MyWindow(QMainWindow):
         homeCurrentPlot.getAxis('left').setStyle(tickFont = vertFont)
         homeCurrentPlot.getAxis('bottom').setStyle(tickFont = horizFont)
 
-        self.uAmpsHomeCurve = homeCurrentPlot.plot(self.plotTimeVec,self.uAmps, pen = pg.mkPen(color = "#EE6677", width = plotLineWidth), name = 'a')
+        self.uAmpsHomeCurve = homeCurrentPlot.plot(self.plotTimeVec,self.uAmps.latest(), pen = pg.mkPen(color = "#EE6677", width = plotLineWidth), name = 'a')
 
-        self.vAmpsHomeCurve = homeCurrentPlot.plot(self.plotTimeVec,self.vAmps, pen = pg.mkPen(color = "#4477AA", width = plotLineWidth), name = 'b')
+        self.vAmpsHomeCurve = homeCurrentPlot.plot(self.plotTimeVec,self.vAmps.latest(), pen = pg.mkPen(color = "#4477AA", width = plotLineWidth), name = 'b')
 
-        self.wAmpsHomeCurve = homeCurrentPlot.plot(self.plotTimeVec,self.wAmps, pen = pg.mkPen(color = "#228833", width = plotLineWidth), name = 'c')
+        self.wAmpsHomeCurve = homeCurrentPlot.plot(self.plotTimeVec,self.wAmps.latest(), pen = pg.mkPen(color = "#228833", width = plotLineWidth), name = 'c')
 
         # dq0 Voltages
         homeVdqPlot = pg.PlotWidget()
@@ -650,7 +665,7 @@ class MyWindow(QMainWindow):
 
         main_layout.setSpacing(0)
         main_layout.addStretch(3)
-        self.save_button = QPushButton('\U0001F4E4 Export')
+        self.save_button = QPushButton('\U000023FA Record')
         #self.save_button.setStyleSheet("font-size: 36pt; padding-top: 8px; border: 2px solid #C8C8C8; border-radius: 6px; background: #DEDEDE")
         self.save_button.setStyleSheet("""
             QPushButton {
@@ -688,552 +703,240 @@ class MyWindow(QMainWindow):
                 font-weight: bold;
             }
             """)
-        
-        self.spi0 = spidev.SpiDev()
-        self.spi0.open(0, 0)
-        self.spi0.max_speed_hz = 1000000
-        self.spi0.mode = 0
-        #self.spi0.bits_per_word = 16
 
-        chip = gpiod.Chip("gpiochip4")
-        self.hallLines = chip.get_lines([23, 24, 25, 17, 27, 22, 5])
-        self.hallLines.request(consumer = 'my_gpio_reader', type = gpiod.LINE_REQ_DIR_IN)
+        self.stats_display = QLabel("SPI: 0 frames/s   Dropped: 0")
+        self.stats_display.setStyleSheet("font: 16px; padding-left: 10px")
+        self.statusBar().addWidget(self.stats_display)
 
-        self.counter = 0
-        self.f_est = 0
+        # Frame and line sources (Backends.py): SPI0.0 and gpiochip4 on the Pi, a replay of the captures in
+        # Oscilloscope_Data when started with --replay (--fast replays as fast as the app can take it), or a
+        # recording made with the Record button when started with --play FILE
+        self.playPath = sys.argv[sys.argv.index('--play') + 1] if ('--play' in sys.argv) else None
+        if(self.playPath is not None):
+            self.backend = 'recording'
+        else:
+            self.backend = 'replay' if ('--replay' in sys.argv) else 'hardware'
+
+        # Hall/encoder lines: kernel-timestamped edge events (no busy polling) or plain polled inputs
+        self.edgeCapture = True
+
+        # --process: the backends are opened and read in a process of their own (AcquisitionProcess.py), which hands the
+        # samples over through shared memory, so acquisition no longer shares the GIL with the processing and painting.
+        # Always concurrent; not with --play, whose controls need the recording in this process
+        self.acqProcess = ('--process' in sys.argv) and (self.backend != 'recording')
+        self.acqFallback = None
+        if(self.acqProcess):
+            self.acq = AcquisitionProcess(self.backend, self.analogLen, self.hallLen, self.encoderLen, self.plotBuffer,
+                edgeCapture = self.edgeCapture, realTime = ('--fast' not in sys.argv))
+            try:
+                self.acq.start()
+                self.spiHz = self.acq.spiHz
+                self.clock = self.acq.clock
+            except RuntimeError as e:
+                # The producer did not come up: acquire in this process instead (the acquisition thread below)
+                self.acqFallback = f'--process: {e}, using the acquisition thread'
+                self.acqProcess = False
+        if not(self.acqProcess):
+            self.spi0, self.hallLines, self.clock = openBackends(self.backend, edgeCapture = self.edgeCapture, realTime = ('--fast' not in sys.argv),
+                path = self.playPath)
+            self.spiHz = self.spi0.max_speed_hz
+
+        # Playback controls (Playback.py): Pause/Play, Left/Right seek 5 s (60 s with Shift), Home back to the start,
+        # Up/Down double/halve the speed (0.1x - 50x)
+        self.playback = self.clock if (self.backend == 'recording') else None
+        if(self.playback is not None):
+            self.playbackGeneration = self.playback.generation
 
         self.pauseExec = 1
-        self.toggleSave = 0
 
-        self.timeVec = np.zeros(self.analogLen)
-        self.timeVecExt = np.zeros(self.hallLen)
-        #self.timeVecT = np.zeros(self.encoderLen)
+        # Recording of the raw stream, sized for recordSeconds (the file is sparse until written, but the disk needs room
+        # for all of it, ~1.8 GB per hour); --record-minutes N sets the length
+        self.recorder = None
+        self.recordSeconds = 60*float(sys.argv[sys.argv.index('--record-minutes') + 1]) if ('--record-minutes' in sys.argv) else 3600
+        self.recordError = None
+
+        # 'concurrent' samples SPI and GPIO side by side on one timebase, 'sequential' runs them one after the other
+        self.captureMode = 'concurrent'
+        if not(self.acqProcess):
+            self.acq = AcquisitionThread(self.spi0, self.hallLines, self.analogLen, self.hallLen, self.encoderLen, self.plotBuffer, mode = self.captureMode,
+                edgeSource = self.hallLines if self.edgeCapture else None, clock = self.clock)
+            self.acq.start()
+
+        # Plot items bound to the shared series, grouped by tab (0 Home, 1 Analog Signals, 2 Vectors, 3 Digital Signals)
+        self.signals.set('hallTime', self.hallPlotTimeVec)
+        self.signals.set('encoderTime', self.encoderPlotTimeVec)
+        bind = self.signals.bind
+        for (group, suffix) in [(0, 'HomeCurve'), (1, 'Curve')]:
+            # the phase voltage curves show the line voltages
+            for (name, series) in [('uVolts', 'uvVolts'), ('vVolts', 'vwVolts'), ('wVolts', 'wuVolts')]:
+                bind(group, getattr(self, name + suffix), series, 'plotTime')
+            for name in ['uAmps', 'vAmps', 'wAmps', 'dVolts', 'qVolts', 'zVolts', 'dAmps', 'qAmps', 'zAmps']:
+                bind(group, getattr(self, name + suffix), name, 'plotTime')
+
+        bind(1, self.speedCurve, 'speed')
+        bind(1, self.refSpeedCurve, 'refSpeed')
+        for name in ['uLineVolts', 'vLineVolts', 'wLineVolts']:
+            bind(1, getattr(self, name + 'Curve'), name, 'plotTime')
+
+        for (group, suffix) in [(0, 'Home'), (2, '')]:
+            for name in ['vdq', 'Rsidq', 'CCdq', 'bemfdq', 'idq']:
+                bind(group, getattr(self, name + suffix + 'Vector'), name + 'Y', name + 'X')
+                bind(group, getattr(self, name + suffix + 'Curve'), name + 'Y', name + 'X', part = slice(1, 2))
+        for name in ['dVolts', 'qVolts', 'zVolts', 'dAmps', 'qAmps', 'zAmps']:
+            bind(2, getattr(self, name + 'TimeCurve'), name + 'History')
+
+        for name in ['A', 'B', 'C']:
+            bind(3, getattr(self, 'hallCurve' + name), 'hall' + name, 'hallTime')
+        for name in ['A', 'B', 'Z']:
+            bind(3, getattr(self, 'encoderCurve' + name), 'encoder' + name, 'encoderTime')
+
+        self.statsTime = time.time()
+        self.statsFrames = 0
+        self.statsDrawn = 0
+        self.frameRate = 0
 
-        self.seq = 1
         self.timer = pg.QtCore.QTimer()
         self.timer.timeout.connect(self.update)
-        self.timer.start(0)
-
-    def update(self):
-        if(self.pauseExec == 1):
-            if (self.counter >= (self.maxCount - self.encoderLen)):
-                GPIOvals = self.hallLines.get_values()
-
-                self.encoderA[:-1] = self.encoderA[1:]
-                self.encoderA[-1] = GPIOvals[4] + 3
-
-                self.encoderB[:-1] = self.encoderB[1:]
-                self.encoderB[-1] = GPIOvals[3] + 1.5
-
-                self.encoderZ[:-1] = self.encoderZ[1:]
-                self.encoderZ[-1] = GPIOvals[5]
+        self.timer.start(10)
 
-                #self.timeVecT[:-1] = self.timeVecT[1:]
-                #self.timeVecT[-1] = time.time()
+        # Display refresh cap (frames/s), independent of how often windows are processed
+        self.renderFps = 30
+        self.frameReady = False
+        self.framesDrawn = 0
+        self.drawRate = 0
+        self.renderTimer = pg.QtCore.QTimer()
+        self.renderTimer.timeout.connect(self.RenderFrame)
+        self.renderTimer.start(int(1000/self.renderFps))
 
-            elif(self.counter >= (self.maxCount - self.hallLen - self.encoderLen)):
-                GPIOvals = self.hallLines.get_values()
-
-                self.hallA[:-1] = self.hallA[1:]
-                self.hallA[-1] = GPIOvals[2] + 3
-
-                self.hallB[:-1] = self.hallB[1:]
-                self.hallB[-1] = GPIOvals[1] + 1.5
+    def update(self):
+        if(self.acqProcess) and self.acq.check():
+            self.UpdateStats() # the acquisition process died or stalled and was restarted (shown in the status bar)
 
-                self.hallC[:-1] = self.hallC[1:]
-                self.hallC[-1] = GPIOvals[0]
+        if(self.playback is not None) and (self.playback.generation != self.playbackGeneration):
+            # Seek, or the recording started over: the timestamps jump, so start the windows afresh
+            self.playbackGeneration = self.playback.generation
+            self.acq.resync()
+            self.engine.reset()
 
-                self.timeVecExt[:-1] = self.timeVecExt[1:]
-                self.timeVecExt[-1] = time.time()
-    
-            elif(self.counter >= (self.maxCount - self.hallLen - self.encoderLen - self.analogLen - self.plotBuffer)):              
-                frame = self.spi0.xfer2([0x00] * 16)
-
-                parity = (frame[4] & 0b01111000) >> 3
-                if (parity == 0 or parity == 1 or parity == 3):
-                    self.uVolts[:-1] = self.uVolts[1:]
-                    self.uVolts[-1] = 31/5250*(((frame[4] & 0b00000111) << 9) | (frame[5] << 1) | (frame[6] >> 7))
-
-                parity = (frame[6] & 0b01111000) >> 3
-                if (parity == 2 or parity == 6):
-                    self.vVolts[:-1] = self.vVolts[1:]
-                    self.vVolts[-1] = 31/5250*(((frame[6] & 0b00000111) << 9) | (frame[7] << 1) | (frame[8] >> 7))
-                
-                parity = (frame[8] & 0b01111000) >> 3
-                if (parity == 7 or parity == 5):
-                    self.wVolts[:-1] = self.wVolts[1:]
-                    self.wVolts[-1] = 31/5250*(((frame[8] & 0b00000111) << 9) | (frame[9] << 1) | (frame[10] >> 7))
-                
-                parity = (frame[10] & 0b01111000) >> 3
-                if (parity == 4 or parity == 12 or parity == 13):
-                    self.uAmps[:-1] = self.uAmps[1:]
-                    self.uAmps[-1] = 20/9009*(((frame[10] & 0b00000111) << 9) | (frame[11] << 1) | (frame[12] >> 7)) - 5
-                
-                parity = (frame[12] & 0b01111000) >> 3
-                if (parity == 15 or parity == 14):
-                    self.vAmps[:-1] = self.vAmps[1:]
-                    self.vAmps[-1] = 20/9009*(((frame[12] & 0b00000111) << 9) | (frame[13] << 1) | (frame[14] >> 7)) - 5
-                
-                parity = (frame[14] & 0b01111000) >> 3
-                if (parity == 10 or parity == 11):
-                    self.wAmps[:-1] = self.wAmps[1:]
-                    self.wAmps[-1] = 20/9009*(((frame[14] & 0b00000111) << 9) | (frame[15] << 1) | (frame[0] >> 7)) - 5
-                
-                parity = (frame[0] & 0b01111000) >> 3
-                if (parity == 9 or parity == 8):
-                    self.refSpeed[:-1] = self.refSpeed[1:]
-                    self.refSpeed[-1] = 1*(((frame[0] & 0b00000111) << 9) | (frame[1] << 1) | (frame[2] >> 7))
-                
-                self.timeVec[:-1] = self.timeVec[1:]
-                self.timeVec[-1] = time.time()
-
-            self.counter = self.counter + 1
-
-            if(self.counter == self.maxCount):
-                self.counter = 0
-                #print(np.median(np.diff(self.timeVecT)))
-
-                stopFlag = 0
-                for i in range(0,self.hallLen - 1):
-                    stopFlag = (self.hallA[i] == 3) and (self.hallA[i+1] > 3)
-                    if(stopFlag == 1):
-                        break
-                
-                if(i >= (self.hallLen - 2)):
-                    i = 0
-
-                ii = i
-                if(i > (self.hallLen - self.hallPlotLen - 1)):
-                    i = (self.hallLen - self.hallPlotLen - 2)
-
-                t1 = self.timeVecExt[ii]
-                modHallA = self.hallA[i:(self.hallPlotLen + i)]
-                modHallB = self.hallB[i:(self.hallPlotLen + i)]
-                modHallC = self.hallC[i:(self.hallPlotLen + i)]
-
-                stopFlag = 0
-                for i in range(ii,self.hallLen - 1):
-                    stopFlag = (self.hallA[i] > 3) and (self.hallA[i+1] == 3)
-                    if(stopFlag == 1):
-                        break
-                
-                if(i >= (self.hallLen - 2)):
-                    i = 3
-
-                t3 = self.timeVecExt[i]
-
-                stopFlag = 0
-                for j in range(ii,self.hallLen - 1):
-                    stopFlag = (self.hallB[j] == 1.5) and (self.hallB[j+1] > 1.5)
-                    if(stopFlag == 1):
-                        break
-                
-                if(j >= (self.hallLen - 2)):
-                    j = 1
-
-                t2 = self.timeVecExt[j]
-                speedEnc = 5.331/abs((t2-t1))*np.sign(t3-t2)*(1+1*(np.sign(t3-t2) < 0))
-                if(abs(speedEnc) > 3700):
-                    speedEnc = 0
-                elif(abs(speedEnc) > 3510):
-                    speedEnc = np.sign(speedEnc)*3510
-        
-                stopFlag = 0
-                for i in range(0,self.encoderLen-1):
-                    stopFlag = (self.encoderZ[i] == 0) and (self.encoderZ[i+1] > 0)
-                    if(stopFlag == 1):
-                        break
-                
-                if(i > (self.encoderLen - self.encoderPlotLen)):
-                    i = 0
-
-                modEncoderA = self.encoderA[i:(self.encoderPlotLen + i+1)]
-                modEncoderB = self.encoderB[i:(self.encoderPlotLen + i+1)]
-                modEncoderZ = self.encoderZ[i:(self.encoderPlotLen + i+1)]
-
-                self.hallCurveA.setData(self.hallPlotTimeVec,modHallA)
-                self.hallCurveB.setData(self.hallPlotTimeVec,modHallB)
-                self.hallCurveC.setData(self.hallPlotTimeVec,modHallC)
-
-                self.encoderCurveA.setData(self.encoderPlotTimeVec,modEncoderA)
-                self.encoderCurveB.setData(self.encoderPlotTimeVec,modEncoderB)
-                self.encoderCurveZ.setData(self.encoderPlotTimeVec,modEncoderZ)
-
-                #if(speedEnc < 800):
-                #    self.hallLen = 6000
-                #else:
-                #    self.hallLen = 2700
-
-                #speedLabelStr = f"Speed: {speedEnc:.0f} rpm"
-                #self.value_display.setText(f'{speedLabelStr[0:6]} {speedLabelStr[7:len(speedLabelStr)].rjust(9)}')
-
-                ######### ANALOG ########
-                uvVolts = self.uVolts - self.vVolts
-
-                f_s = 1/np.median(np.diff(self.timeVec))
-                f_n = f_s/self.analogLen*np.arange(0,int(self.analogLen/2)-1) 
-                #print(1/f_s*1000)
-
-                UV = np.fft.fft(uvVolts)
-                G_n = np.abs(UV[0:(int(self.analogLen/2)-1)])/self.analogLen
-                f_i = np.argmax(G_n)
-                if(G_n[f_i] < 0.5):
-                    self.f_est = 0
-
-                    uvVoltsPlot = np.zeros(self.analogPlotLen)
-                    vwVoltsPlot = np.zeros(self.analogPlotLen)
-                    wuVoltsPlot = np.zeros(self.analogPlotLen)
-
-                    uAmpsPlot = np.zeros(self.analogPlotLen)
-                    vAmpsPlot = np.zeros(self.analogPlotLen)
-                    wAmpsPlot = np.zeros(self.analogPlotLen)
-
-                    dVolts = np.zeros(self.analogPlotLen)
-                    qVolts = np.zeros(self.analogPlotLen)
-                    zVolts = np.zeros(self.analogPlotLen)
-
-                    dAmps = np.zeros(self.analogPlotLen)
-                    qAmps = np.zeros(self.analogPlotLen)
-                    zAmps = np.zeros(self.analogPlotLen)
-
-                    dAmpsAvg = 0
-                    qAmpsAvg = 0
-                    zAmpsAvg = 0
-
-                    dVoltsAvg = 0
-                    qVoltsAvg = 0
-                    zVoltsAvg = 0
-                else:            
-                    f_i2 = 2*np.argmax([G_n[f_i-1], G_n[f_i+1]]) - 1
-                    self.f_est = (G_n[f_i]*f_n[f_i] + G_n[f_i+f_i2]*f_n[f_i+f_i2])/(G_n[f_i] + G_n[f_i+f_i2])
-
-                    UV = np.fft.fft(self.vVolts - self.wVolts)
-                    G_n = np.abs(UV[0:(int(self.analogLen/2)-1)])/self.analogLen
-                    f_i = np.argmax(G_n)
-                    f_i2 = 2*np.argmax([G_n[f_i-1], G_n[f_i+1]]) - 1
-                    f_est2 = (G_n[f_i]*f_n[f_i] + G_n[f_i+f_i2]*f_n[f_i+f_i2])/(G_n[f_i] + G_n[f_i+f_i2])
-
-                    UV = np.fft.fft(self.wVolts - self.uVolts)
-                    G_n = np.abs(UV[0:(int(self.analogLen/2)-1)])/self.analogLen
-                    f_i = np.argmax(G_n)
-                    f_i2 = 2*np.argmax([G_n[f_i-1], G_n[f_i+1]]) - 1
-                    f_est3 = (G_n[f_i]*f_n[f_i] + G_n[f_i+f_i2]*f_n[f_i+f_i2])/(G_n[f_i] + G_n[f_i+f_i2])
-
-                    UV = np.fft.fft(self.uAmps)
-                    G_n = np.abs(UV[0:(int(self.analogLen/2)-1)])/self.analogLen
-                    f_i = np.argmax(G_n)
-                    f_i2 = 2*np.argmax([G_n[f_i-1], G_n[f_i+1]]) - 1
-                    f_est4 = (G_n[f_i]*f_n[f_i] + G_n[f_i+f_i2]*f_n[f_i+f_i2])/(G_n[f_i] + G_n[f_i+f_i2])
-
-                    UV = np.fft.fft(self.vAmps)
-                    G_n = np.abs(UV[0:(int(self.analogLen/2)-1)])/self.analogLen
-                    f_i = np.argmax(G_n)
-                    f_i2 = 2*np.argmax([G_n[f_i-1], G_n[f_i+1]]) - 1
-                    f_est5 = (G_n[f_i]*f_n[f_i] + G_n[f_i+f_i2]*f_n[f_i+f_i2])/(G_n[f_i] + G_n[f_i+f_i2])
-
-                    UV = np.fft.fft(self.wAmps)
-                    G_n = np.abs(UV[0:(int(self.analogLen/2)-1)])/self.analogLen
-                    f_i = np.argmax(G_n)
-                    f_i2 = 2*np.argmax([G_n[f_i-1], G_n[f_i+1]]) - 1
-                    self.f_est = np.median([self.f_est, f_est2, f_est3, f_est4, f_est5, (G_n[f_i]*f_n[f_i] + G_n[f_i+f_i2]*f_n[f_i+f_i2])/(G_n[f_i] + G_n[f_i+f_i2])])
-
-                    #print(self.f_est)
-
-                    w_n = min(2*1.5*self.f_est/f_s, 99/100)
-                    butterb, buttera = butter(4, w_n, btype = 'low')
-                    uvFilt = filtfilt(butterb, buttera, self.uVolts - self.vVolts)
-                    vwFilt = filtfilt(butterb, buttera, self.vVolts - self.wVolts)
-                    wuFilt = filtfilt(butterb, buttera, self.wVolts - self.uVolts)
-                    uFilt = filtfilt(butterb, buttera, self.uAmps)
-                    vFilt = filtfilt(butterb, buttera, self.vAmps)
-                    wFilt = filtfilt(butterb, buttera, self.wAmps)
-
-                    # START OF DQ
-
-                    timeMod = np.zeros(2*len(self.timeVec) - 1)
-                    for i in range(0,len(self.timeVec)-1):
-                        timeMod[2*i] = self.timeVec[i]
-                        timeMod[2*i+1] = (self.timeVec[i] + self.timeVec[i+1])/2
-                    timeMod[-1] = self.timeVec[-1]
-
-                    uFiltMod = np.interp(timeMod, self.timeVec, uFilt)
-                    uFiltMod = uFiltMod - np.median(uFiltMod)
-                    vFiltMod = np.interp(timeMod, self.timeVec, vFilt)
-                    vFiltMod = vFiltMod - np.median(vFiltMod)
-                    wFiltMod = np.interp(timeMod, self.timeVec, wFilt)
-                    wFiltMod = wFiltMod - np.median(wFiltMod)
-
-                    uvFiltMod = np.interp(timeMod, self.timeVec, uvFilt)
-                    vwFiltMod = np.interp(timeMod, self.timeVec, vwFilt)
-                    wuFiltMod = np.interp(timeMod, self.timeVec, wuFilt)
-
-                    stopFlag = 0
-                    
-                    for i in range(0,len(uFiltMod)-2):
-                        stopFlag = (uFiltMod[i] >= 0) and (uFiltMod[i+1] <= 0)
-                        if(stopFlag == 1):
-                            break
-
-                    if (stopFlag == 0):
-                        i = 1
-
-                    stopFlag = 0
-                    
-                    for i1 in range(i,len(uFiltMod)-2):
-                        stopFlag = (vFiltMod[i1] >= 0) and (vFiltMod[i1+1] <= 0)
-                        if (stopFlag == 1):
-                            break
-
-                    if (stopFlag == 0):
-                        i1 = 1
-
-                    stopFlag = 0
-
-                    for i2 in range(i,len(uFiltMod)-2):
-                        stopFlag = (wFiltMod[i2] >= 0) and (wFiltMod[i2+1] <= 0)
-                        if(stopFlag == 1):
-                            break
-
-                    if (stopFlag == 0):
-                        p1 = 1
-                    else:
-                        p1 = i2 # going negative
-                    
-                    stopFlag = 0
-                    
-                    for i2 in range(i,len(uFiltMod)-2):
-                        stopFlag = (wFiltMod[i2] <= 0) and (wFiltMod[i2+1] >= 0)
-                        if(stopFlag == 1):
-                            break
-
-                    if (stopFlag == 0):
-                        p2 = 1
-                    else:
-                        p2 = i2 # going positive
-                    
-                    if (i1 < p1) and (i1 > p2):
-                        self.seq = 1
-                    elif (i1 > p1) and (i1 < p2):
-                        self.seq = -1
-
-                    stopFlag = 0
-
-                    for j in range(0,len(wuFiltMod)-2): #-3.44 going up
-                        stopFlag = (uvFiltMod[j] >= -0.15*max(uvFiltMod)) and (uvFiltMod[j+1] <= -0.15*max(uvFiltMod))
-                        if(stopFlag == 1): # -0.272
-                            break
-
-                    if (stopFlag == 0):
-                        j = 1
-
-                    #i=0
-                    #j=0
-                    timeModLim = timeMod[0:min(self.analogPlotLen+1,2*self.analogPlotLen-1-i)]
-                    timeModLim = np.concatenate((np.array([0]), np.cumsum(np.diff(timeModLim))))
-
-                    timeModLim2 = timeMod[0:min(self.analogPlotLen+1,2*self.analogPlotLen-1-j)]
-                    timeModLim2 = np.concatenate((np.array([0]), np.cumsum(np.diff(timeModLim2))))
-
-                    uFiltModLim = uFiltMod[i:(i + self.analogPlotLen)]
-                    vFiltModLim = vFiltMod[i:(i + self.analogPlotLen)]
-                    wFiltModLim = wFiltMod[i:(i + self.analogPlotLen)]
-                    
-                    uvFiltModLim = uvFiltMod[j:(j + self.analogPlotLen)]
-                    vwFiltModLim = vwFiltMod[j:(j + self.analogPlotLen)]
-                    wuFiltModLim = wuFiltMod[j:(j + self.analogPlotLen)]
-
-                    #dqButterB, dqButterA = butter(7, 0.04, btype = 'high') #WASTEFUL CODE EDIT LATER
-                    #print(np.median(uFiltModLim))
-                    #uFiltModLim = uFiltModLim - np.median(uFiltModLim)#filtfilt(dqButterB, dqButterA, uFiltModLim)
-                    #vFiltModLim = vFiltModLim - np.median(vFiltModLim)
-                    #wFiltModLim = wFiltModLim - np.median(wFiltModLim)
-                    #vFiltModLim = filtfilt(dqButterB, dqButterA, vFiltModLim)
-                    #wFiltModLim = filtfilt(dqButterB, dqButterA, wFiltModLim)
-
-                    dAmps = np.zeros(len(uFiltModLim)-1)
-                    qAmps = np.zeros(len(uFiltModLim)-1)
-                    zAmps = uFiltModLim + vFiltModLim + wFiltModLim
-                    dVolts = np.zeros(len(uvFiltModLim)-1)
-                    qVolts = np.zeros(len(uvFiltModLim)-1)
-                    zVolts = uvFiltModLim + vwFiltModLim + wuFiltModLim
-
-                    maxi = min(len(uFiltModLim), len(vFiltModLim), len(wFiltModLim), len(timeModLim))
-                    fdq = self.seq*self.f_est
-                    for i in range(0,maxi-1):
-                        dAmps[i] = 2/3*(np.cos(2*np.pi*fdq*timeModLim[i])*uFiltModLim[i] + \
-                            np.cos(2*np.pi*(fdq*timeModLim[i] - 1/3))*vFiltModLim[i] + \
-                            np.cos(2*np.pi*(fdq*timeModLim[i] + 1/3))*wFiltModLim[i])
-                        qAmps[i] = -2/3*(np.sin(2*np.pi*fdq*timeModLim[i])*uFiltModLim[i] + \
-                            np.sin(2*np.pi*(fdq*timeModLim[i] - 1/3))*vFiltModLim[i] + \
-                            np.sin(2*np.pi*(fdq*timeModLim[i] + 1/3))*wFiltModLim[i])
-                    
-                    maxi = min(len(uvFiltModLim), len(vwFiltModLim), len(wuFiltModLim), len(timeModLim2))
-                    for i in range(0,maxi-1):
-                        dVolts[i] = 2/3*(np.cos(2*np.pi*fdq*timeModLim2[i])*uvFiltModLim[i] + \
-                            np.cos(2*np.pi*(fdq*timeModLim2[i] - 1/3))*vwFiltModLim[i] + \
-                            np.cos(2*np.pi*(fdq*timeModLim2[i] + 1/3))*wuFiltModLim[i])
-                        qVolts[i] = -2/3*(np.sin(2*np.pi*fdq*timeModLim2[i])*uvFiltModLim[i] + \
-                            np.sin(2*np.pi*(fdq*timeModLim2[i] - 1/3))*vwFiltModLim[i] + \
-                            np.sin(2*np.pi*(fdq*timeModLim2[i] + 1/3))*wuFiltModLim[i])
-                    
-                    #if (self.seq > 0):
-                    
-                    dAmpsAvg = np.mean(dAmps)/np.sqrt(3)
-                    qAmpsAvg = np.mean(qAmps)/np.sqrt(3)
-                    zAmpsAvg = np.mean(zAmps)/np.sqrt(3)
-
-                    dVoltsAvg = np.mean(dVolts)
-                    qVoltsAvg = np.mean(qVolts)
-                    zVoltsAvg = np.mean(zVolts)
-
-                    uvVoltsPlot = uvFiltModLim
-                    vwVoltsPlot = vwFiltModLim
-                    wuVoltsPlot = wuFiltModLim
-
-                    uAmpsPlot = uFiltModLim/np.sqrt(3)
-                    vAmpsPlot = vFiltModLim/np.sqrt(3)
-                    wAmpsPlot = wFiltModLim/np.sqrt(3)
-
-                upperBound = min(self.analogPlotLen, len(dVolts), len(qVolts), len(zVolts), len(dAmps), len(qAmps), len(zAmps))
-                self.uVoltsCurve.setData(self.plotTimeVec[0:upperBound],uvVoltsPlot[0:upperBound])
-                self.vVoltsCurve.setData(self.plotTimeVec[0:upperBound],vwVoltsPlot[0:upperBound])
-                self.wVoltsCurve.setData(self.plotTimeVec[0:upperBound],wuVoltsPlot[0:upperBound])
-
-                self.uAmpsCurve.setData(self.plotTimeVec[0:upperBound],uAmpsPlot[0:upperBound])
-                self.vAmpsCurve.setData(self.plotTimeVec[0:upperBound],vAmpsPlot[0:upperBound])
-                self.wAmpsCurve.setData(self.plotTimeVec[0:upperBound],wAmpsPlot[0:upperBound])
-
-                self.uVoltsHomeCurve.setData(self.plotTimeVec[0:upperBound],uvVoltsPlot[0:upperBound])
-                self.vVoltsHomeCurve.setData(self.plotTimeVec[0:upperBound],vwVoltsPlot[0:upperBound])
-                self.wVoltsHomeCurve.setData(self.plotTimeVec[0:upperBound],wuVoltsPlot[0:upperBound])
-
-                self.uAmpsHomeCurve.setData(self.plotTimeVec[0:upperBound],uAmpsPlot[0:upperBound])
-                self.vAmpsHomeCurve.setData(self.plotTimeVec[0:upperBound],vAmpsPlot[0:upperBound])
-                self.wAmpsHomeCurve.setData(self.plotTimeVec[0:upperBound],wAmpsPlot[0:upperBound])
-
-                self.dVoltsCurve.setData(self.plotTimeVec[0:upperBound], dVolts[0:upperBound])
-                self.qVoltsCurve.setData(self.plotTimeVec[0:upperBound], qVolts[0:upperBound])
-                self.zVoltsCurve.setData(self.plotTimeVec[0:upperBound], zVolts[0:upperBound])
-
-                self.dAmpsCurve.setData(self.plotTimeVec[0:upperBound],dAmps[0:upperBound]/np.sqrt(3))
-                self.qAmpsCurve.setData(self.plotTimeVec[0:upperBound],qAmps[0:upperBound]/np.sqrt(3))
-                self.zAmpsCurve.setData(self.plotTimeVec[0:upperBound],zAmps[0:upperBound]/np.sqrt(3))
-
-                self.dVoltsHomeCurve.setData(self.plotTimeVec[0:upperBound], dVolts[0:upperBound])
-                self.qVoltsHomeCurve.setData(self.plotTimeVec[0:upperBound], qVolts[0:upperBound])
-                self.zVoltsHomeCurve.setData(self.plotTimeVec[0:upperBound], zVolts[0:upperBound])
-
-                self.dAmpsHomeCurve.setData(self.plotTimeVec[0:upperBound],dAmps[0:upperBound]/np.sqrt(3))
-                self.qAmpsHomeCurve.setData(self.plotTimeVec[0:upperBound],qAmps[0:upperBound]/np.sqrt(3))
-                self.zAmpsHomeCurve.setData(self.plotTimeVec[0:upperBound],zAmps[0:upperBound]/np.sqrt(3))
-
-                Rs = 0.72
-                Ld = 0.0012 # 0.007 # 0.0012
-                Lq = Ld
-                #p = 4
-                we = self.seq*self.f_est*2*np.pi
-                #wep = 
-                fluxLinkage = 0.01 #0.009 # 0.01
-
-                self.vdqCurve.setData([dVoltsAvg], [qVoltsAvg])
-                self.vdqVector.setData([0, dVoltsAvg], [0, qVoltsAvg])
-
-                self.RsidqCurve.setData([Rs*dAmpsAvg], [Rs*qAmpsAvg])
-                self.RsidqVector.setData([0, Rs*dAmpsAvg], [0, Rs*qAmpsAvg])
-
-                self.CCdqCurve.setData([-we*Lq*qAmpsAvg + Rs*dAmpsAvg], [we*Ld*dAmpsAvg + Rs*qAmpsAvg])
-                self.CCdqVector.setData([Rs*dAmpsAvg, -we*Lq*qAmpsAvg + Rs*dAmpsAvg], [Rs*qAmpsAvg, we*Ld*dAmpsAvg + Rs*qAmpsAvg])
-
-                self.bemfdqCurve.setData([-we*Lq*qAmpsAvg + Rs*dAmpsAvg], [we*Ld*dAmpsAvg + Rs*qAmpsAvg + we*fluxLinkage])
-                self.bemfdqVector.setData([-we*Lq*qAmpsAvg + Rs*dAmpsAvg, -we*Lq*qAmpsAvg + Rs*dAmpsAvg], [we*Ld*dAmpsAvg + Rs*qAmpsAvg, we*Ld*dAmpsAvg + Rs*qAmpsAvg + we*fluxLinkage])
-
-                self.idqCurve.setData([-we*Lq*qAmpsAvg + Rs*dAmpsAvg], [we*Ld*dAmpsAvg + Rs*qAmpsAvg + we*fluxLinkage])
-                self.idqVector.setData([0, -we*Lq*qAmpsAvg + Rs*dAmpsAvg], [0, we*Ld*dAmpsAvg + Rs*qAmpsAvg + we*fluxLinkage])
-
-                # Home tab
-                self.vdqHomeCurve.setData([dVoltsAvg], [qVoltsAvg])
-                self.vdqHomeVector.setData([0, dVoltsAvg], [0, qVoltsAvg])
-
-                self.RsidqHomeCurve.setData([Rs*dAmpsAvg], [Rs*qAmpsAvg])
-                self.RsidqHomeVector.setData([0, Rs*dAmpsAvg], [0, Rs*qAmpsAvg])
-
-                self.CCdqHomeCurve.setData([-we*Lq*qAmpsAvg + Rs*dAmpsAvg], [we*Ld*dAmpsAvg + Rs*qAmpsAvg])
-                self.CCdqHomeVector.setData([Rs*dAmpsAvg, -we*Lq*qAmpsAvg + Rs*dAmpsAvg], [Rs*qAmpsAvg, we*Ld*dAmpsAvg + Rs*qAmpsAvg])
-
-                self.bemfdqHomeCurve.setData([-we*Lq*qAmpsAvg + Rs*dAmpsAvg], [we*Ld*dAmpsAvg + Rs*qAmpsAvg + we*fluxLinkage])
-                self.bemfdqHomeVector.setData([-we*Lq*qAmpsAvg + Rs*dAmpsAvg, -we*Lq*qAmpsAvg + Rs*dAmpsAvg], [we*Ld*dAmpsAvg + Rs*qAmpsAvg, we*Ld*dAmpsAvg + Rs*qAmpsAvg + we*fluxLinkage])
-
-                self.idqHomeCurve.setData([-we*Lq*qAmpsAvg + Rs*dAmpsAvg], [we*Ld*dAmpsAvg + Rs*qAmpsAvg + we*fluxLinkage])
-                self.idqHomeVector.setData([0, -we*Lq*qAmpsAvg + Rs*dAmpsAvg], [0, we*Ld*dAmpsAvg + Rs*qAmpsAvg + we*fluxLinkage])
-
-                self.speed[:-1] = self.speed[1:]
-                if(self.f_est*15.77 >= 500):
-                    self.speed[-1] = min(3500+ np.random.randint(-5,11), self.seq*self.f_est*15.77)
-                else:
-                    self.speed[-1] = speedEnc
-                
-                speedLabelStr = f"Speed: {self.speed[-1]:.0f} rpm"
-                self.speedCurve.setData(self.speed)
-                self.value_display.setText(f'{speedLabelStr[0:6]} {speedLabelStr[7:len(speedLabelStr)].rjust(9)}')
-
-                self.refSpeedVec[:-1] = self.refSpeedVec[1:]
-                GPIOvals = self.hallLines.get_values()
-                refSpeedAvg = np.median(self.refSpeed)
-                if(GPIOvals[6] == 1):
-                    tSpeed = ((175/106)*(refSpeedAvg - 165)+100)*(refSpeedAvg > 165)
-                    if(tSpeed > 3500):
-                        self.refSpeedVec[-1] = 3500 + np.random.randint(-5,11)
-                    else:
-                        self.refSpeedVec[-1] = tSpeed
-                else:
-                    tSpeed = (500/217)*(refSpeedAvg < 1033)*(refSpeedAvg - 1033) + \
-                        (200/119)*(refSpeedAvg > 1200)*(refSpeedAvg - 1090)
-                    if(tSpeed > 2000):
-                        self.refSpeedVec[-1] = 2000 + np.random.randint(-5,11)
-                    elif(tSpeed < -2000):
-                        self.refSpeedVec[-1] = -2000 - np.random.randint(-5,11)
-                    else:
-                        self.refSpeedVec[-1] = tSpeed
-                
-                #if((abs(self.refSpeedVec[-3] - self.refSpeedVec[-1]) < 50) and ((abs(self.refSpeedVec[-1] - self.refSpeedVec[-2]) > 50) or (abs(self.refSpeedVec[-3] - self.refSpeedVec[-2]) > 50))):
-                #    self.refSpeedVec[-2] = 0.5*(self.refSpeedVec[-3] + self.refSpeedVec[-1])
-                self.refSpeedCurve.setData(self.refSpeedVec[1:(len(self.refSpeedVec))])
-
-                #if (np.any(self.speed > 2010) and np.any(self.speed < 0)):
-                #    self.speedPlot.setYRange(-3535, 3535)
-                #if(np.any(self.speed < 0) and (self.speed[-1] >= 2100))
-                if(np.any(self.speed < 0) and (not(self.speed[-1] >= 2100))):
-                    self.speedPlot.setYRange(-2010, 2010)
-                else:
-                    self.speedPlot.setYRange(0, 3535)
-
-                self.uLineVoltsCurve.setData(self.plotTimeVec[0:upperBound],self.uVolts[0:upperBound])
-                self.vLineVoltsCurve.setData(self.plotTimeVec[0:upperBound],self.vVolts[0:upperBound])
-                self.wLineVoltsCurve.setData(self.plotTimeVec[0:upperBound],self.wVolts[0:upperBound])
-
-                self.dVoltsVec[:-1] = self.dVoltsVec[1:]
-                self.dVoltsVec[-1] = dVoltsAvg
-                self.dVoltsTimeCurve.setData(self.dVoltsVec[0:self.speedLen])
-
-                self.qVoltsVec[:-1] = self.qVoltsVec[1:]
-                self.qVoltsVec[-1] =  qVoltsAvg
-                self.qVoltsTimeCurve.setData(self.qVoltsVec[0:self.speedLen])
-
-                self.zVoltsVec[:-1] = self.zVoltsVec[1:]
-                self.zVoltsVec[-1] =  zVoltsAvg
-                self.zVoltsTimeCurve.setData(self.zVoltsVec[0:self.speedLen])
-
-                self.dAmpsVec[:-1] = self.dAmpsVec[1:]
-                self.dAmpsVec[-1] = dAmpsAvg
-                self.dAmpsTimeCurve.setData(self.dAmpsVec[0:self.speedLen])
-
-                self.qAmpsVec[:-1] = self.qAmpsVec[1:]
-                self.qAmpsVec[-1] = qAmpsAvg
-                self.qAmpsTimeCurve.setData(self.qAmpsVec[0:self.speedLen])
-
-                self.zAmpsVec[:-1] = self.zAmpsVec[1:]
-                self.zAmpsVec[-1] =  zAmpsAvg
-                self.zAmpsTimeCurve.setData(self.zAmpsVec[0:self.speedLen])
+        if(self.pauseExec == 1):
+            tMark = self.stageTimer.mark()
+            records = self.acq.buffer.drain()
+            self.stageTimer.lap('acquire', tMark)
+
+            # Every record is ingested, but only the newest completed window is processed, so a backlog (--replay --fast,
+            # or after a stall) cannot hold up the render timer; drawing happens separately at up to renderFps (RenderFrame)
+            last = -1
+            for k in range(0,len(records)):
+                if(records[k][0] == CYCLE):
+                    last = k
+
+            for k in range(0,len(records)):
+                kind, data, t = records[k]
+                if(kind != CYCLE):
+                    self.engine.ingest(kind, data, t)
+                elif(k == last):
+                    self.ProcessWindow()
+            self.stageTimer.endRefresh() # one refresh per drain, windows or not, so nothing carries over to the next
+
+            if(last >= 0):
+                self.UpdateStats()
+
+    def ProcessWindow(self):
+        r = self.engine.process(self.engine.window())
+        tMark = self.stageTimer.mark()
+        self.PublishResult(r)
+        self.speedText = f"Speed: {r.speed:.0f} rpm"
+        self.frameReady = True
+        self.stageTimer.lap('publish', tMark)
+
+    def RenderFrame(self):
+        # Draws the most recent processed frame, once; frames processed in between were overwritten in the model
+        if not self.frameReady:
+            return
+        tMark = self.stageTimer.mark()
+        self.frameReady = False
+        self.framesDrawn = self.framesDrawn + 1
+
+        # Only the tab on screen is drawn; the others catch up when they are shown (on_tab_changed)
+        self.RenderTab(self.tabIndex)
+
+        # Speed readout next to the tabs is always visible
+        speedLabelStr = self.speedText
+        self.value_display.setText(f'{speedLabelStr[0:6]} {speedLabelStr[7:len(speedLabelStr)].rjust(9)}')
+        self.stageTimer.lap('render', tMark)
+        self.stageTimer.endFrame()
+
+    def PublishResult(self, r):
+        # Each series is stored once, whichever tabs show it
+        signals = self.signals
+        signals.set('plotTime', self.plotTimeVec[0:len(r.dVolts)])
+        for name in ['hallA', 'hallB', 'hallC', 'encoderA', 'encoderB', 'encoderZ',
+                     'uvVolts', 'vwVolts', 'wuVolts', 'uAmps', 'vAmps', 'wAmps',
+                     'dVolts', 'qVolts', 'zVolts', 'dAmps', 'qAmps', 'zAmps', 'uLineVolts', 'vLineVolts', 'wLineVolts']:
+            signals.set(name, getattr(r, name))
+
+        signals.set('speed', r.speedHistory)
+        signals.set('refSpeed', r.refSpeedHistory)
+        for (k, name) in enumerate(['dVoltsHistory', 'qVoltsHistory', 'zVoltsHistory', 'dAmpsHistory', 'qAmpsHistory', 'zAmpsHistory']):
+            signals.set(name, r.dqHistory[k])
+
+        # Vector diagram: v_dq, then Rs*i_dq -> cross-coupling -> back EMF end to end (start and end point of each arrow)
+        (vd, vq), (rd, rq), (cd, cq), (bd, bq) = r.vdq, r.rsIdq, r.ccdq, r.bemfdq
+        signals.set('vdqX', [0, vd])
+        signals.set('vdqY', [0, vq])
+        signals.set('RsidqX', [0, rd])
+        signals.set('RsidqY', [0, rq])
+        signals.set('CCdqX', [rd, cd])
+        signals.set('CCdqY', [rq, cq])
+        signals.set('bemfdqX', [cd, bd])
+        signals.set('bemfdqY', [cq, bq])
+        signals.set('idqX', [0, bd])
+        signals.set('idqY', [0, bq])
+
+    def RenderTab(self, index):
+        self.signals.draw(index)
+
+        if(index == 1) and ('speed' in self.signals.versions):
+            speed = self.signals.get('speed')
+            #if (np.any(self.speed > 2010) and np.any(self.speed < 0)):
+            #    self.speedPlot.setYRange(-3535, 3535)
+            #if(np.any(self.speed < 0) and (self.speed[-1] >= 2100))
+            if(np.any(speed < 0) and (not(speed[-1] >= 2100))):
+                self.speedPlot.setYRange(-2010, 2010)
+            else:
+                self.speedPlot.setYRange(0, 3535)
+
+    def UpdateStats(self):
+        tNow = time.time()
+        framesRead = self.acq.framesRead
+        if(tNow > self.statsTime):
+            self.frameRate = (framesRead - self.statsFrames)/(tNow - self.statsTime)
+            self.drawRate = (self.framesDrawn - self.statsDrawn)/(tNow - self.statsTime)
+        self.statsTime = tNow
+        self.statsFrames = framesRead
+        self.statsDrawn = self.framesDrawn
+
+        cache = self.engine.filterCache.stats()
+        self.stats_display.setText(f'SPI: {self.frameRate:.0f} frames/s   Dropped: {self.acq.buffer.dropped}   Display: {self.drawRate:.0f} fps   '
+            f'Filter cache: {cache["hits"]}/{cache["hits"] + cache["misses"]} hits')
+
+        if(self.playback is not None):
+            self.stats_display.setText(self.stats_display.text() + f'   Playback: {self.playback.position():.1f}/{self.playback.duration():.1f} s '
+                f'at {self.playback.speed:g}x')
+
+        if(self.acqProcess) and (self.acq.error is not None):
+            self.stats_display.setText(self.stats_display.text() + f'   {self.acq.error}')
+
+        if(self.acqFallback is not None):
+            self.stats_display.setText(self.stats_display.text() + f'   {self.acqFallback}')
+
+        if(self.recordError is not None):
+            self.stats_display.setText(self.stats_display.text() + f'   {self.recordError}')
+
+        if(self.stageTimer.enabled):
+            stage, worst = self.stageTimer.worst()
+            self.stats_display.setText(self.stats_display.text() + f'   Refresh: {self.stageTimer.refreshRate():.1f}/s   '
+                f'Samples: {self.stageTimer.sampleRate():.0f}/s   Worst: {stage} {1e3*worst:.1f} ms')
 
     def on_tab_changed(self, index):
         if index == 0:
@@ -1244,76 +947,70 @@ class MyWindow(QMainWindow):
             self.tabIndex = 2
         elif index == 3:
             self.tabIndex = 3
-            self.counter = 0
-    
-    def GetDataSPI(self, spi0):
-        resp = spi0.xfer2([0xFF, 0xFF])
-        parity = (resp[1] & 0b01111000) >> 3
-
-        resp = (resp[0] << 8) | (resp[1] & 0b10000111)
-
-        return parity, (((resp << 9) & 0xFFFF) | ((resp >> 7) & 0xFFFF))
+            self.acq.restartCycle()
+        self.RenderTab(self.tabIndex)
     
     def PausePlay(self):
         self.pauseExec = not self.pauseExec
 
         if(self.pauseExec == 1):
+            self.engine.reset() # the stream has a gap
+            if(self.playback is not None):
+                self.playback.resume()
+            self.acq.resume()
             self.center_button.setText('\U000023F8 Pause')
         else:
+            self.acq.pause()
+            if(self.playback is not None):
+                self.playback.pause()
             self.center_button.setText('\U000023F5 Play')
+
+    def keyPressEvent(self, event):
+        if(self.playback is None):
+            super().keyPressEvent(event)
+            return
+
+        step = 60 if (event.modifiers() & Qt.ShiftModifier) else 5
+        if(event.key() == Qt.Key_Left):
+            self.playback.seek(self.playback() - step)
+        elif(event.key() == Qt.Key_Right):
+            self.playback.seek(self.playback() + step)
+        elif(event.key() == Qt.Key_Home):
+            self.playback.seek(self.playback.tFirst)
+        elif(event.key() == Qt.Key_Up):
+            self.playback.setSpeed(2*self.playback.speed)
+        elif(event.key() == Qt.Key_Down):
+            self.playback.setSpeed(self.playback.speed/2)
+        else:
+            super().keyPressEvent(event)
+            return
+        self.UpdateStats()
+
+    def closeEvent(self, event):
+        self.acq.stop()
+        if(self.recorder is not None):
+            self.recorder.close()
+        super().closeEvent(event)
     
     def SaveData(self):
-        self.toggleSave = 1
-
-        if (self.toggleSave == 1):
-            self.toggleSave = 0
-            with open('DataOut.csv', 'w') as f:
-                np.savetxt(f, self.f_est[None], delimiter = ',')
-                np.savetxt(f, self.uVoltsCurve.getData()[0][None], delimiter = ',')
-                np.savetxt(f, self.uVoltsCurve.getData()[1][None], delimiter = ',')
-                np.savetxt(f, self.vVoltsCurve.getData()[1][None], delimiter = ',')
-                np.savetxt(f, self.wVoltsCurve.getData()[1][None], delimiter = ',')
-                np.savetxt(f, self.dVoltsCurve.getData()[1][None], delimiter = ',')
-                np.savetxt(f, self.qVoltsCurve.getData()[1][None], delimiter = ',')
-                np.savetxt(f, self.zVoltsCurve.getData()[1][None], delimiter = ',')
-                np.savetxt(f, self.uLineVoltsCurve.getData()[1][None], delimiter = ',')
-                np.savetxt(f, self.vLineVoltsCurve.getData()[1][None], delimiter = ',')
-                np.savetxt(f, self.wLineVoltsCurve.getData()[1][None], delimiter = ',')
-
-                np.savetxt(f, self.uAmpsCurve.getData()[1][None], delimiter = ',')
-                np.savetxt(f, self.vAmpsCurve.getData()[1][None], delimiter = ',')
-                np.savetxt(f, self.wAmpsCurve.getData()[1][None], delimiter = ',')
-                np.savetxt(f, self.dAmpsCurve.getData()[1][None], delimiter = ',')
-                np.savetxt(f, self.qAmpsCurve.getData()[1][None], delimiter = ',')
-                np.savetxt(f, self.zAmpsCurve.getData()[1][None], delimiter = ',')
-
-                np.savetxt(f, self.speedCurve.getData()[1][None], delimiter = ',')
-                np.savetxt(f, self.refSpeedCurve.getData()[1][None], delimiter = ',')
-
-                np.savetxt(f, self.dVoltsTimeCurve.getData()[1][None], delimiter = ',')
-                np.savetxt(f, self.qVoltsTimeCurve.getData()[1][None], delimiter = ',')
-                np.savetxt(f, self.zVoltsTimeCurve.getData()[1][None], delimiter = ',')
-                np.savetxt(f, self.dAmpsTimeCurve.getData()[1][None], delimiter = ',')
-                np.savetxt(f, self.qAmpsTimeCurve.getData()[1][None], delimiter = ',')
-                np.savetxt(f, self.zAmpsTimeCurve.getData()[1][None], delimiter = ',')
-
-                np.savetxt(f, self.hallCurveA.getData()[0][None], delimiter = ',')
-                np.savetxt(f, self.hallCurveA.getData()[1][None], delimiter = ',')
-                np.savetxt(f, self.hallCurveB.getData()[1][None], delimiter = ',')
-                np.savetxt(f, self.hallCurveC.getData()[1][None], delimiter = ',')
-
-                np.savetxt(f, self.encoderCurveA.getData()[0][None], delimiter = ',')
-                np.savetxt(f, self.encoderCurveA.getData()[1][None], delimiter = ',')
-                np.savetxt(f, self.encoderCurveB.getData()[1][None], delimiter = ',')
-                np.savetxt(f, self.encoderCurveZ.getData()[1][None], delimiter = ',')
-
-                np.savetxt(f, self.timeVec[None], delimiter = ',')
-                np.savetxt(f, self.uVolts[None], delimiter = ',')
-                np.savetxt(f, self.vVolts[None], delimiter = ',')
-                np.savetxt(f, self.wVolts[None], delimiter = ',')
-                np.savetxt(f, self.uAmps[None], delimiter = ',')
-                np.savetxt(f, self.vAmps[None], delimiter = ',')
-                np.savetxt(f, self.wAmps[None], delimiter = ',')
+        # Starts/stops streaming every raw frame and edge to a recording (Recorder.py) in the working directory
+        if(self.recorder is None):
+            path = time.strftime('capture-%Y%m%d-%H%M%S.focrec')
+            try:
+                self.recorder = Recorder(path, seconds = self.recordSeconds, spiHz = self.spiHz, tStart = self.clock())
+            except OSError as e:
+                self.recordError = f'Recording not started: {e.strerror}'
+                self.UpdateStats()
+                return
+            self.recordError = None
+            self.recorder.writeLevels(self.engine.GPIOvals, self.recorder.tStart)
+            self.acq.recorder = self.recorder
+            self.save_button.setText('\U000023F9 Stop')
+        else:
+            self.acq.recorder = None
+            self.recorder.close()
+            self.recorder = None
+            self.save_button.setText('\U000023FA Record')
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The modules are flat scripts in RPi_Visualization/, imported by name as the GUIs do
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,41 @@
+import numpy as np
+
+from Backends import ENCODER_LINES, POLE_PAIRS, REPLAY_VOLTS, ReplayClock, ReplayLines, ReplaySpi
+from Captures import loadCapture
+from Crossings import crossings
+from Spectrum import estimateFundamental
+
+def risingPeriod(lines, line, t0, t1):
+    lineIdx, values, times = lines.edgesBetween(t0, t1)
+    return np.median(np.diff(times[(lineIdx == line) & (values == 1)]))
+
+def test_encoder_follows_hall_speed():
+    # Lines: 2 hall A, 4 encoder A
+    clock = ReplayClock(realTime = False)
+    lines = ReplayLines(clock)
+    t0 = clock()
+    periodElec = risingPeriod(lines, 2, t0, t0 + 1)
+    periodA = risingPeriod(lines, 4, t0, t0 + 1)
+    assert np.isclose(periodA, periodElec*POLE_PAIRS/ENCODER_LINES, rtol = 0.05)
+
+def test_edge_rate_fits_recorder():
+    # Under the Recorder's default edgeRate (20000 edges/s)
+    clock = ReplayClock(realTime = False)
+    for hall in ['hall raw0', None]:
+        lines = ReplayLines(clock, hall = hall)
+        lineIdx, values, times = lines.edgesBetween(clock(), clock() + 1)
+        assert 0 < len(times) < 20000
+
+def test_replay_keeps_capture_frequency():
+    # u-v of one second of replayed frames against the rising-crossing period of the capture itself
+    t, channels = loadCapture(REPLAY_VOLTS)
+    uv = channels[0] - channels[1]
+    idx = crossings(uv - np.mean(uv), 0, 'rising', hysteresis = 0.5*np.std(uv))
+    fCapture = 1/np.median(np.diff(t[idx]))
+
+    spi = ReplaySpi(ReplayClock(realTime = False))
+    n = int(1/spi.framePeriod)
+    codes = spi.codes(spi.framePeriod*np.arange(n))
+    f, amp, conf = estimateFundamental(codes[0] - codes[1], 1/spi.framePeriod)
+    assert abs(f - fCapture) < 3
+    assert conf > 0.5
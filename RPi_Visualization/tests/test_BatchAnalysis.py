@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+from BatchAnalysis import COLUMNS, analyzeSession, findSessions
+from Captures import CAPTURE_DIR, loadCapture
+from Crossings import crossings
+
+def session(name):
+    return [s for s in findSessions(CAPTURE_DIR) if (s[0] == name)][0]
+
+def captureFrequency(name, a, b):
+    # Fundamental of channel a - b of the capture itself, from its rising crossings
+    t, channels = loadCapture(name)
+    x = channels[a] - channels[b]
+    idx = crossings(x - np.mean(x), 0, 'rising', hysteresis = 0.5*np.std(x))
+    return 1/np.median(np.diff(t[idx]))
+
+@pytest.mark.parametrize('name', ['uvw filt run0', 'i uvw0'])
+def test_f_est_matches_capture(name):
+    rows = analyzeSession(session(name), seconds = 1)
+    f_est = np.median([row[COLUMNS.index('f_est')] for row in rows])
+    assert abs(f_est - captureFrequency(name, 0, 1)) < 3
+    assert all(row[COLUMNS.index('running')] == 1 for row in rows)
+
+def test_missing_slots_left_empty():
+    # A hall capture has no analog data: only the speeds are filled in
+    rows = analyzeSession(session('hall raw0'), seconds = 0.2)
+    filled = [column for (column, value) in zip(COLUMNS, rows[-1]) if (value is not None)]
+    assert filled == ['session', 'window', 't', 'speed', 'speedHall']
@@ -0,0 +1,40 @@
+import os
+
+import numpy as np
+import pytest
+
+import Captures
+
+CSV = 'Time(s),CH1V,CH2V\n0,1.0,2.0\n1e-05,1.5,2.5\n2e-05,2.0,3.0\n'
+
+@pytest.fixture
+def capture(tmp_path, monkeypatch):
+    monkeypatch.setattr(Captures, 'CACHE_DIR', str(tmp_path/'.cache'))
+    path = tmp_path/'hall test0.csv'
+    path.write_text(CSV)
+    return str(path)
+
+def fail(*args):
+    raise AssertionError('not expected on this load')
+
+def test_unchanged_file_is_not_hashed(capture, monkeypatch):
+    t, channels, names = Captures.loadCaptureNamed(capture)
+    monkeypatch.setattr(Captures, 'fileHash', fail)
+    monkeypatch.setattr(Captures, 'parseCapture', fail)
+    tc, cc, nc = Captures.loadCaptureNamed(capture)
+    assert np.array_equal(t, tc) and np.array_equal(channels, cc) and (names == nc == ['CH1V', 'CH2V'])
+
+def test_touched_file_is_hashed_not_parsed(capture, monkeypatch):
+    Captures.loadCaptureNamed(capture)
+    stat = os.stat(capture)
+    os.utime(capture, ns = (stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    monkeypatch.setattr(Captures, 'parseCapture', fail)
+    t, channels, names = Captures.loadCaptureNamed(capture)
+    assert np.allclose(channels[0], [1.0, 1.5, 2.0])
+
+def test_edited_file_is_parsed_again(capture):
+    Captures.loadCaptureNamed(capture)
+    with open(capture, 'w') as f:
+        f.write(CSV.replace('1.5', '9.5'))
+    t, channels, names = Captures.loadCaptureNamed(capture)
+    assert np.allclose(channels[0], [1.0, 9.5, 2.0])
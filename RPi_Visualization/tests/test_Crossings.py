@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from Crossings import crossings, crossingTimes, firstCrossing
+
+def firstLoop(x, cond, start, stop, default):
+    # The stopFlag scan loop the GUI used before firstCrossing
+    stopFlag = 0
+    for i in range(start,stop):
+        stopFlag = cond(x, i)
+        if(stopFlag == 1):
+            break
+    return i if stopFlag else default
+
+@pytest.mark.parametrize('f', [20, 50, 300])
+def test_firstCrossing_matches_loop(f):
+    n = 3000
+    rng = np.random.default_rng(f)
+    t = np.cumsum(rng.uniform(30e-6, 40e-6, n))
+    hallA = (((f*t) % 1) < 0.5) + 3.0
+    hallB = (((f*t - 1/3) % 1) < 0.5) + 1.5
+    uFilt = np.sin(2*np.pi*f*t) + 0.01*rng.normal(size = n)
+    level = -0.15*np.max(uFilt)
+
+    cases = [
+        (hallA, lambda x, i: (x[i] == 3) and (x[i+1] > 3), dict(level = 3.5, edge = 'rising')),
+        (hallB, lambda x, i: (x[i] == 1.5) and (x[i+1] > 1.5), dict(level = 2, edge = 'rising')),
+        (uFilt, lambda x, i: (x[i] >= 0) and (x[i+1] <= 0), dict(level = 0, edge = 'falling', inclusive = True)),
+        (uFilt, lambda x, i: (x[i] >= level) and (x[i+1] <= level), dict(level = level, edge = 'falling', inclusive = True)),
+    ]
+    for (x, cond, kwargs) in cases:
+        for start in [0, n//2]:
+            assert firstCrossing(x, start = start, stop = n - 2, default = -1, **kwargs) == firstLoop(x, cond, start, n - 2, -1)
+
+def test_no_crossing_gives_default():
+    x = np.ones(100)
+    assert firstCrossing(x, 0.5, 'rising', default = 7) == 7
+    assert firstCrossing(x, 0.5, 'rising', start = 50, stop = 50, default = 7) == 7
+
+def test_hysteresis():
+    # Noise around the level gives many plain crossings but one edge per period with hysteresis
+    f = 50
+    rng = np.random.default_rng(0)
+    t = np.arange(8000)*30e-6
+    x = np.sin(2*np.pi*f*t) + 0.02*rng.normal(size = len(t))
+    assert len(crossings(x, 0, 'rising')) > len(crossings(x, 0, 'rising', hysteresis = 0.2))
+
+    idx = crossings(x, 0, 'rising', hysteresis = 0.2)
+    times = crossingTimes(x, t, idx, 0.1)
+    assert np.allclose(np.diff(times), 1/f, rtol = 0.02)
@@ -0,0 +1,24 @@
+from Engine import Engine
+
+def test_cutoff_hysteresis():
+    engine = Engine()
+    swaps = []
+    setSos = engine.analogFilter.setSos
+    engine.analogFilter.setSos = lambda sos: (swaps.append(sos), setSos(sos))
+
+    engine.setCutoff(0.08)
+    assert len(swaps) == 0 # one window away is not enough
+    engine.setCutoff(0.08)
+    assert len(swaps) == 1
+    key = engine.filterKey
+
+    # jitter within one cache step of the current design keeps it
+    for w_n in [0.0805, 0.0795, 0.0808, 0.0792]:
+        engine.setCutoff(w_n)
+    assert (len(swaps) == 1) and (engine.filterKey == key)
+
+    # a single outlier window does not move it either
+    engine.setCutoff(0.05)
+    engine.setCutoff(0.08)
+    engine.setCutoff(0.05)
+    assert len(swaps) == 1
@@ -0,0 +1,22 @@
+import numpy as np
+
+from FilterCache import FilterDesignCache
+
+def test_relative_cutoff_error():
+    # The quantized cutoff is within step/2 (relative) of the requested one over the whole range
+    cache = FilterDesignCache()
+    w_n = np.geomspace(cache.wMin, cache.wMax, 5000)
+    cutoffs = np.array([cache.cutoff(cache.key(w)) for w in w_n])
+    assert np.max(np.abs(cutoffs/w_n - 1)) <= cache.step/2 + 1e-9
+
+def test_table_round_trip(tmp_path):
+    path = str(tmp_path/'table.npz')
+    cache = FilterDesignCache(maxSize = 1000)
+    cache.precompute(0.01, 0.02)
+    cache.save(path)
+
+    loaded = FilterDesignCache(maxSize = 1000)
+    assert loaded.load(path)
+    assert np.array_equal(loaded.get(0.015), cache.get(0.015))
+    assert loaded.misses == 0
+    assert not FilterDesignCache(step = 0.02).load(path)
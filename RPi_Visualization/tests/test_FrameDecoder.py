@@ -0,0 +1,23 @@
+import numpy as np
+
+from FrameDecoder import CHANNEL_BYTES, CHANNEL_TAGS, decodeFrames, decodeFrameScalar, encodeFrames, scaleCodes
+
+def test_decode_matches_scalar():
+    # Random bytes: every channel has valid and invalid tags, values must match the per-frame reference
+    rng = np.random.default_rng(0)
+    frames = rng.integers(0, 256, size = (2000, 16), dtype = np.uint8)
+    codes, valid = decodeFrames(frames)
+    values = scaleCodes(codes)
+
+    scalar = [decodeFrameScalar(list(map(int, frame))) for frame in frames]
+    for c in range(0,len(CHANNEL_BYTES)):
+        assert np.array_equal(valid[c], [v[c] is not None for v in scalar])
+        expected = np.array([v[c] for v in scalar if v[c] is not None])
+        assert np.allclose(values[c, valid[c]], expected)
+
+def test_encode_round_trip():
+    rng = np.random.default_rng(1)
+    codes = rng.integers(0, 4096, size = (len(CHANNEL_TAGS), 500))
+    decoded, valid = decodeFrames(encodeFrames(codes))
+    assert valid.all()
+    assert np.array_equal(decoded, codes)
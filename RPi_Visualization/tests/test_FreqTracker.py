@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from FreqTracker import FrequencyTracker
+
+F_S = 7812.5
+
+def lineVoltages(f, n, amplitude = 10, noise = 0.5, seed = 0):
+    # u-v, v-w, w-u of a 3-phase set at frequency f (Hz, scalar or per sample)
+    rng = np.random.default_rng(seed)
+    t = np.arange(n)/F_S
+    phase = 2*np.pi*np.cumsum(np.broadcast_to(f, (n,)))/F_S
+    u, v, w = [amplitude*np.sin(phase - k*2*np.pi/3) + noise*rng.normal(size = n) for k in range(3)]
+    return u - v, v - w, w - u, t
+
+def run(tracker, uv, vw, wu, t, block = 50):
+    out = []
+    locked = []
+    for k in range(0,len(t),block):
+        out.append(tracker.process(uv[k:(k + block)], vw[k:(k + block)], wu[k:(k + block)], t[k:(k + block)]))
+        locked.append(tracker.locked)
+    return np.concatenate(out), np.array(locked)
+
+@pytest.mark.parametrize('seed', [170, 200, 222, 250])
+def test_pull_in(seed):
+    tracker = FrequencyTracker()
+    tracker.seed(seed)
+    out, locked = run(tracker, *lineVoltages(222, 4000))
+    assert locked.all()
+    assert abs(tracker.frequency - 222) < 0.5
+
+@pytest.mark.parametrize('seed', [6, 50, 100, 400])
+def test_no_false_lock(seed):
+    # A seed far from the fundamental leaves the baseband turning: lock is never declared
+    tracker = FrequencyTracker()
+    tracker.seed(seed)
+    out, locked = run(tracker, *lineVoltages(222, 4000))
+    assert not locked.any()
+    assert np.all(np.isnan(out))
+
+def test_not_locked_before_first_block():
+    tracker = FrequencyTracker()
+    tracker.seed(222)
+    assert not tracker.locked
+
+def test_ramp():
+    n = 3*int(F_S)
+    f = 40 + 20*np.arange(n)/n
+    tracker = FrequencyTracker()
+    tracker.seed(41)
+    out, locked = run(tracker, *lineVoltages(f, n))
+    assert locked.all()
+    assert np.median(np.abs(out[int(F_S):] - f[int(F_S):])) < 0.5
+
+def test_lock_lost_when_signal_stops():
+    uv, vw, wu, t = lineVoltages(222, 4000)
+    uv[2000:] = 0
+    vw[2000:] = 0
+    wu[2000:] = 0
+    tracker = FrequencyTracker()
+    tracker.seed(222)
+    out, locked = run(tracker, uv, vw, wu, t)
+    assert locked[0:30].all() and not locked[-1]
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from Resample import Resampler, interpStack, upsampleTimes
+
+@pytest.mark.parametrize('factor', [2, 4, 7])
+def test_resampler_matches_interp(factor):
+    rng = np.random.default_rng(factor)
+    t = np.cumsum(rng.uniform(120e-6, 136e-6, 400))
+    values = rng.normal(size = (6, 400))
+
+    tUp, up = Resampler(6, factor).upsample(t, values)
+    assert len(tUp) == (len(t) - 1)*factor + 1
+    assert np.array_equal(tUp[::factor], t)
+    assert np.allclose(up, np.stack([np.interp(tUp, t, values[c]) for c in range(0,6)]))
+
+def test_resampler_matches_midpoint_loop():
+    # The interleaving loop the GUI used for the 2x grid
+    rng = np.random.default_rng(0)
+    t = np.cumsum(rng.uniform(120e-6, 136e-6, 400))
+    values = rng.normal(size = (6, 400))
+    timeMod = np.zeros(2*len(t) - 1)
+    for i in range(0,len(t)-1):
+        timeMod[2*i] = t[i]
+        timeMod[2*i+1] = (t[i] + t[i+1])/2
+    timeMod[-1] = t[-1]
+
+    resampler = Resampler(6, 2)
+    resampler.upsample(t[0:100], values[:, 0:100]) # buffers resized on the next call
+    tUp, up = resampler.upsample(t, values)
+    assert np.allclose(tUp, timeMod) and np.allclose(upsampleTimes(t, 2), timeMod)
+    assert np.allclose(up, np.stack([np.interp(timeMod, t, values[c]) for c in range(0,6)]))
+
+def test_interpStack_matches_interp():
+    # Including points outside the samples (clamped) and repeated sample times
+    rng = np.random.default_rng(1)
+    t = np.sort(np.round(rng.uniform(0, 1, 300), 2))
+    values = rng.normal(size = (3, 300))
+    tNew = np.linspace(-0.1, 1.1, 1000)
+    out = interpStack(tNew, t, values)
+    for c in range(0,3):
+        assert np.allclose(out[c], np.interp(tNew, t, values[c]))
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from Spectrum import estimateFundamental, estimateLoop
+
+@pytest.mark.parametrize('n', [400, 1024, 4096])
+def test_batched_matches_loop(n):
+    rng = np.random.default_rng(n)
+    f_s = 7800
+    t = np.arange(n)/f_s
+    f = rng.uniform(20, 200)
+    signals = np.stack([3*np.sin(2*np.pi*f*t - k*2*np.pi/3) for k in range(6)]) + 0.1*rng.normal(size = (6, n))
+
+    frequency, amplitude, confidence = estimateFundamental(signals, f_s)
+    assert np.allclose(frequency, estimateLoop(signals, f_s))
+    assert np.all(np.abs(frequency - f) < f_s/n)
+    assert np.all(confidence > 0.5)
+
+def test_silent_channel():
+    # An all-zero channel gives 0 Hz and zero confidence instead of nan
+    frequency, amplitude, confidence = estimateFundamental(np.zeros((2, 400)), 7800)
+    assert np.array_equal(frequency, [0, 0]) and np.array_equal(amplitude, [0, 0]) and np.array_equal(confidence, [0, 0])
+
+def test_offset_does_not_win():
+    # Phase currents ride on the 2.5 A sense offset; the peak must still be the fundamental
+    f_s = 7800
+    t = np.arange(400)/f_s
+    currents = np.stack([2.5 + 0.3*np.sin(2*np.pi*222*t - k*2*np.pi/3) for k in range(3)])
+    frequency, amplitude, confidence = estimateFundamental(currents, f_s)
+    assert np.all(np.abs(frequency - 222) < f_s/400)
+    assert np.all((amplitude > 0.18) & (amplitude <= 0.3)) # peak bin only: up to ~36 % low between bins
+
+def test_flat_channel_has_low_confidence():
+    rng = np.random.default_rng(0)
+    frequency, amplitude, confidence = estimateFundamental(2.5 + 0.001*rng.normal(size = (1, 400)), 7800)
+    assert confidence[0] < 0.3
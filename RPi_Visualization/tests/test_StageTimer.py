@@ -0,0 +1,34 @@
+import numpy as np
+
+from StageTimer import StageTimer
+
+def book(timer, stage, seconds):
+    timer.pending[stage] = timer.pending[stage] + seconds
+
+def test_render_has_its_own_history():
+    # Three refreshes and one drawn frame: render gets one entry, not one per refresh
+    timer = StageTimer(enabled = True)
+    for k in range(0,3):
+        book(timer, 'acquire', 0.001)
+        timer.endRefresh()
+    book(timer, 'render', 0.01)
+    timer.endFrame()
+    assert np.allclose(timer.history('acquire'), [0.001]*3)
+    assert np.allclose(timer.history('render'), [0.01])
+    assert timer.worst() == ('render', 0.01)
+
+def test_refresh_does_not_carry_over():
+    timer = StageTimer(enabled = True)
+    book(timer, 'acquire', 0.001)
+    timer.endRefresh()
+    book(timer, 'acquire', 0.002)
+    timer.endRefresh()
+    assert np.allclose(timer.history('acquire'), [0.001, 0.002])
+    assert 'render' not in timer.summary()
+
+def test_disabled():
+    timer = StageTimer()
+    timer.lap('render', timer.mark())
+    timer.endRefresh()
+    timer.endFrame()
+    assert timer.worst() == (None, 0)
@@ -0,0 +1,35 @@
+import numpy as np
+
+from Transforms import dq0, dq0Loop, dq0Windows
+
+def test_dq0_matches_loop():
+    rng = np.random.default_rng(0)
+    f = 52.3
+    t = np.cumsum(rng.uniform(90e-6, 110e-6, 400))
+    phase = 2*np.pi*f*t
+    abc = np.stack([np.cos(phase - k*2*np.pi/3) for k in range(3)]) + 0.01*rng.normal(size = (3, 400))
+
+    dRef, qRef = dq0Loop(abc, t, f)
+    dqz = dq0(abc, phase)
+    assert np.allclose(dqz[0], dRef) and np.allclose(dqz[1], qRef)
+    assert np.allclose(dqz[2], np.sum(abc, axis = 0))
+
+def test_dq0_balanced():
+    # A balanced set at the transform angle is constant d = amplitude, q = 0
+    t = np.arange(400)*100e-6
+    theta = 2*np.pi*50*t
+    abc = 2*np.stack([np.cos(theta - k*2*np.pi/3) for k in range(3)])
+    dqz = dq0(abc, theta)
+    assert np.allclose(dqz[0], 2) and np.allclose(dqz[1], 0, atol = 1e-12) and np.allclose(dqz[2], 0, atol = 1e-12)
+
+def test_dq0Windows_matches_single():
+    rng = np.random.default_rng(1)
+    windows = 8
+    n = 400
+    t = np.cumsum(rng.uniform(90e-6, 110e-6, (windows, n)), axis = 1)
+    fs = rng.uniform(10, 200, windows)
+    abc = rng.normal(size = (windows, 3, n))
+
+    batch = dq0Windows(abc, t, fs)
+    for w in range(0,windows):
+        assert np.allclose(batch[w], dq0(abc[w], 2*np.pi*fs[w]*t[w]))